@@ -0,0 +1,158 @@
+"""Load-test the search API at increasing concurrency.
+
+Runs against a live backend (`python main.py`) with an existing index. For
+each concurrency level, that many clients issue searches back to back while
+a separate poller hits /api/index/status, the way the frontend does during
+indexing. Reports p50/p95/p99 search latency, throughput, and status-poll
+p99: with a non-blocking search path the status poll stays fast no matter
+how many searches are in flight.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import statistics
+import sys
+import time
+
+import httpx
+
+DEFAULT_QUERIES = [
+    "machine learning optimization techniques",
+    "API authentication best practices",
+    "database migration rollback",
+    "quarterly financial report",
+    "error handling in async code",
+    "project timeline and milestones",
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def search_client(client: httpx.AsyncClient, queries, n_requests: int,
+                        latencies: list[float], errors: list[str]) -> None:
+    for _ in range(n_requests):
+        query = next(queries)
+        t0 = time.perf_counter()
+        try:
+            response = await client.post("/api/search", json={"query": query})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            errors.append(str(e))
+            continue
+        latencies.append(time.perf_counter() - t0)
+
+
+async def status_poller(client: httpx.AsyncClient, stop: asyncio.Event,
+                        latencies: list[float], interval: float) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        try:
+            (await client.get("/api/index/status")).raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+        except httpx.HTTPError:
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_level(base_url: str, concurrency: int, requests_per_client: int,
+                    queries, poll_interval: float) -> dict:
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        latencies: list[float] = []
+        status_latencies: list[float] = []
+        errors: list[str] = []
+        stop = asyncio.Event()
+        poller = asyncio.create_task(status_poller(client, stop, status_latencies, poll_interval))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(
+            search_client(client, queries, requests_per_client, latencies, errors)
+            for _ in range(concurrency)
+        ))
+        wall = time.perf_counter() - t0
+        stop.set()
+        await poller
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": statistics.fmean(latencies) if latencies else 0.0,
+        "rps": len(latencies) / wall if wall > 0 else 0.0,
+        "status_p99": percentile(status_latencies, 99),
+    }
+
+
+def print_table(rows: list[dict]) -> None:
+    print("\n" + "=" * 86)
+    print(f"{'conc':>5} {'reqs':>6} {'errs':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'mean ms':>9} {'req/s':>8} {'status p99 ms':>14}")
+    print("-" * 86)
+    for r in rows:
+        print(f"{r['concurrency']:>5} {r['requests']:>6} {r['errors']:>5} "
+              f"{r['p50'] * 1000:>9.1f} {r['p95'] * 1000:>9.1f} {r['p99'] * 1000:>9.1f} "
+              f"{r['mean'] * 1000:>9.1f} {r['rps']:>8.1f} {r['status_p99'] * 1000:>14.1f}")
+    print("=" * 86)
+
+
+async def run(args) -> list[dict]:
+    base_queries = args.query or DEFAULT_QUERIES
+    if args.mode == "unique":
+        # Suffix a counter so every request misses the result and embedding
+        # caches and does the full embed + query round trip.
+        counter = itertools.count()
+        queries = (f"{q} {next(counter)}" for q in itertools.cycle(base_queries))
+    else:
+        # Everyone asks the same few queries: exercises caching and coalescing.
+        queries = itertools.cycle(base_queries)
+
+    rows = []
+    for concurrency in args.concurrency:
+        row = await run_level(args.url, concurrency, args.requests, queries, args.poll_interval)
+        rows.append(row)
+        print(f"concurrency {concurrency}: p99 {row['p99'] * 1000:.1f}ms, "
+              f"{row['rps']:.1f} req/s, status p99 {row['status_p99'] * 1000:.1f}ms")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="Backend base URL")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32],
+                        help="Concurrency levels to run, in order (default: 1 2 4 8 16 32)")
+    parser.add_argument("--requests", type=int, default=20,
+                        help="Searches issued by each concurrent client per level (default: 20)")
+    parser.add_argument("--mode", choices=["unique", "repeat"], default="unique",
+                        help="'unique' makes every query distinct (cold path); 'repeat' reuses "
+                             "the same queries (cache hits and coalesced in-flight requests)")
+    parser.add_argument("--query", action="append",
+                        help="Query to use (repeatable); defaults to a built-in set")
+    parser.add_argument("--poll-interval", type=float, default=0.1,
+                        help="Seconds between /api/index/status polls (default: 0.1)")
+    args = parser.parse_args()
+
+    try:
+        httpx.get(f"{args.url}/", timeout=5).raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"Error: backend not reachable at {args.url}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print_table(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Measure the cost of search re-ranking per candidate chunk.
+
+Builds synthetic candidate sets (chunk text of CHUNK_SIZE characters spread
+over files, random similarities and mtimes) and times the file-level
+aggregation that runs after retrieval for every search. Reports the time per
+call and per candidate at each pool size, to size SEARCH_CANDIDATES.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+sys.path.insert(0, str(BACKEND_DIR.parent))
+
+from config import Settings
+from scoring import aggregate_file_scores
+
+WORDS = (
+    "index search vector chunk query file embedding score latency token cache "
+    "document model batch memory thread disk network schema config release"
+).split()
+
+
+def make_candidates(n: int, chunks_per_file: int, chunk_chars: int, rng: random.Random) -> list[tuple]:
+    now = time.time()
+    n_files = max(1, n // chunks_per_file)
+    file_mtimes = [now - rng.uniform(0, 730) * 86400 for _ in range(n_files)]
+    candidates = []
+    for i in range(n):
+        f = rng.randrange(n_files)
+        words = []
+        length = 0
+        while length < chunk_chars:
+            word = rng.choice(WORDS)
+            words.append(word)
+            length += len(word) + 1
+        metadata = {"file_path": f"/corpus/file_{f}.txt", "modified_ts": file_mtimes[f]}
+        candidates.append((f"chunk-{i}", " ".join(words)[:chunk_chars], metadata, rng.uniform(0.2, 0.9)))
+    # Retrieval returns candidates best first.
+    candidates.sort(key=lambda c: c[3], reverse=True)
+    return candidates
+
+
+def main():
+    settings = Settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000, 10000],
+                        help="Candidate pool sizes to time (default: 100 1000 5000 10000)")
+    parser.add_argument("--chunks-per-file", type=int, default=10,
+                        help="Average candidates per file (default: 10)")
+    parser.add_argument("--chunk-chars", type=int, default=settings.CHUNK_SIZE,
+                        help=f"Characters per candidate chunk (default: CHUNK_SIZE = {settings.CHUNK_SIZE})")
+    parser.add_argument("--query", default="vector search latency",
+                        help="Query whose terms are matched against the chunks")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per size (default: 5)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print("=" * 60)
+    print(f"{'candidates':>10} {'files':>7} {'median ms':>11} {'min ms':>9} {'us/candidate':>14}")
+    print("-" * 60)
+    for n in args.sizes:
+        candidates = make_candidates(n, args.chunks_per_file, args.chunk_chars, rng)
+        files = len({c[2]["file_path"] for c in candidates})
+        aggregate_file_scores(args.query, candidates, settings.SEARCH_RESULT_COUNT)  # warm-up
+        timings = []
+        for _ in range(args.repeats):
+            t0 = time.perf_counter()
+            aggregate_file_scores(args.query, candidates, settings.SEARCH_RESULT_COUNT)
+            timings.append(time.perf_counter() - t0)
+        median = statistics.median(timings)
+        print(f"{n:>10} {files:>7} {median * 1000:>11.2f} {min(timings) * 1000:>9.2f} "
+              f"{median / n * 1e6:>14.2f}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
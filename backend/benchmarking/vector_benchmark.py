@@ -0,0 +1,106 @@
+"""Measure recall of compact vector storage (VECTOR_DIMS) against full vectors.
+
+Loads chunk embeddings from an existing full-dimension index and, for a
+sample of query vectors, compares the exact top-k (brute-force cosine over
+full vectors) with what a VECTOR_DIMS index returns: a first pass over
+Matryoshka-truncated vectors keeping the top candidates, rescored by full
+vectors. Reports recall@k and the index memory per vector at each
+dimension. The first pass is exact here, so this measures the truncation
+alone, not HNSW's own approximation.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).parent
+sys.path.insert(0, str(BACKEND_DIR.parent))
+
+from config import Settings
+from vector_store import truncate_embeddings
+
+
+def load_embeddings(limit: int | None) -> np.ndarray:
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+
+    settings = Settings()
+    client = chromadb.PersistentClient(
+        path=str(settings.CHROMA_DB_DIR), settings=ChromaSettings(anonymized_telemetry=False)
+    )
+    collection = client.get_collection(settings.COLLECTION_NAME)
+    total = min(collection.count(), limit or collection.count())
+    pages = []
+    for offset in range(0, total, 5000):
+        page = collection.get(limit=min(5000, total - offset), offset=offset, include=["embeddings"])
+        pages.append(np.asarray(page["embeddings"], dtype=np.float32))
+    if not pages:
+        sys.exit(f"Collection '{settings.COLLECTION_NAME}' is empty; index some files first.")
+    return truncate_embeddings(np.concatenate(pages), pages[0].shape[1])
+
+
+def embed_queries(queries: list[str]) -> np.ndarray:
+    from generate_embedding import GenerateEmbedding
+    vectors = GenerateEmbedding().embed_queries(queries)
+    return truncate_embeddings(vectors, len(vectors[0]))
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores per row, best first."""
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+def main():
+    settings = Settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dims", type=int, nargs="+", default=[128, 256, 512],
+                        help="Truncated dimensions to evaluate (default: 128 256 512)")
+    parser.add_argument("--candidates", type=int, default=settings.SEARCH_CANDIDATES,
+                        help=f"First-pass candidates rescored by full vectors (default: SEARCH_CANDIDATES = {settings.SEARCH_CANDIDATES})")
+    parser.add_argument("--k", type=int, default=10, help="Recall cut-off (default: 10)")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="Sampled chunk vectors used as queries (default: 200)")
+    parser.add_argument("--query", action="append", default=[],
+                        help="Text query embedded with Ollama instead of sampling (repeatable)")
+    parser.add_argument("--limit", type=int, default=None, help="Only load the first N chunks")
+    args = parser.parse_args()
+
+    vectors = load_embeddings(args.limit)
+    full_dims = vectors.shape[1]
+    if args.query:
+        queries = embed_queries(args.query)
+    else:
+        rng = np.random.default_rng(0)
+        queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+
+    print("=" * 72)
+    print(f"{len(vectors)} chunks x {full_dims} dims, {len(queries)} queries, "
+          f"{args.candidates} candidates rescored")
+    print(f"{'dims':>6} {'recall@' + str(args.k):>10} {'first-pass only':>16} "
+          f"{'index bytes/vec':>16} {'reduction':>10}")
+    print("-" * 72)
+    for dims in [d for d in args.dims if d < full_dims] + [full_dims]:
+        short = truncate_embeddings(vectors, dims)
+        recalls, first_recalls = [], []
+        # Queries in batches, so the score matrices stay small on large indexes.
+        for start in range(0, len(queries), 16):
+            batch = queries[start:start + 16]
+            exact = top_k(batch @ vectors.T, args.k)
+            candidates = top_k(truncate_embeddings(batch, dims) @ short.T, args.candidates)
+            for q, truth, cand in zip(batch, exact, candidates):
+                found = cand[top_k((vectors[cand] @ q)[None], args.k)[0]]
+                recalls.append(len(set(truth) & set(found)) / len(truth))
+                first_recalls.append(len(set(truth) & set(cand[:args.k])) / len(truth))
+        print(f"{dims:>6} {np.mean(recalls):>10.3f} {np.mean(first_recalls):>16.3f} "
+              f"{dims * 4:>16} {full_dims / dims:>9.1f}x")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
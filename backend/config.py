@@ -11,19 +11,89 @@ class Settings(BaseSettings):
     # Ollama settings
     OLLAMA_BASE_URL: str = "http://localhost:11434"
     EMBEDDING_MODEL: str = "nomic-embed-text"
+
+    # Embedding scheduler settings (batch sizes in characters)
+    EMBED_BATCH_CHARS: int = 16000  # starting batch size, tuned at runtime
+    EMBED_MIN_BATCH_CHARS: int = 2000
+    EMBED_MAX_BATCH_CHARS: int = 128000
+    EMBED_MAX_CONCURRENCY: int = 4  # keep in line with OLLAMA_NUM_PARALLEL
+    EMBED_TARGET_LATENCY_S: float = 2.0  # per embed request
+
+    # Persistent embedding cache, keyed by (EMBEDDING_MODEL, chunk text hash)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: Path = DATA_DIR / "embedding_cache.sqlite3"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 500_000  # ~1.5 GB of 768-dim vectors
     
     # Indexing settings
     CHUNK_SIZE: int = 1000  # characters
     CHUNK_OVERLAP: int = 200
+    # "fixed": evenly sized windows over the whole text. "cdc": content-defined
+    # boundaries that stay put when the text is edited elsewhere.
+    CHUNKING_MODE: str = "fixed"
+    CDC_BOUNDARY_DIVISOR: int = 4  # ~1 in N natural breaks becomes a boundary
+    # When a file's (size, mtime, inode) changed, compare a fast hash of its raw
+    # bytes before re-extracting it (catches touches, git checkouts, copies).
+    CHANGE_DETECTION_BYTE_HASH: bool = True
     MAX_FILE_SIZE_MB: int = 100
 
+    # Directory scanning (a .fileindexerignore file can add name patterns per directory)
+    SCAN_SKIP_HIDDEN: bool = True
+    SCAN_IGNORE_DIRS: list[str] = ["node_modules", "__pycache__", "venv", "site-packages"]
+
+    # Watch mode: flush coalesced file events after this much quiet time,
+    # and at most this long after the first pending event.
+    WATCH_DEBOUNCE_S: float = 1.0
+    WATCH_MAX_DELAY_S: float = 10.0
+
+    # Indexing pipeline settings
+    PIPELINE_QUEUE_SIZE: int = 8  # max items buffered between pipeline stages
+    EXTRACT_BUFFER_SIZE: int = 32  # extracted texts the native extractor may buffer ahead
+    # Chunks buffered across files before the writer flushes them to ChromaDB
+    # in one call per operation (Chroma caps a call at ~5000 records).
+    WRITE_BATCH_SIZE: int = 2000
+    # Durable indexing job queue: per-file checkpoints let interrupted,
+    # paused or failed jobs resume where they stopped.
+    JOBS_DB_PATH: Path = DATA_DIR / "jobs.sqlite3"
+    JOB_THROUGHPUT_SAMPLE_S: float = 10.0  # interval of a job's throughput history
+    # Per-file extraction budgets (0 disables). Files that time out, fail or
+    # go over budget are quarantined until their mtime changes.
+    EXTRACT_TIMEOUT_S: float = 120.0
+    EXTRACT_MAX_TEXT_MB: int = 256  # extracted text per file
+    STATUS_SLOWEST_FILES: int = 10  # slowest extractions reported by /api/index/status
+
+    # Persistent extracted-text cache, keyed by (extractor version, raw-bytes
+    # hash): re-chunking or switching embedding models skips extraction.
+    TEXT_CACHE_ENABLED: bool = True
+    TEXT_CACHE_PATH: Path = DATA_DIR / "text_cache.sqlite3"
+    TEXT_CACHE_MAX_MB: int = 2048  # compressed
+
+    # Compact vector storage: with VECTOR_DIMS set (e.g. 256 or 512 of
+    # nomic-embed-text's 768), the HNSW index holds Matryoshka-truncated
+    # embeddings and full vectors are kept on disk to rescore its candidates.
+    # 0 keeps full-dimension embeddings in the index. Each setting has its
+    # own collection, so changing it builds a fresh index.
+    VECTOR_DIMS: int = 0
+
     # Valid file extensions for indexing
     VALID_FILE_EXTENSIONS: list[str] = [
-        ".txt", ".pdf", ".docx", ".md"
+        ".txt", ".pdf", ".docx", ".md", ".pptx", ".xlsx"
     ]
 
     # Query settings
     SEARCH_RESULT_COUNT: int = 5
+    QUERY_EMBEDDING_CACHE_SIZE: int = 1024  # in-process LRU of query embeddings
+    SEARCH_RESULT_CACHE_SIZE: int = 256  # cached result lists, invalidated on any index write
+    SEARCH_CANDIDATES: int = 1000  # vector hits scored per query (scoring is vectorized)
+    # Two-stage search: a file-level collection holds one pooled vector per
+    # file; a search first picks its SEARCH_FILE_CANDIDATES nearest files and
+    # then only queries those files' chunks. 0 queries all chunks directly.
+    SEARCH_FILE_CANDIDATES: int = 100
+    FILE_VECTOR_POOLING: str = "mean"  # "mean" or "max" of a file's chunk vectors
+    KEYWORD_SEARCH_CANDIDATES: int = 100  # BM25 hits fused with the vector hits
+    RRF_K: int = 60  # reciprocal rank fusion constant
+    SEARCH_BATCH_MAX_QUERIES: int = 100  # queries accepted by /api/search/batch
+    CHUNKS_MAX_IDS: int = 1000  # chunk ids accepted by /api/chunks
+    SEARCH_WORKERS: int = 8  # threads running Chroma/BM25 lookups off the event loop
     
     # Collection name in ChromaDB
     COLLECTION_NAME: str = "file_embeddings"
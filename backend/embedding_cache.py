@@ -0,0 +1,115 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import List, Optional
+
+from config import Settings
+
+
+class EmbeddingCache:
+    """On-disk embedding cache keyed by (model, SHA-256 of the chunk text).
+
+    Unchanged chunks, boilerplate repeated across files and full collection
+    rebuilds all resolve here instead of calling Ollama. Vectors are stored as
+    packed float32 blobs in a SQLite sidecar under DATA_DIR; once the cache
+    holds more than `max_entries` vectors the least recently used are evicted.
+    """
+    settings = Settings()
+
+    def __init__(self, path: str = None, max_entries: int = None):
+        self.path = Path(path or self.settings.EMBEDDING_CACHE_PATH)
+        self.max_entries = max_entries or self.settings.EMBEDDING_CACHE_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " chunk_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, chunk_hash))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def chunk_hash(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get_many(self, model: str, hashes: List[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings for hashes, returning None for each miss."""
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit.
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT chunk_hash, vector FROM embeddings WHERE model = ?"
+                    f" AND chunk_hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch],
+                ).fetchall()
+                found.update(rows)
+            hit_count = sum(1 for h in hashes if h in found)
+            self.hits += hit_count
+            self.misses += len(hashes) - hit_count
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND chunk_hash = ?",
+                    [(now, model, h) for h in found],
+                )
+                self._conn.commit()
+
+        results = []
+        for h in hashes:
+            blob = found.get(h)
+            results.append(array('f', blob).tolist() if blob is not None else None)
+        return results
+
+    def put_many(self, model: str, hashes: List[str], embeddings: List[List[float]]) -> None:
+        """Store embeddings, evicting least recently used entries if over capacity."""
+        now = time.time()
+        rows = [(model, h, array('f', e).tobytes(), now) for h, e in zip(hashes, embeddings)]
+        with self._lock:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, chunk_hash, vector, last_used)"
+                " VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._count += cursor.rowcount
+            if self._count > self.max_entries:
+                # Evict down to 90% so eviction doesn't run on every insert.
+                excess = self._count - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN"
+                    " (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self._count -= excess
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses, entries = self.hits, self.misses, self._count
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
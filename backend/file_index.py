@@ -0,0 +1,102 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Settings
+from vector_store import truncate_embeddings
+
+
+class FileIndex:
+    """File-level collection: one pooled chunk vector per file.
+
+    The first stage of two-stage search: a query finds its nearest files
+    here, then the chunk query is restricted to those files, so a few large
+    files with many similar chunks can't fill the whole candidate window.
+    Vectors are the mean (or max, per FILE_VECTOR_POOLING) of a file's
+    normalized chunk vectors, truncated to `dims` like the chunk collection.
+    """
+    settings = Settings()
+
+    def __init__(self, collection, dims: int = 0, pooling: str = None):
+        self.collection = collection
+        self.dims = dims
+        self.pooling = pooling or self.settings.FILE_VECTOR_POOLING
+        if self.pooling not in ("mean", "max"):
+            raise ValueError(f"Unknown FILE_VECTOR_POOLING: {self.pooling!r}")
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def pool(self, embeddings) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors = truncate_embeddings(vectors, vectors.shape[1])
+        pooled = vectors.mean(axis=0) if self.pooling == "mean" else vectors.max(axis=0)
+        return truncate_embeddings(pooled, self.dims or len(pooled))
+
+    def put(self, file_path: str, embeddings, metadata: Dict) -> None:
+        """Store a file's pooled vector, or drop it if the file has no chunks."""
+        self.put_many([(file_path, embeddings, metadata)])
+
+    def put_many(self, files: Sequence[Tuple[str, Sequence, Dict]]) -> None:
+        """put() for several (file_path, chunk embeddings, metadata) in one upsert."""
+        self.delete([file_path for file_path, embeddings, _ in files if not len(embeddings)])
+        files = [f for f in files if len(f[1])]
+        if files:
+            self.collection.upsert(
+                ids=[file_path for file_path, _, _ in files],
+                embeddings=[self.pool(embeddings).tolist() for _, embeddings, _ in files],
+                metadatas=[{**metadata, "file_path": file_path} for file_path, _, metadata in files],
+            )
+
+    def delete(self, file_paths: List[str]) -> None:
+        if file_paths:
+            self.collection.delete(ids=list(file_paths))
+
+    def top_files(self, query_embeddings: Sequence[Sequence[float]], n_files: int,
+                  where: Optional[Dict] = None) -> List[List[str]]:
+        """Each query's n_files nearest files (among those matching where), best first."""
+        results = self.collection.query(
+            query_embeddings=[list(e) for e in query_embeddings], n_results=n_files,
+            where=where, include=[]
+        )
+        return results["ids"] or [[] for _ in query_embeddings]
+
+    def rebuild_from_collection(self, chunks, page_size: int = 5000) -> int:
+        """Pool the vectors of every file already in the chunk collection (one-time migration)."""
+        pooled: Dict[str, np.ndarray] = {}
+        metadatas: Dict[str, Dict] = {}
+        offset = 0
+        while True:
+            results = chunks.get(include=["metadatas", "embeddings"], limit=page_size, offset=offset)
+            ids = results.get("ids") or []
+            if not len(ids):
+                break
+            vectors = np.asarray(results["embeddings"], dtype=np.float32)
+            vectors = truncate_embeddings(vectors, vectors.shape[1])
+            for vector, metadata in zip(vectors, results["metadatas"]):
+                file_path = metadata["file_path"]
+                if file_path not in pooled:
+                    pooled[file_path] = vector.copy()
+                    metadatas[file_path] = file_metadata(metadata)
+                elif self.pooling == "mean":
+                    # Sums; normalizing below turns them into mean directions.
+                    pooled[file_path] += vector
+                else:
+                    np.maximum(pooled[file_path], vector, out=pooled[file_path])
+            offset += len(ids)
+
+        paths = list(pooled)
+        for start in range(0, len(paths), page_size):
+            batch = paths[start:start + page_size]
+            # Chunk embeddings are already at self.dims; only normalize.
+            vectors = np.stack([pooled[p] for p in batch])
+            vectors = truncate_embeddings(vectors, vectors.shape[1])
+            self.collection.upsert(ids=batch, embeddings=vectors.tolist(),
+                                   metadatas=[metadatas[p] for p in batch])
+        return len(paths)
+
+
+def file_metadata(chunk_metadata: Dict) -> Dict:
+    """The file-level fields of a chunk's metadata, stored with its file's pooled vector."""
+    keys = ("file_path", "file_name", "file_dir", "file_extension", "modified_ts", "total_chunks")
+    return {key: chunk_metadata[key] for key in keys if key in chunk_metadata}
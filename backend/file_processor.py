@@ -1,16 +1,88 @@
 from math import ceil
 import os
-from pathlib import Path
-from typing import Optional
-from pptx import Presentation
+import re
+import zlib
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
 import fileindexer_extract as _native
 
 from config import Settings
+from text_cache import TextCache
+
+# (path, text, text_hash, chunks, error), as yielded by FileProcessor.iter_files_parallel.
+ExtractedFile = Tuple[str, Optional[str], Optional[str], Optional[List[Tuple[int, int, str]]], Optional[str]]
+
+class FileStat(NamedTuple):
+    """The stat fields used for change detection, as returned by the native scanner."""
+    path: str
+    size: int
+    mtime_ns: int
+    inode: int
+
+    @classmethod
+    def from_path(cls, path) -> "FileStat":
+        st = os.stat(path)
+        # The native scanner only reports inodes on Unix; match it elsewhere.
+        inode = st.st_ino if os.name == "posix" else 0
+        return cls(str(path), st.st_size, st.st_mtime_ns, inode)
+
+    @property
+    def mtime(self) -> float:
+        return self.mtime_ns / 1e9
+
+
+class CachedExtractStream:
+    """Extraction stream that serves texts from a TextCache before extracting the rest.
+
+    Cache hits are yielded first, without text hash or chunks (the caller
+    computes them), while the native stream extracts the misses in the
+    background; each text it extracts is stored under the file's raw-bytes
+    hash on the way through.
+    """
+
+    def __init__(self, cache: TextCache, hits: List[str], stream, raw_hashes: Dict[str, str],
+                 extract_options: Dict, timeout_s: float = 0.0):
+        self.cache = cache
+        self.hits = hits
+        self.stream = stream
+        self.raw_hashes = raw_hashes
+        self.extract_options = extract_options
+        self.timeout_s = timeout_s
+        self._late_times: List[Tuple[str, float]] = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> ExtractedFile:
+        if self.hits:
+            path = self.hits.pop()
+            text = self.cache.get(self.raw_hashes[path])
+            if text is not None:
+                return path, text, None, None, None
+            # Evicted since the lookup (by another process): extract it now,
+            # under the same timeout (and so quarantine) as the other misses.
+            late = _native.ExtractStream([path], 1, timeout_s=self.timeout_s, **self.extract_options)
+            item = next(late)
+            self._late_times.extend(late.extract_times())
+        else:
+            item = next(self.stream)
+        path, text = item[0], item[1]
+        if text is not None and path in self.raw_hashes:
+            self.cache.put(self.raw_hashes[path], text)
+        return item
+
+    def extract_times(self) -> List[Tuple[str, float]]:
+        return self.stream.extract_times() + self._late_times
+
 
 class FileProcessor:
     """Class to handle file processing and text extraction."""
     settings = Settings()
 
+    def __init__(self, text_cache: Optional[TextCache] = None):
+        if text_cache is None and self.settings.TEXT_CACHE_ENABLED:
+            text_cache = TextCache()
+        self.text_cache = text_cache
+
     @staticmethod
     def extract_text_from_pdf(file_path: str) -> Optional[str]:
         """Extract text from a PDF file (Rust implementation)."""
@@ -23,19 +95,14 @@ class FileProcessor:
     
     @staticmethod
     def extract_text_from_pptx(file_path: str) -> Optional[str]:
-        """Extract text from a PPTX file."""
-        try:
-            prs = Presentation(file_path)
-            text = []
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text.append(shape.text)
-            return "\n".join(text)
-        except Exception as e:
-            print(f"Error extracting text from PPTX: {e}")
-            return None
-    
+        """Extract text from a PPTX file, slide by slide (Rust implementation)."""
+        return _native.extract_text_from_pptx(str(file_path))
+
+    @staticmethod
+    def extract_text_from_xlsx(file_path: str) -> Optional[str]:
+        """Extract cell text from an XLSX file, sheet by sheet (Rust implementation)."""
+        return _native.extract_text_from_xlsx(str(file_path))
+
     @staticmethod
     def extract_text(file_path: str) -> Optional[str]:
         """Extract text from a TXT or MD file (Rust implementation)."""
@@ -43,30 +110,141 @@ class FileProcessor:
 
     @staticmethod
     def process_file(file_path: str) -> Optional[str]:
-        """Process a file and extract its text based on the file type."""
-        extension = Path(file_path).suffix.lower()
-        if extension == '.pptx':
-            return FileProcessor.extract_text_from_pptx(file_path)
+        """Process a file and extract its text based on the file type (Rust implementation)."""
         return _native.process_file(str(file_path))
 
     @staticmethod
     def process_files_parallel(file_paths: list) -> list:
-        """Extract text from every file in parallel (Rust, GIL released).
+        """Extract text from every file in parallel (Rust, GIL released)."""
+        return _native.process_files_parallel([str(p) for p in file_paths])
+
+    def iter_files_parallel(self, file_paths: list, buffer: int = 64,
+                            raw_hashes: Dict[str, str] = None) -> Iterator[ExtractedFile]:
+        """Yield (path, text, text_hash, chunks, error) for every file as soon
+        as it's extracted (Rust, GIL released).
+
+        Files are extracted in parallel, largest first (long PDFs also split
+        their pages across cores), and yielded in completion order; at
+        most `buffer` extracted texts wait for the consumer, so memory stays
+        bounded however many files there are. text_hash is the SHA-256 of the
+        text (as Indexer.get_file_hash). With CHUNKING_MODE "fixed", chunks
+        are (start, end, chunk sha256) spans of the text computed in the same
+        native task; in "cdc" mode they are None and the caller chunks.
+
+        Each file gets EXTRACT_TIMEOUT_S, MAX_FILE_SIZE_MB of input and
+        EXTRACT_MAX_TEXT_MB of text; a file that fails or goes over budget
+        comes back with text None and error set to "error", "timeout",
+        "file_too_large" or "text_too_large". The stream's extract_times()
+        lists (path, seconds) per file so far.
 
-        Assumes no .pptx paths are present (not in VALID_FILE_EXTENSIONS,
-        and .pptx isn't supported by the Rust extractor).
+        With the text cache on, files whose raw bytes (hashed here unless
+        raw_hashes has them) were extracted before come from the cache, with
+        text_hash and chunks None, and new texts are added to it.
         """
-        return _native.process_files_parallel([str(p) for p in file_paths])
+        paths = [str(p) for p in file_paths]
+        options = self._extract_options()
+        timeout_s = self.settings.EXTRACT_TIMEOUT_S
+        if self.text_cache is None:
+            return _native.ExtractStream(paths, buffer, timeout_s=timeout_s, **options)
+
+        raw_hashes = dict(raw_hashes or {})
+        unhashed = [p for p in paths if p not in raw_hashes]
+        for path, raw_hash in zip(unhashed, self.hash_files_parallel(unhashed)):
+            if raw_hash is not None:
+                raw_hashes[path] = raw_hash
+        cached = self.text_cache.cached(raw_hashes[p] for p in paths if p in raw_hashes)
+        hits = [p for p in paths if raw_hashes.get(p) in cached]
+        misses = [p for p in paths if raw_hashes.get(p) not in cached]
+        stream = _native.ExtractStream(misses, buffer, timeout_s=timeout_s, **options)
+        return CachedExtractStream(self.text_cache, hits, stream, raw_hashes, options, timeout_s)
+
+    @classmethod
+    def _extract_options(cls) -> Dict:
+        """Chunking and size-budget arguments for the native extractor."""
+        settings = cls.settings
+        native_chunking = settings.CHUNKING_MODE == "fixed"
+        return {
+            "chunk_size": settings.CHUNK_SIZE if native_chunking else 0,
+            "overlap": settings.CHUNK_OVERLAP if native_chunking else 0,
+            "max_bytes": settings.MAX_FILE_SIZE_MB * 1024 * 1024,
+            "max_text_bytes": settings.EXTRACT_MAX_TEXT_MB * 1024 * 1024,
+        }
+
+    IGNORE_FILE_NAME = ".fileindexerignore"
+
+    @staticmethod
+    def scan_directory(directory, extensions: list = None) -> List[FileStat]:
+        """Recursively find indexable files under directory in one parallel pass (Rust).
+
+        Skips hidden entries, SCAN_IGNORE_DIRS, anything matched by a
+        .fileindexerignore file, symlinks and files over MAX_FILE_SIZE_MB.
+        """
+        settings = FileProcessor.settings
+        extensions = extensions or settings.VALID_FILE_EXTENSIONS
+        entries = _native.scan_directory(
+            str(directory),
+            [e.lower() for e in extensions],
+            max_size=settings.MAX_FILE_SIZE_MB * 1024 * 1024,
+            skip_hidden=settings.SCAN_SKIP_HIDDEN,
+            ignore_dirs=settings.SCAN_IGNORE_DIRS,
+            ignore_file=FileProcessor.IGNORE_FILE_NAME,
+        )
+        return [FileStat(*entry) for entry in entries]
+
+    @staticmethod
+    def scan_includes(root, path, extensions: list = None) -> bool:
+        """Whether scan_directory(root) would list path by its name and the ignore rules.
+
+        Sizes aren't checked, so paths that no longer exist can be judged too.
+        """
+        settings = FileProcessor.settings
+        extensions = extensions or settings.VALID_FILE_EXTENSIONS
+        return _native.scan_includes(
+            str(root), str(path),
+            [e.lower() for e in extensions],
+            skip_hidden=settings.SCAN_SKIP_HIDDEN,
+            ignore_dirs=settings.SCAN_IGNORE_DIRS,
+            ignore_file=FileProcessor.IGNORE_FILE_NAME,
+        )
+
+    @staticmethod
+    def stuck_extractions() -> int:
+        """Extraction threads still busy with files that timed out (they can't be interrupted)."""
+        return _native.stuck_extractions()
+
+    @staticmethod
+    def hash_files_parallel(file_paths: list) -> list:
+        """Fast XXH3-128 hash of each file's raw bytes, in parallel (Rust, GIL released)."""
+        return _native.hash_files_parallel([str(p) for p in file_paths])
     
     @staticmethod
     def chunk_text(text: str, chunk_size: int = settings.CHUNK_SIZE, overlap: int = settings.CHUNK_OVERLAP) -> list:
-        """Chunk text into smaller pieces."""
-        chunks = []
+        """Chunk text into smaller pieces using the configured CHUNKING_MODE."""
+        return [text[start:end] for start, end in FileProcessor.chunk_spans(text, chunk_size, overlap)]
+
+    @staticmethod
+    def chunk_spans(text: str, chunk_size: int = settings.CHUNK_SIZE,
+                    overlap: int = settings.CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+        """(start, end) offsets of chunk_text's chunks, without slicing them out."""
+        if FileProcessor.settings.CHUNKING_MODE == "cdc":
+            return FileProcessor.chunk_spans_cdc(text, chunk_size, overlap)
+        return FileProcessor.chunk_spans_fixed(len(text), chunk_size, overlap)
+
+    @staticmethod
+    def chunk_text_fixed(text: str, chunk_size: int = settings.CHUNK_SIZE, overlap: int = settings.CHUNK_OVERLAP) -> list:
+        """Chunk text into evenly sized, overlapping pieces."""
+        return [text[start:end] for start, end in FileProcessor.chunk_spans_fixed(len(text), chunk_size, overlap)]
+
+    @staticmethod
+    def chunk_spans_fixed(text_length: int, chunk_size: int = settings.CHUNK_SIZE,
+                          overlap: int = settings.CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+        """Spans for chunk_text_fixed. The native extractor computes the same
+        spans (fixed_chunk_spans in lib.rs); keep the two in step."""
+        spans = []
         start = 0
-        text_length = len(text)
 
         if (text_length <= chunk_size):
-            return [text]
+            return [(0, text_length)]
 
         num_chunks = ceil((text_length - overlap) / (chunk_size - overlap))
         chunk_size = ceil(text_length / num_chunks) + overlap
@@ -74,7 +252,71 @@ class FileProcessor:
         
         while start < text_length:
             end = min(start + chunk_size, text_length)
-            chunks.append(text[start:end])
+            spans.append((start, end))
             start += chunk_size - overlap
             
-        return chunks
\ No newline at end of file
+        return spans
+
+    # Natural break points (paragraph, line, sentence end) that CDC boundaries snap to.
+    _BREAK_RE = re.compile(r"\n\s*\n|\n|[.!?][\"')\]]?\s")
+    # Characters before a break that decide whether it becomes a boundary.
+    CDC_WINDOW = 32
+
+    @staticmethod
+    def chunk_text_cdc(text: str, chunk_size: int = settings.CHUNK_SIZE, overlap: int = settings.CHUNK_OVERLAP) -> list:
+        """Chunk text at content-defined boundaries (see chunk_spans_cdc)."""
+        return [text[start:end] for start, end in FileProcessor.chunk_spans_cdc(text, chunk_size, overlap)]
+
+    @staticmethod
+    def chunk_spans_cdc(text: str, chunk_size: int = settings.CHUNK_SIZE,
+                        overlap: int = settings.CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+        """Chunk text at content-defined boundaries that survive edits elsewhere.
+
+        Every natural break is a candidate boundary, and a candidate is taken
+        when a hash of the CDC_WINDOW characters before it is divisible by
+        CDC_BOUNDARY_DIVISOR. Whether a break is a boundary therefore depends
+        only on the text around it, so inserting a paragraph near the start of
+        a document only changes the chunks next to the edit. Chunks are kept
+        between chunk_size / 2 and chunk_size * 3 / 2 characters (falling back
+        to the last break, then a hard cut, when no boundary qualifies), and
+        each chunk after the first is prefixed with `overlap` characters of
+        the one before it.
+        """
+        text_length = len(text)
+        if text_length <= chunk_size:
+            return [(0, text_length)]
+
+        min_size = chunk_size // 2
+        max_size = chunk_size * 3 // 2
+        divisor = FileProcessor.settings.CDC_BOUNDARY_DIVISOR
+        window = FileProcessor.CDC_WINDOW
+
+        breaks = [m.end() for m in FileProcessor._BREAK_RE.finditer(text)]
+        boundaries = []
+        start = 0
+        last_break = None
+        for pos in breaks:
+            while pos - start > max_size:
+                # No content-defined boundary in range: cut at the last break
+                # seen, or mid-text if there was none.
+                cut = last_break if last_break is not None else start + max_size
+                boundaries.append(cut)
+                start, last_break = cut, None
+            if pos - start < min_size or pos >= text_length:
+                continue
+            last_break = pos
+            digest = zlib.crc32(text[max(0, pos - window):pos].encode())
+            if digest % divisor == 0:
+                boundaries.append(pos)
+                start, last_break = pos, None
+        while text_length - start > max_size:
+            cut = last_break if last_break is not None else start + max_size
+            boundaries.append(cut)
+            start, last_break = cut, None
+
+        spans = []
+        prev = 0
+        for end in boundaries + [text_length]:
+            spans.append((max(0, prev - overlap), end))
+            prev = end
+        return spans
@@ -1,19 +1,189 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
 import ollama
-from typing import List
 from config import Settings
+from embedding_cache import EmbeddingCache
+from query_cache import LRUCache, normalize_query
+
+
+class AdaptiveBatcher:
+    """Tunes embedding batch size and concurrency from measured latency.
+
+    Batch size (in characters) grows while requests come back well under the
+    target latency and shrinks when they overshoot it. Concurrency hill-climbs
+    on throughput: every window of batches it keeps moving in the direction
+    that last improved chars/s, and reverses when throughput drops.
+    """
+    settings = Settings()
+
+    WINDOW = 8  # batches per concurrency adjustment
+
+    def __init__(self):
+        self.batch_chars = self.settings.EMBED_BATCH_CHARS
+        self.concurrency = min(2, self.settings.EMBED_MAX_CONCURRENCY)
+        self._lock = threading.Lock()
+        self._direction = 1
+        self._window_chars = 0
+        self._window_start = None
+        self._window_batches = 0
+        self._last_throughput = 0.0
+
+    def record(self, n_chars: int, latency: float) -> None:
+        """Record one completed embed request of n_chars taking latency seconds."""
+        s = self.settings
+        with self._lock:
+            target = s.EMBED_TARGET_LATENCY_S
+            if latency > target:
+                self.batch_chars = max(s.EMBED_MIN_BATCH_CHARS, int(self.batch_chars * 0.75))
+            elif latency < target / 2 and n_chars >= self.batch_chars * 0.9:
+                self.batch_chars = min(s.EMBED_MAX_BATCH_CHARS, int(self.batch_chars * 1.25))
+
+            now = time.perf_counter()
+            if self._window_start is None:
+                self._window_start = now - latency
+            self._window_chars += n_chars
+            self._window_batches += 1
+            if self._window_batches < self.WINDOW:
+                return
+
+            throughput = self._window_chars / max(now - self._window_start, 1e-9)
+            if throughput < self._last_throughput * 0.95:
+                self._direction = -self._direction
+            self._last_throughput = throughput
+            self.concurrency = min(
+                s.EMBED_MAX_CONCURRENCY, max(1, self.concurrency + self._direction)
+            )
+            self._window_chars = 0
+            self._window_batches = 0
+            self._window_start = now
+
+    def split(self, texts: List[str]) -> List[range]:
+        """Split texts into consecutive index ranges of about batch_chars each."""
+        budget = self.batch_chars
+        batches = []
+        start = 0
+        size = 0
+        for i, text in enumerate(texts):
+            if i > start and size + len(text) > budget:
+                batches.append(range(start, i))
+                start, size = i, 0
+            size += len(text)
+        if start < len(texts):
+            batches.append(range(start, len(texts)))
+        return batches
+
 
 class GenerateEmbedding:
-    def __init__(self, model_name: str = Settings().EMBEDDING_MODEL):
+    settings = Settings()
+
+    def __init__(self, model_name: str = Settings().EMBEDDING_MODEL, cache: Optional[EmbeddingCache] = None):
         self.model_name = model_name
+        if cache is None and self.settings.EMBEDDING_CACHE_ENABLED:
+            cache = EmbeddingCache()
+        self.cache = cache
+        self.client = ollama.Client(host=self.settings.OLLAMA_BASE_URL)
+        # Created on first use so it binds to the running event loop.
+        self._async_client: Optional[ollama.AsyncClient] = None
+        self.batcher = AdaptiveBatcher()
+        self.query_cache = LRUCache(self.settings.QUERY_EMBEDDING_CACHE_SIZE)
+        # Sized for the upper bound; the batcher decides how many requests are
+        # actually in flight (match this to Ollama's OLLAMA_NUM_PARALLEL).
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.settings.EMBED_MAX_CONCURRENCY,
+            thread_name_prefix="embed",
+        )
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        t0 = time.perf_counter()
+        response = self.client.embed(model=self.model_name, input=texts)
+        self.batcher.record(sum(len(t) for t in texts), time.perf_counter() - t0)
+        return response['embeddings']
 
     def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of texts using the Ollama API."""
+        """Generate embeddings for a list of texts, using the cache where possible.
+
+        Texts already in the embedding cache (and duplicates within `texts`)
+        are not sent to Ollama. Embeddings are returned in the same order as texts.
+        """
         if not texts:
             return []
-        response = ollama.embed(model=self.model_name, input=texts)
-        return response['embeddings']
-    
+        if self.cache is None:
+            return self._embed_uncached(texts)
+
+        hashes = [EmbeddingCache.chunk_hash(t) for t in texts]
+        embeddings = self.cache.get_many(self.model_name, hashes)
+
+        missing = {}
+        for text, h, embedding in zip(texts, hashes, embeddings):
+            if embedding is None and h not in missing:
+                missing[h] = text
+        if missing:
+            new_embeddings = self._embed_uncached(list(missing.values()))
+            self.cache.put_many(self.model_name, list(missing), new_embeddings)
+            by_hash = dict(zip(missing, new_embeddings))
+            embeddings = [e if e is not None else by_hash[h] for e, h in zip(embeddings, hashes)]
+        return embeddings
+
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with Ollama.
+
+        Texts are regrouped into batches of the batcher's current character
+        budget and up to `batcher.concurrency` requests are kept in flight.
+        """
+        embeddings: List[List[float]] = [None] * len(texts)
+        pending = []
+        for batch in self.batcher.split(texts):
+            # Respect the current concurrency limit before submitting more work.
+            while len(pending) >= self.batcher.concurrency:
+                done_batch, future = pending.pop(0)
+                embeddings[done_batch.start:done_batch.stop] = future.result()
+            future = self._executor.submit(self._embed_batch, texts[batch.start:batch.stop])
+            pending.append((batch, future))
+
+        for batch, future in pending:
+            embeddings[batch.start:batch.stop] = future.result()
+        return embeddings
+
     def embed_query(self, query: str) -> List[float]:
-        """Generate an embedding for a single query string."""
-        response = ollama.embed(model=self.model_name, input=query)
-        return response['embeddings'][0]
\ No newline at end of file
+        """Generate an embedding for a single query string (LRU-cached per model)."""
+        return self.embed_queries([query])[0]
+
+    async def embed_query_async(self, query: str) -> List[float]:
+        """Like embed_query, but awaits Ollama instead of blocking the event loop."""
+        return (await self.embed_queries_async([query]))[0]
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed several queries, sending all uncached ones in a single Ollama call."""
+        keys, embeddings, missing = self._query_cache_lookup(queries)
+        if missing:
+            response = self.client.embed(model=self.model_name, input=missing)
+            self._query_cache_fill(keys, embeddings, missing, response['embeddings'])
+        return embeddings
+
+    async def embed_queries_async(self, queries: List[str]) -> List[List[float]]:
+        """embed_queries without blocking the event loop."""
+        keys, embeddings, missing = self._query_cache_lookup(queries)
+        if missing:
+            if self._async_client is None:
+                self._async_client = ollama.AsyncClient(host=self.settings.OLLAMA_BASE_URL)
+            response = await self._async_client.embed(model=self.model_name, input=missing)
+            self._query_cache_fill(keys, embeddings, missing, response['embeddings'])
+        return embeddings
+
+    def _query_cache_lookup(self, queries: List[str]):
+        """Return (cache keys, cached embeddings or None, distinct uncached queries)."""
+        keys = [(self.model_name, normalize_query(q)) for q in queries]
+        embeddings = [self.query_cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(key[1] for key, e in zip(keys, embeddings) if e is None))
+        return keys, embeddings, missing
+
+    def _query_cache_fill(self, keys, embeddings, missing: List[str], new_embeddings) -> None:
+        by_query = dict(zip(missing, new_embeddings))
+        for query, embedding in by_query.items():
+            self.query_cache.put((self.model_name, query), embedding)
+        for i, key in enumerate(keys):
+            if embeddings[i] is None:
+                embeddings[i] = by_query[key[1]]
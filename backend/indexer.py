@@ -1,14 +1,56 @@
+import asyncio
 import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Callable
+from typing import AsyncIterator, List, Dict, Callable, Optional, Set, Tuple
 from datetime import datetime
 
 import chromadb
+import numpy as np
 from chromadb.config import Settings as ChromaSettings
 
 from config import Settings
-from file_processor import FileProcessor
+from file_index import FileIndex, file_metadata
+from file_processor import FileProcessor, FileStat
+from embedding_cache import EmbeddingCache
 from generate_embedding import GenerateEmbedding
+from manifest import FileManifest
+from pipeline import IndexingPipeline
+from keyword_index import KeywordIndex
+from query_cache import GenerationCounter, LRUCache, normalize_query
+from scoring import aggregate_file_scores, preliminary_results
+from search_filters import SearchFilters
+from text_cache import TextCache
+from tracked_collection import TrackedCollection
+from vector_store import FullVectorStore, truncate_embeddings
+
+def derived_metadata(record: Dict) -> Dict:
+    """Metadata computed from a manifest record, as written with each chunk."""
+    path = Path(record["file_path"])
+    metadata = {"file_extension": path.suffix.lower(), "file_dir": str(path.parent)}
+    if record.get("mtime_ns") is not None:
+        metadata["modified_ts"] = record["mtime_ns"] / 1e9
+    elif record.get("modified_time"):
+        metadata["modified_ts"] = datetime.fromisoformat(record["modified_time"]).timestamp()
+    return metadata
+
+
+def _cosine(query_embedding, vectors) -> np.ndarray:
+    """Cosine similarity of one query embedding to each row of vectors."""
+    q = np.asarray(query_embedding, dtype=np.float64)
+    m = np.asarray(vectors, dtype=np.float64)
+    norms = np.linalg.norm(m, axis=1) * (np.linalg.norm(q) or 1.0)
+    return m @ q / np.where(norms > 0, norms, 1.0)
+
+
+# Bumped whenever the metadata derived for each file changes; indexes written
+# under an older version are brought up to date by Indexer._migrate_metadata.
+# 1: lowercase file extensions. 2: numeric modified_ts on every chunk.
+# 3: file_dir, for path prefix filters.
+METADATA_VERSION = 3
+
 
 class Indexer:
     """Class to handle indexing of files into a ChromaDB collection."""
@@ -19,229 +61,877 @@ class Indexer:
         progress_callback: Callable[[str, int, int], None] = None,
         chroma_dir: str = None,
         collection_name: str = None,
+        embedding_cache_path: str = None,
+        manifest_path: str = None,
+        text_cache_path: str = None,
     ):
-        self.generate_embedding = GenerateEmbedding()
-        self.file_processor = FileProcessor()
+        cache = None
+        if embedding_cache_path and self.settings.EMBEDDING_CACHE_ENABLED:
+            cache = EmbeddingCache(embedding_cache_path)
+        self.generate_embedding = GenerateEmbedding(cache=cache)
+        text_cache = None
+        if text_cache_path and self.settings.TEXT_CACHE_ENABLED:
+            text_cache = TextCache(text_cache_path)
+        self.file_processor = FileProcessor(text_cache=text_cache)
         self.progress_callback = progress_callback
+        self.last_pipeline: Optional[IndexingPipeline] = None
+        # Serializes writers (indexing jobs, watchers) against the collection.
+        self._write_lock = threading.RLock()
 
         self.client = chromadb.PersistentClient(
             path=str(chroma_dir or self.settings.CHROMA_DB_DIR),
             settings=ChromaSettings(anonymized_telemetry=False)
         )
 
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name or self.settings.COLLECTION_NAME,
+        collection_name = collection_name or self.settings.COLLECTION_NAME
+        self.vector_dims = self.settings.VECTOR_DIMS
+        if self.vector_dims:
+            collection_name = f"{collection_name}_d{self.vector_dims}"
+        raw_collection = self.client.get_or_create_collection(
+            name=collection_name,
             metadata={"hnsw:space": "cosine"}
         )
+
+        # One pooled vector per file, for the first stage of two-stage search.
+        self.file_index = FileIndex(self.client.get_or_create_collection(
+            name=f"{collection_name}_files",
+            metadata={"hnsw:space": "cosine"}
+        ), self.vector_dims)
+
+        # The per-file manifest and the BM25 keyword index live next to the
+        # Chroma directory, one of each per collection.
+        index_dir = Path(chroma_dir or self.settings.CHROMA_DB_DIR).parent
+        if manifest_path is None:
+            manifest_path = index_dir / f"{collection_name}_manifest.sqlite3"
+        self.manifest = FileManifest(manifest_path)
+        self.keyword_index = KeywordIndex(index_dir / f"{collection_name}_keywords.sqlite3")
+        self.vector_store = None
+        if self.vector_dims:
+            self.vector_store = FullVectorStore(index_dir / f"{collection_name}_vectors")
+
+        if raw_collection.count() > 0:
+            if self.manifest.count() == 0:
+                rebuilt = self.manifest.rebuild_from_collection(raw_collection)
+                print(f"Rebuilt file manifest from collection ({rebuilt} files).")
+            if self.keyword_index.count() == 0:
+                rebuilt = self.keyword_index.rebuild_from_collection(raw_collection)
+                print(f"Rebuilt keyword index from collection ({rebuilt} chunks).")
+            if self.file_index.count() == 0:
+                rebuilt = self.file_index.rebuild_from_collection(raw_collection)
+                print(f"Rebuilt file-level index from collection ({rebuilt} files).")
+        self._migrate_metadata(raw_collection)
+
+        # Writes through self.collection are mirrored into the keyword index
+        # (and the full vector store) and bump self.generation, which
+        # invalidates cached search results.
+        self.generation = GenerationCounter()
+        self.collection = TrackedCollection(raw_collection, self.generation, self.keyword_index,
+                                            self.vector_store, self.vector_dims)
+        self.result_cache = LRUCache(self.settings.SEARCH_RESULT_CACHE_SIZE)
+        # Blocking search work (Chroma queries, scoring) runs on its own pool,
+        # off the event loop; BM25 lookups made from it use a second pool so
+        # a saturated query pool can't deadlock waiting on them.
+        self._query_pool = ThreadPoolExecutor(
+            max_workers=self.settings.SEARCH_WORKERS, thread_name_prefix="query"
+        )
+        self._search_pool = ThreadPoolExecutor(
+            max_workers=self.settings.SEARCH_WORKERS, thread_name_prefix="search"
+        )
+        # Searches currently being computed, so concurrent identical queries share one.
+        self._inflight: Dict[tuple, Future] = {}
+        self._inflight_waiters: Dict[tuple, int] = {}  # callers awaiting another's computation
+        self._inflight_lock = threading.Lock()
+        # Slowest extractions seen by this process, for /api/index/status.
+        self.slowest_files: List[Dict] = []
     
-    def scan_directory(self, directory_path: str):
-        """Scan a directory for files and index them."""
-        directory = Path(directory_path)
-        files = []
-        for ext in self.settings.VALID_FILE_EXTENSIONS:
-            files.extend(directory.glob(f'*{ext}'))
+    def _migrate_metadata(self, raw_collection) -> None:
+        """Rewrite the derived metadata of files indexed under an older METADATA_VERSION.
+
+        Filters match on these fields, so files indexed before they existed
+        (or changed) would silently drop out of filtered searches.
+        """
+        version = int(self.manifest.get_meta("metadata_version") or 0)
+        if version >= METADATA_VERSION:
+            return
+        migrated = 0
+        for records in self.manifest.iter_files():
+            derived = [{"file_path": r["file_path"], **derived_metadata(r)} for r in records]
+            ids, metadatas = [], []
+            for record, fields in zip(records, derived):
+                ids.extend(record["chunk_ids"])
+                metadatas.extend(fields for _ in record["chunk_ids"])
+            if ids:
+                raw_collection.update(ids=ids, metadatas=metadatas)
+            # Files without chunks have no file-level vector.
+            with_chunks = [fields for record, fields in zip(records, derived) if record["chunk_ids"]]
+            if with_chunks:
+                self.file_index.collection.update(ids=[f["file_path"] for f in with_chunks],
+                                                  metadatas=with_chunks)
+            self.manifest.update_derived(derived)
+            migrated += len(records)
+        self.manifest.set_meta("metadata_version", str(METADATA_VERSION))
+        if migrated:
+            print(f"Updated metadata of {migrated} indexed files to version {METADATA_VERSION}.")
+
+    def scan_directory(self, directory_path: str) -> List[FileStat]:
+        """Recursively scan a directory for files to index, with their stats."""
+        files = self.file_processor.scan_directory(directory_path)
 
         print(f"Found {len(files)} files to index.")
         return files
     
     def get_file_hash(self, file_text: str):
         return hashlib.sha256(file_text.encode()).hexdigest()
-    
-    def get_indexed_files(self) -> Dict[str, str]:
-        """Return {file_path: file_hash} for already-indexed files."""
-        results = self.collection.get(include=["metadatas"])
-        
-        indexed = {}
-        for md in results.get("metadatas", []):
-            indexed[md["file_path"]] = md["file_hash"]
-        
-        return indexed
-
-    def index_files(self, file_paths: list[Path]):
-        try:
-            file_paths = [p.resolve() for p in file_paths]
-            indexed_files = self.get_indexed_files()
-            current_files = {str(p): p for p in file_paths}
 
-            for indexed_path in indexed_files:
-                if indexed_path not in current_files:
-                    self.collection.delete(
-                        where={"file_path": {"$eq": indexed_path}}
-                    )
+    def get_chunk_hash(self, chunk: str):
+        return hashlib.sha256(chunk.encode()).hexdigest()
 
-            # Bulk-extract every file's text up front, in parallel across cores
-            # (Rust, GIL released) instead of one file at a time in the loop below.
-            extracted_texts = self.file_processor.process_files_parallel(file_paths)
+    @staticmethod
+    def make_chunk_ids(path_str: str, chunk_hashes: List[str]) -> List[str]:
+        """Content-addressed chunk ids: `path::<hash prefix>`.
 
-            for i, (file_path, file_text) in enumerate(zip(file_paths, extracted_texts)):
-                if self.progress_callback:
-                    self.progress_callback(f"Indexing {file_path}", i, len(file_paths))
+        An unchanged chunk keeps its id wherever it moves within the file, so
+        edits only touch the chunks that actually changed. Repeats of the same
+        chunk within a file get a `-n` suffix.
+        """
+        ids = []
+        seen: Dict[str, int] = {}
+        for chunk_hash in chunk_hashes:
+            key = chunk_hash[:16]
+            n = seen.get(key, 0)
+            seen[key] = n + 1
+            ids.append(f"{path_str}::{key}" if n == 0 else f"{path_str}::{key}-{n}")
+        return ids
 
-                if not file_text or not file_text.strip():
-                    continue
+    def get_chunk_ids(self, path_str: str) -> List[str]:
+        """Return the ids of every chunk stored for a file, from the manifest."""
+        record = self.manifest.get(path_str)
+        return record["chunk_ids"] if record else []
+    
+    def get_indexed_files(self) -> Dict[str, Dict]:
+        """Return {file_path: file-level record} for already-indexed files.
 
-                file_hash = self.get_file_hash(file_text)
-                path_str = str(file_path)
+        Each record holds file_hash plus the file_size, mtime_ns, inode and
+        raw_hash recorded at indexing time (None for files indexed before
+        stat-based change detection). Read from the manifest, not from Chroma.
+        """
+        return self.manifest.get_all()
 
-                if indexed_files.get(path_str) == file_hash:
+    def find_changed_files(
+        self, file_paths: List[Path], indexed_files: Dict[str, Dict],
+        file_stats: Dict[str, FileStat] = None,
+    ) -> Tuple[List[Path], Dict[str, FileStat], Dict[str, str]]:
+        """Decide which files need extracting, without reading their contents.
+
+        A file whose (size, mtime_ns, inode) match the indexed record is
+        skipped outright. When CHANGE_DETECTION_BYTE_HASH is on, files whose
+        stat changed but whose raw-bytes hash didn't are skipped too (and
+        their stored stat refreshed). Returns the files to extract, each
+        file's stat and, if hashing is on, each file's raw-bytes hash.
+        Stats already collected by the scanner are reused instead of re-statting.
+        Quarantined files are skipped until their size or mtime changes.
+        """
+        file_stats = file_stats or {}
+        max_size = self.settings.MAX_FILE_SIZE_MB * 1024 * 1024
+        quarantined = self.manifest.get_quarantined()
+        released = []
+        skipped_quarantined = 0
+        stats = {}
+        changed = []
+        for path in file_paths:
+            path_str = str(path)
+            st = file_stats.get(path_str)
+            if st is None:
+                try:
+                    st = FileStat.from_path(path)
+                except OSError as e:
+                    print(f"Error reading {path}: {e}")
+                    continue
+                if st.size > max_size:
+                    print(f"Skipping {path} ({st.size} bytes, over MAX_FILE_SIZE_MB)")
+                    continue
+            stats[path_str] = st
+            quarantine = quarantined.get(path_str)
+            if quarantine is not None:
+                if quarantine["file_size"] == st.size and quarantine["mtime_ns"] == st.mtime_ns:
+                    skipped_quarantined += 1
                     continue
+                # Changed since it failed: give it another try.
+                released.append(path_str)
+            record = indexed_files.get(path_str)
+            if (record
+                    and record["file_size"] == st.size
+                    and record["mtime_ns"] == st.mtime_ns
+                    and record["inode"] == st.inode):
+                continue
+            changed.append(path)
+        if released:
+            self.manifest.release_quarantine(released)
+        if skipped_quarantined:
+            print(f"Skipping {skipped_quarantined} quarantined file(s).")
+
+        raw_hashes = {}
+        if not self.settings.CHANGE_DETECTION_BYTE_HASH or not changed:
+            return changed, stats, raw_hashes
+
+        hashes = self.file_processor.hash_files_parallel(changed)
+        to_extract = []
+        for path, raw_hash in zip(changed, hashes):
+            path_str = str(path)
+            if raw_hash is not None:
+                raw_hashes[path_str] = raw_hash
+            record = indexed_files.get(path_str)
+            if record and raw_hash is not None and record["raw_hash"] == raw_hash:
+                self.refresh_file_stat(path_str, stats[path_str], raw_hash)
+                continue
+            to_extract.append(path)
+        return to_extract, stats, raw_hashes
+
+    def refresh_file_stat(self, path_str: str, st: FileStat, raw_hash: str = None) -> None:
+        """Record a new stat (and raw-bytes hash) for a file whose text didn't change."""
+        record = self.manifest.get(path_str)
+        if not record:
+            return
+        ids = record["chunk_ids"]
+        metadata = {
+            "file_size": st.size,
+            "mtime_ns": st.mtime_ns,
+            "inode": st.inode,
+            "modified_time": datetime.fromtimestamp(st.mtime).isoformat(),
+            "modified_ts": st.mtime,
+        }
+        if raw_hash:
+            metadata["raw_hash"] = raw_hash
+        if ids:
+            self.collection.update(ids=ids, metadatas=[metadata] * len(ids))
+        self.manifest.update_stat(path_str, st.size, st.mtime_ns, st.inode,
+                                  metadata["modified_time"], raw_hash)
+
+    def quarantine_file(self, path_str: str, st: Optional[FileStat], reason: str) -> None:
+        """Skip a file whose extraction failed or went over budget, until its stat changes."""
+        print(f"Quarantined {path_str} ({reason})")
+        self.manifest.quarantine(path_str, st.size if st else None, st.mtime_ns if st else None, reason)
+
+    def record_extract_times(self, extract_times: List[Tuple[str, float]]) -> None:
+        """Keep the STATUS_SLOWEST_FILES slowest extractions, latest time per file."""
+        seconds = {f["file_path"]: f["seconds"] for f in self.slowest_files}
+        seconds.update(extract_times)
+        slowest = sorted(seconds.items(), key=lambda item: item[1], reverse=True)
+        self.slowest_files = [
+            {"file_path": path_str, "seconds": secs}
+            for path_str, secs in slowest[:self.settings.STATUS_SLOWEST_FILES]
+        ]
+
+    def extraction_status(self) -> Dict:
+        """Quarantine counts and the slowest extractions, for /api/index/status."""
+        return {
+            "quarantine": self.manifest.quarantine_summary(),
+            "slowest_files": self.slowest_files,
+            "stuck_extractions": self.file_processor.stuck_extractions(),
+        }
+
+    def index_files(self, file_paths: list[Path], file_stats: List[FileStat] = None,
+                    prune: bool = True, prune_prefix: str = None, skip: Set[str] = None,
+                    stop_event: threading.Event = None,
+                    on_files_done: Callable[[List[str], int], None] = None) -> Dict:
+        """Index file_paths and return a summary (or {"error": ...}).
 
-                if path_str in indexed_files:
-                    self.collection.delete(
-                        where={"file_path": {"$eq": path_str}}
-                    )
-
-                chunks = self.file_processor.chunk_text(file_text)
-                embeddings = self.generate_embedding.generate_embeddings(chunks)
-
-                modified_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-
-                metadatas = []
-                ids = []
-
-                for chunk_idx, chunk in enumerate(chunks):
-                    metadatas.append({
-                        "file_name": file_path.name,
-                        "file_extension": file_path.suffix,
-                        "file_path": path_str,
-                        "file_hash": file_hash,
-                        "file_size": file_path.stat().st_size,
-                        "modified_time": modified_time.isoformat(),
-                        "total_chunks": len(chunks),
-                        "chunk_index": chunk_idx
-                    })
-                    ids.append(f"{path_str}::{chunk_idx}")
-
-                self.collection.add(
-                    documents=chunks,
-                    metadatas=metadatas,
-                    embeddings=embeddings,
-                    ids=ids
+        With prune, indexed files that are not among file_paths are removed
+        (only those under prune_prefix, if given). file_stats, as returned by
+        scan_directory, saves a stat per file; the scanner already yields
+        absolute, symlink-free paths. Files in skip are neither pruned nor
+        looked at (e.g. a resumed job's checkpointed files). stop_event and
+        on_files_done are passed to the IndexingPipeline; unchanged files
+        are reported done before it starts.
+        """
+        try:
+            with self._write_lock:
+                if file_stats is None:
+                    file_paths = [p.resolve() for p in file_paths]
+                stats_by_path = {f.path: f for f in file_stats or []}
+                indexed_files = self.get_indexed_files()
+
+                if prune:
+                    current_files = {str(p) for p in file_paths}
+                    self.remove_files([
+                        p for p in indexed_files
+                        if p not in current_files and (prune_prefix is None or p.startswith(prune_prefix))
+                    ])
+
+                total_files = len(file_paths)
+                if skip:
+                    file_paths = [p for p in file_paths if str(p) not in skip]
+
+                # Only files whose stat (or raw bytes) changed are extracted.
+                to_extract, stats, raw_hashes = self.find_changed_files(
+                    file_paths, indexed_files, stats_by_path
                 )
+                print(f"{len(file_paths) - len(to_extract)} unchanged, {len(to_extract)} to extract.")
+                if on_files_done is not None:
+                    extracting = {str(p) for p in to_extract}
+                    on_files_done([str(p) for p in file_paths if str(p) not in extracting], 0)
 
-                print(f"Indexed {file_path} ({len(chunks)} chunks)")
+                # Extraction, hash+chunk, embedding and DB writes overlap in a
+                # staged pipeline instead of running one after another per file.
+                pipeline = IndexingPipeline(self, indexed_files, self.progress_callback,
+                                            stats=stats, raw_hashes=raw_hashes,
+                                            stop_event=stop_event, on_files_done=on_files_done)
+                self.last_pipeline = pipeline
+                try:
+                    pipeline.run(to_extract)
+                finally:
+                    self.record_extract_times(pipeline.extract_times)
+
+                return {
+                    "total_files": total_files,
+                    "successful": total_files - pipeline.failed_files,
+                    "failed": pipeline.failed_files,
+                    "collection_count": self.collection.count(),
+                }
 
         except Exception as e:
             print(f"Error indexing files: {e}")
+            return {"error": str(e)}
+
+    def remove_files(self, file_paths: List[str]) -> None:
+        """Remove files' chunks from the collection and their manifest rows.
+
+        Chunks are deleted by the ids the manifest lists, WRITE_BATCH_SIZE at
+        a time, instead of one metadata-scanning where-delete per file.
+        """
+        if not file_paths:
+            return
+        with self._write_lock:
+            records = self.manifest.get_many(file_paths)
+            chunk_ids = [chunk_id for record in records.values() for chunk_id in record["chunk_ids"]]
+            batch_size = self.settings.WRITE_BATCH_SIZE
+            for start in range(0, len(chunk_ids), batch_size):
+                self.collection.delete(ids=chunk_ids[start:start + batch_size])
+            self.file_index.delete(file_paths)
+            self.manifest.delete_many(file_paths)
+
+    def chunk_embeddings(self, chunk_ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored embeddings of chunks by id (full vectors with compact vector storage); unknown ids are skipped."""
+        if self.vector_store is not None:
+            vectors, found = self.vector_store.get(chunk_ids)
+            return {chunk_id: vector for chunk_id, vector, hit in zip(chunk_ids, vectors, found) if hit}
+        fetched = self.collection.get(ids=chunk_ids, include=["embeddings"])
+        return dict(zip(fetched["ids"], np.asarray(fetched["embeddings"], dtype=np.float32)))
+
+    def rename_file(self, old_path: str, new_path: str) -> bool:
+        """Move an indexed file's chunks to a new path without re-embedding them.
+
+        Returns False if old_path isn't indexed, so the caller can index
+        new_path from scratch instead. The old record's stat is kept rather
+        than new_path's: a rename leaves size and mtime alone, so if the
+        moved file was also edited, change detection still sees it as changed.
+        """
+        with self._write_lock:
+            record = self.manifest.get(old_path)
+            if not record or not record["chunk_ids"]:
+                return False
+            results = self.collection.get(
+                ids=record["chunk_ids"], include=["documents", "metadatas", "embeddings"]
+            )
+            if not results["ids"]:
+                return False
+
+            order = sorted(range(len(results["ids"])),
+                           key=lambda i: results["metadatas"][i]["chunk_index"])
+            documents = [results["documents"][i] for i in order]
+            if self.vector_store is not None:
+                # The collection only has truncated embeddings; carry the full ones over.
+                full, found = self.vector_store.get([results["ids"][i] for i in order])
+                if not found.all():
+                    return False
+                embeddings = full
+            else:
+                embeddings = [results["embeddings"][i] for i in order]
+            chunk_hashes = [
+                results["metadatas"][i].get("chunk_hash") or self.get_chunk_hash(results["documents"][i])
+                for i in order
+            ]
+
+            path = Path(new_path)
+            metadatas = []
+            for i, chunk_hash in zip(order, chunk_hashes):
+                metadata = dict(results["metadatas"][i])
+                metadata.update({
+                    "file_name": path.name,
+                    "file_extension": path.suffix.lower(),
+                    "file_dir": str(path.parent),
+                    "file_path": new_path,
+                    "chunk_hash": chunk_hash,
+                })
+                metadatas.append(metadata)
+            ids = self.make_chunk_ids(new_path, chunk_hashes)
+
+            self.remove_files([new_path])
+            self.collection.add(documents=documents, metadatas=metadatas, embeddings=embeddings, ids=ids)
+            self.collection.delete(ids=results["ids"])
+            self.file_index.put(new_path, embeddings, file_metadata(metadatas[0]))
+            self.file_index.delete([old_path])
+
+            record.update({
+                "file_path": new_path,
+                "file_name": path.name,
+                "file_extension": path.suffix.lower(),
+                "chunk_ids": ids,
+            })
+            self.manifest.upsert(record)
+            self.manifest.delete_many([old_path])
+            return True
     
     def index_directory(self, directory_path: str):
-        """Scan and index all files in a directory."""
-        file_paths = self.scan_directory(directory_path)
-        self.index_files(file_paths)
+        """Scan and index all files in a directory.
 
-    def search(self, query: str, n_results: int = settings.SEARCH_RESULT_COUNT) -> List[Dict]:
-        """Search with hybrid scoring: semantic + keyword + recency"""
+        Indexed files under the directory that no longer exist are removed;
+        files indexed from other directories are left alone.
+        """
+        root = str(Path(directory_path).resolve())
+        files = self.scan_directory(root)
+        return self.index_files([Path(f.path) for f in files], file_stats=files,
+                                prune_prefix=root.rstrip(os.sep) + os.sep)
+
+    def search(self, query: str, n_results: int = settings.SEARCH_RESULT_COUNT,
+               filters: Optional[SearchFilters] = None) -> List[Dict]:
+        """Search with hybrid scoring, serving repeats from the result cache.
+
+        Cached results are stamped with the index generation they were
+        computed at and only reused while no write has happened since.
+        filters restrict the files searched (see SearchFilters).
+        """
+        key = (normalize_query(query), n_results, filters)
+        cached = self._cached_results(key)
+        if cached is not None:
+            return cached
+
+        future, owner = self._join_inflight(key)
+        if not owner:
+            return future.result()
+        generation = self.generation.value
         try:
-            query_embedding = self.generate_embedding.embed_query(query)
-            query_lower = query.lower()
-            query_terms = set(query_lower.split())
-            
-            # Retrieve more chunks initially for better file-level aggregation
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=min(n_results * 10, 100),  # Cap at 100 to avoid slowdown
-                include=["documents", "metadatas", "distances"]
-            )
-            
-            file_results = {}
-            
-            if results['ids']:
-                for i in range(len(results['ids'][0])):
-                    file_path = results['metadatas'][0][i]['file_path']
-                    chunk_text = results['documents'][0][i]
-                    distance = results['distances'][0][i]
-                    similarity = 1 - distance
-                    metadata = results['metadatas'][0][i]
-                    
-                    # Calculate keyword overlap score
-                    chunk_lower = chunk_text.lower()
-                    keyword_score = sum(1 for term in query_terms if term in chunk_lower) / len(query_terms)
-                    
-                    # Check for exact phrase match
-                    exact_match = query_lower in chunk_lower
-                    
-                    if file_path not in file_results:
-                        file_results[file_path] = {
-                            'file_path': file_path,
-                            'chunks': [],
-                            'similarities': [],
-                            'keyword_scores': [],
-                            'has_exact_match': False,
-                            'best_chunk': chunk_text,
-                            'best_similarity': similarity,
-                            'metadata': metadata
-                        }
-                    
-                    file_results[file_path]['chunks'].append(chunk_text)
-                    file_results[file_path]['similarities'].append(similarity)
-                    file_results[file_path]['keyword_scores'].append(keyword_score)
-                    
-                    if exact_match:
-                        file_results[file_path]['has_exact_match'] = True
-                    
-                    # Track best chunk for preview
-                    if similarity > file_results[file_path]['best_similarity']:
-                        file_results[file_path]['best_chunk'] = chunk_text
-                        file_results[file_path]['best_similarity'] = similarity
-            
-            aggregated_results = []
-            now = datetime.now()
-            
-            for file_path, data in file_results.items():
-                similarities = sorted(data['similarities'], reverse=True)
-                keyword_scores = sorted(data['keyword_scores'], reverse=True)
-                
-                # 1. Semantic score: Weighted average favoring top chunks
-                k = min(3, len(similarities))
-                weights = [0.5, 0.3, 0.2][:k]  # Top chunk gets 50%, second 30%, third 20%
-                semantic_score = sum(sim * w for sim, w in zip(similarities[:k], weights)) / sum(weights)
-                
-                # 2. Keyword score: Average of top-k keyword matches
-                keyword_score = sum(keyword_scores[:k]) / k if k > 0 else 0
-                
-                # 3. Coverage score: Reward files with multiple relevant chunks
-                coverage_ratio = min(len([s for s in similarities if s > 0.6]), 5) / 5
-                coverage_score = coverage_ratio * 0.15
-                
-                # 4. Recency score: Boost recently modified files
-                modified_time = datetime.fromisoformat(data['metadata']['modified_time'])
-                days_old = (now - modified_time).days
-                recency_score = max(0, (365 - days_old) / 365) * 0.1  # Max 10% boost for files <1 year old
-                
-                # 5. Exact match bonus
-                exact_match_bonus = 0.15 if data['has_exact_match'] else 0
-                
-                # Combined score
-                final_score = (
-                    semantic_score * 0.6 +      # 60% semantic
-                    keyword_score * 0.25 +      # 25% keyword
-                    coverage_score +             # 15% coverage
-                    recency_score +              # 10% recency
-                    exact_match_bonus            # 15% exact match bonus
+            results = self._search(query, n_results, filters=filters)
+        except BaseException as e:
+            self._finish_inflight(key, future, exception=e)
+            raise
+        self._finish_inflight(key, future, generation, results)
+        return results
+
+    async def search_async(self, query: str, n_results: int = settings.SEARCH_RESULT_COUNT,
+                           filters: Optional[SearchFilters] = None) -> List[Dict]:
+        """Non-blocking search for use from the event loop.
+
+        The query embedding comes from Ollama's async client and the Chroma
+        and BM25 lookups run on the query thread pool. Concurrent identical
+        queries (sync or async) await the same in-flight computation.
+        """
+        key = (normalize_query(query), n_results, filters)
+        cached = self._cached_results(key)
+        if cached is not None:
+            return cached
+
+        future, owner = self._join_inflight(key)
+        if not owner:
+            try:
+                # Shielded: a joiner's cancellation mustn't cancel the shared future.
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except asyncio.CancelledError:
+                self._leave_inflight(key, future)
+                raise
+        # The computation is its own task, so it outlives this request if the
+        # client goes away while other requests are waiting for it.
+        task = asyncio.ensure_future(self._compute_inflight_async(key, future, query, n_results, filters))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._abandon_inflight(key, future):
+                task.cancel()
+            raise
+
+    async def _compute_inflight_async(self, key: tuple, future: Future, query: str, n_results: int,
+                                      filters: Optional[SearchFilters]) -> List[Dict]:
+        generation = self.generation.value
+        try:
+            try:
+                query_embedding = await self.generate_embedding.embed_query_async(query)
+            except Exception as e:
+                print(f"Search error: {e}")
+                results = []
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self._query_pool, self._search, query, n_results, query_embedding, filters
                 )
-                
-                aggregated_results.append({
-                    'file_path': file_path,
-                    'chunk_text': data['best_chunk'][:300] + "..." if len(data['best_chunk']) > 300 else data['best_chunk'],
-                    'similarity': final_score,
-                    'distance': 1 - final_score,
-                    'chunks': data['chunks'],
-                    'total_chunks': len(data['chunks']),
-                    'metadata': data['metadata'],
-                    # Debug scores (optional, remove in production)
-                    'scores': {
-                        'semantic': semantic_score,
-                        'keyword': keyword_score,
-                        'coverage': coverage_score,
-                        'recency': recency_score,
-                        'exact_match': exact_match_bonus
-                    }
-                })
-            
-            aggregated_results.sort(key=lambda x: x['similarity'], reverse=True)
-            
-            return aggregated_results[:n_results]
-            
+        except BaseException as e:
+            self._finish_inflight(key, future, exception=e)
+            raise
+        self._finish_inflight(key, future, generation, results)
+        return results
+
+    async def search_stream_async(self, query: str, n_results: int = settings.SEARCH_RESULT_COUNT,
+                                  filters: Optional[SearchFilters] = None) -> AsyncIterator[Tuple[str, List[Dict]]]:
+        """Yield ("preliminary", results) from the vector hits, then ("results", results).
+
+        Preliminary results are compact, one per file, ordered by raw vector
+        similarity; the final results are the full hybrid re-ranking, as
+        search() returns. A cached query yields only the final results.
+        """
+        key = (normalize_query(query), n_results, filters)
+        cached = self._cached_results(key)
+        if cached is not None:
+            yield "results", cached
+            return
+
+        generation = self.generation.value
+        loop = asyncio.get_running_loop()
+        # Outside the try: a filter that can't be applied is an error, not "no results".
+        where = self._filter_where(filters)
+        if filters is not None and where is None:
+            yield "results", []
+            return
+        try:
+            query_embedding = await self.generate_embedding.embed_query_async(query)
+            keyword_future = self._start_keyword_searches([query])[0]
+            vector_hits = (await loop.run_in_executor(
+                self._query_pool, self._vector_query, [query_embedding], n_results, where
+            ))[0]
+        except Exception as e:
+            print(f"Search error: {e}")
+            yield "results", []
+            return
+
+        yield "preliminary", preliminary_results(vector_hits, n_results)
+
+        try:
+            results = await loop.run_in_executor(
+                self._query_pool,
+                lambda: self._rerank(query, query_embedding, vector_hits, keyword_future.result(),
+                                     n_results, where),
+            )
+        except Exception as e:
+            print(f"Search error: {e}")
+            results = []
+        if results:
+            self.result_cache.put(key, (generation, results))
+        yield "results", results
+
+    def get_chunks(self, chunk_ids: List[str]) -> List[Dict]:
+        """Full text and metadata of chunks by id, in the order requested (unknown ids are skipped)."""
+        fetched = self.collection.get(ids=chunk_ids, include=["documents", "metadatas"])
+        by_id = {
+            chunk_id: {"id": chunk_id, "text": document, "metadata": metadata}
+            for chunk_id, document, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])
+        }
+        return [by_id[chunk_id] for chunk_id in dict.fromkeys(chunk_ids) if chunk_id in by_id]
+
+    def _cached_results(self, key: tuple) -> Optional[List[Dict]]:
+        cached = self.result_cache.get(key)
+        if cached is not None and cached[0] == self.generation.value:
+            return cached[1]
+        return None
+
+    def _join_inflight(self, key: tuple) -> Tuple[Future, bool]:
+        """Return the in-flight future for key and whether the caller owns (must compute) it."""
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._inflight_waiters[key] = self._inflight_waiters.get(key, 0) + 1
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _leave_inflight(self, key: tuple, future: Future) -> None:
+        """A joiner stopped waiting for key's computation."""
+        with self._inflight_lock:
+            if self._inflight.get(key) is future and self._inflight_waiters.get(key):
+                self._inflight_waiters[key] -= 1
+
+    def _abandon_inflight(self, key: tuple, future: Future) -> bool:
+        """The owner stopped waiting: drop key's computation if nobody else is waiting for it.
+
+        Returns whether it was dropped (so the caller should cancel it).
+        """
+        with self._inflight_lock:
+            if self._inflight.get(key) is not future or self._inflight_waiters.get(key):
+                return False
+            del self._inflight[key]
+            self._inflight_waiters.pop(key, None)
+        future.cancel()
+        return True
+
+    def _finish_inflight(self, key: tuple, future: Future, generation: int = None,
+                         results: List[Dict] = None, exception: BaseException = None) -> None:
+        with self._inflight_lock:
+            if self._inflight.get(key) is not future:
+                return  # abandoned by its owner with no one waiting
+            del self._inflight[key]
+            self._inflight_waiters.pop(key, None)
+        if exception is not None:
+            future.set_exception(exception)
+            return
+        if results:
+            self.result_cache.put(key, (generation, results))
+        future.set_result(results)
+
+    def search_batch(self, queries: List[str], n_results: int = settings.SEARCH_RESULT_COUNT,
+                     filters: Optional[SearchFilters] = None) -> Dict[str, List[Dict]]:
+        """Run many searches at once, returning {query: results}.
+
+        All uncached queries are embedded in one Ollama call and sent to
+        Chroma in one query; each still gets its own BM25 lookup, fusion and
+        file-level aggregation. filters apply to every query.
+        """
+        results, misses = self._batch_cache_lookup(queries, n_results, filters)
+        if misses:
+            generation = self.generation.value
+            embeddings = self.generate_embedding.embed_queries(misses)
+            self._batch_store(results, misses, n_results, filters, generation,
+                              self._search_many(misses, n_results, embeddings, filters))
+        return {query: results[normalize_query(query)] for query in queries}
+
+    async def search_batch_async(self, queries: List[str], n_results: int = settings.SEARCH_RESULT_COUNT,
+                                 filters: Optional[SearchFilters] = None) -> Dict[str, List[Dict]]:
+        """search_batch for use from the event loop (see search_async)."""
+        results, misses = self._batch_cache_lookup(queries, n_results, filters)
+        if misses:
+            generation = self.generation.value
+            embeddings = await self.generate_embedding.embed_queries_async(misses)
+            batch_results = await asyncio.get_running_loop().run_in_executor(
+                self._query_pool, self._search_many, misses, n_results, embeddings, filters
+            )
+            self._batch_store(results, misses, n_results, filters, generation, batch_results)
+        return {query: results[normalize_query(query)] for query in queries}
+
+    def _batch_cache_lookup(self, queries: List[str], n_results: int,
+                            filters: Optional[SearchFilters]) -> Tuple[Dict[str, List[Dict]], List[str]]:
+        """Split queries into cached results (by normalized query) and distinct misses."""
+        results: Dict[str, List[Dict]] = {}
+        misses: List[str] = []
+        for query in queries:
+            normalized = normalize_query(query)
+            if normalized in results or normalized in misses:
+                continue
+            cached = self._cached_results((normalized, n_results, filters))
+            if cached is not None:
+                results[normalized] = cached
+            else:
+                misses.append(normalized)
+        return results, misses
+
+    def _batch_store(self, results: Dict[str, List[Dict]], misses: List[str], n_results: int,
+                     filters: Optional[SearchFilters], generation: int,
+                     batch_results: List[List[Dict]]) -> None:
+        for query, query_results in zip(misses, batch_results):
+            results[query] = query_results
+            if query_results:
+                self.result_cache.put((query, n_results, filters), (generation, query_results))
+
+    def _fuse_candidates(self, query_embedding: List[float], vector_hits: List[tuple],
+                         keyword_hits: List[tuple], limit: int, where: Optional[Dict] = None) -> List[tuple]:
+        """Fuse vector and BM25 hits with reciprocal rank fusion.
+
+        vector_hits are (chunk_id, document, metadata, similarity) tuples in
+        rank order. Returns up to limit tuples of the same shape in fused
+        order. Chunks only found by BM25 are fetched from the
+        collection and their cosine similarity to the query computed from
+        stored embeddings (full vectors, with compact vector storage). With
+        a where clause, BM25 hits outside it are dropped before fusion.
+        """
+        k = self.settings.RRF_K
+        fused: Dict[str, float] = {}
+        chunks: Dict[str, tuple] = {}
+
+        for rank, (chunk_id, document, metadata, similarity) in enumerate(vector_hits):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1 / (k + rank + 1)
+            chunks[chunk_id] = (chunk_id, document, metadata, similarity)
+        keyword_only = [chunk_id for chunk_id, _score in keyword_hits if chunk_id not in chunks]
+        if where is not None and keyword_only:
+            allowed = set(self.collection.get(ids=keyword_only, where=where, include=[])["ids"])
+            keyword_hits = [hit for hit in keyword_hits if hit[0] in chunks or hit[0] in allowed]
+        for rank, (chunk_id, _score) in enumerate(keyword_hits):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1 / (k + rank + 1)
+
+        top_ids = sorted(fused, key=fused.get, reverse=True)[:limit]
+        missing = [chunk_id for chunk_id in top_ids if chunk_id not in chunks]
+        if missing:
+            fetched = self.collection.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+            if fetched['ids']:
+                cosine = self._stored_similarities(query_embedding, fetched['ids'], fetched['embeddings'])
+                for chunk_id, document, metadata, similarity in zip(
+                    fetched['ids'], fetched['documents'], fetched['metadatas'], cosine
+                ):
+                    chunks[chunk_id] = (chunk_id, document, metadata, float(similarity))
+
+        return [chunks[chunk_id] for chunk_id in top_ids if chunk_id in chunks]
+
+    def _stored_similarities(self, query_embedding: List[float], ids: List[str],
+                             embeddings) -> np.ndarray:
+        """Cosine similarity of the query to stored chunks.
+
+        embeddings are the collection's; with compact vector storage they are
+        truncated, so the full vectors are read from the vector store instead
+        (falling back to the truncated ones for chunks it doesn't have).
+        """
+        if self.vector_store is None:
+            return _cosine(query_embedding, embeddings)
+        full, found = self.vector_store.get(ids)
+        return np.where(found, _cosine(query_embedding, full),
+                        _cosine(query_embedding[:self.vector_dims], embeddings))
+
+    def _search(self, query: str, n_results: int, query_embedding: List[float] = None,
+                filters: Optional[SearchFilters] = None) -> List[Dict]:
+        """Search with hybrid scoring: semantic + keyword + recency"""
+        if query_embedding is None:
+            try:
+                query_embedding = self.generate_embedding.embed_query(query)
+            except Exception as e:
+                print(f"Search error: {e}")
+                return []
+        return self._search_many([query], n_results, [query_embedding], filters)[0]
+
+    def _search_many(self, queries: List[str], n_results: int, query_embeddings: List[List[float]],
+                     filters: Optional[SearchFilters] = None) -> List[List[Dict]]:
+        """Retrieve, fuse and aggregate results for several embedded queries.
+
+        The vector side is a single collection.query over all embeddings
+        (two-stage search may need a few more rounds for crowded-out queries,
+        see _query_top_files); the BM25 lookups run alongside it on the search pool.
+        """
+        where = self._filter_where(filters)
+        if filters is not None and where is None:
+            return [[] for _ in queries]
+        try:
+            keyword_futures = self._start_keyword_searches(queries)
+            all_hits = self._vector_query(query_embeddings, n_results, where)
+            return [
+                self._rerank(query, embedding, vector_hits, keyword_future.result(), n_results, where)
+                for query, embedding, vector_hits, keyword_future
+                in zip(queries, query_embeddings, all_hits, keyword_futures)
+            ]
+
         except Exception as e:
             print(f"Search error: {e}")
-            return []
+            return [[] for _ in queries]
+
+    def _filter_where(self, filters: Optional[SearchFilters]) -> Optional[Dict]:
+        """Chroma where clause for filters: None without filters, or if no indexed file can match.
+
+        A path prefix is resolved to the indexed directories under it through
+        the manifest, or to the one file it names.
+        """
+        if filters is None:
+            return None
+        file_dirs = None
+        if filters.path_prefix:
+            file_dirs = self.manifest.list_dirs(filters.path_prefix)
+            if not file_dirs and self.manifest.get(filters.path_prefix) is None:
+                return None
+        return filters.where(file_dirs)
+
+    def _start_keyword_searches(self, queries: List[str]) -> List[Future]:
+        # The BM25 queries run alongside the HNSW query; each returns its
+        # own candidate list, fused in _rerank.
+        return [
+            self._search_pool.submit(
+                self.keyword_index.search, query, self.settings.KEYWORD_SEARCH_CANDIDATES
+            )
+            for query in queries
+        ]
+
+    def _vector_query(self, query_embeddings: List[List[float]], n_results: int,
+                      where: Optional[Dict] = None) -> List[List[tuple]]:
+        """One collection.query for all embeddings; returns each query's (chunk_id, document, metadata, similarity) hits.
+
+        With two-stage search, the query is restricted to the chunks of each
+        query's nearest files in the file-level index (see _query_top_files). With compact vector
+        storage the query runs against the truncated index and its candidates
+        are rescored, and re-sorted, by full-vector cosine similarity. A
+        where clause (see _filter_where) is applied by Chroma, to the file
+        stage if there is one and to the chunk query otherwise.
+        """
+        search_embeddings = (query_embeddings if self.vector_store is None
+                             else truncate_embeddings(query_embeddings, self.vector_dims).tolist())
+        n_candidates = max(self.settings.SEARCH_CANDIDATES, n_results)
+        include = ["documents", "metadatas", "distances"]
+        top_files = self._top_files(search_embeddings, n_results, where)
+        if top_files is None:
+            results = self.collection.query(
+                query_embeddings=search_embeddings, n_results=n_candidates, where=where, include=include
+            )
+        else:
+            results = self._query_top_files(search_embeddings, top_files, n_candidates, include)
+        if not results['ids']:
+            return [[] for _ in query_embeddings]
+        all_hits = []
+        for query_embedding, ids, documents, metadatas, distances in zip(
+            query_embeddings, results['ids'], results['documents'], results['metadatas'], results['distances']
+        ):
+            similarities = [1 - distance for distance in distances]
+            if self.vector_store is not None and ids:
+                similarities = self._rescore(query_embedding, ids, similarities)
+            hits = list(zip(ids, documents, metadatas, similarities))
+            if self.vector_store is not None:
+                hits.sort(key=lambda hit: hit[3], reverse=True)
+            all_hits.append(hits)
+        return all_hits
+
+    def _query_top_files(self, search_embeddings: List[List[float]], top_files: List[List[str]],
+                         n_candidates: int, include: List[str]) -> Dict[str, List[List]]:
+        """Second stage: each query's n_candidates nearest chunks within its own top files.
+
+        A batch runs one query over the union of its queries' top files,
+        asking for twice n_candidates, and each query keeps the hits in its
+        own files. Queries left short because other queries' files filled
+        their window go round again together with the window doubled; a
+        single query is restricted to its own files directly. The top files
+        already satisfy the where clause.
+        """
+        keys = ("ids", "documents", "metadatas", "distances")
+        kept = {key: [[] for _ in search_embeddings] for key in keys}
+        pending = [i for i, files in enumerate(top_files) if files]
+        n_union = n_candidates
+        while pending:
+            if len(pending) > 1:
+                n_union *= 2
+            union = sorted(set().union(*(top_files[i] for i in pending)))
+            results = self.collection.query(
+                query_embeddings=[search_embeddings[i] for i in pending], n_results=n_union,
+                where={"file_path": {"$in": union}}, include=include
+            )
+            short = []
+            for row, i in enumerate(pending):
+                files = set(top_files[i])
+                hits = [j for j, metadata in enumerate(results["metadatas"][row])
+                        if metadata["file_path"] in files][:n_candidates]
+                if len(pending) > 1 and len(hits) < n_candidates and len(results["ids"][row]) == n_union:
+                    short.append(i)
+                    continue
+                for key in keys:
+                    kept[key][i] = [results[key][row][j] for j in hits]
+            pending = short
+        return kept
+
+    def _top_files(self, query_embeddings: List[List[float]], n_results: int,
+                   where: Optional[Dict] = None) -> Optional[List[List[str]]]:
+        """First stage of two-stage search: each query's nearest files, or None to query all chunks.
+
+        Skipped while the index holds no more files than SEARCH_FILE_CANDIDATES.
+        """
+        if not self.settings.SEARCH_FILE_CANDIDATES:
+            return None
+        n_files = max(self.settings.SEARCH_FILE_CANDIDATES, n_results)
+        if self.file_index.count() <= n_files:
+            return None
+        return self.file_index.top_files(query_embeddings, n_files, where)
+
+    def _rescore(self, query_embedding: List[float], ids: List[str],
+                 similarities: List[float]) -> List[float]:
+        """Full-vector cosine similarities for truncated-index hits (kept as is where no full vector is stored)."""
+        full, found = self.vector_store.get(ids)
+        return np.where(found, _cosine(query_embedding, full), similarities).tolist()
+
+    def _rerank(self, query: str, query_embedding: List[float], vector_hits: List[tuple],
+                keyword_hits: List[tuple], n_results: int, where: Optional[Dict] = None) -> List[Dict]:
+        n_candidates = max(self.settings.SEARCH_CANDIDATES, n_results)
+        candidates = self._fuse_candidates(query_embedding, vector_hits, keyword_hits, n_candidates, where)
+        return aggregate_file_scores(query, candidates, n_results)
@@ -0,0 +1,353 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from config import Settings
+
+# queued -> running -> completed | failed; running jobs can also be paused
+# (back to queued on resume) or cancelled.
+JOB_STATES = ("queued", "running", "paused", "cancelled", "completed", "failed")
+_TRANSITIONS = {
+    "cancel": (("queued", "running", "paused"), "cancelled"),
+    "pause": (("queued", "running"), "paused"),
+    "resume": (("paused", "failed"), "queued"),
+}
+
+
+class JobQueue:
+    """Durable queue of directory indexing jobs (SQLite under DATA_DIR).
+
+    Jobs run highest priority first, then oldest first. Every file a job
+    finishes (written, unchanged or without text) is checkpointed in
+    job_files, so a paused, failed or interrupted job resumes without
+    looking at those files again; chunks are written to the collection
+    before their files are checkpointed. Files done and new chunks are
+    sampled every JOB_THROUGHPUT_SAMPLE_S for the job's throughput history.
+    Jobs found running at startup were interrupted and are queued again.
+    """
+    settings = Settings()
+
+    def __init__(self, path: str = None):
+        self.path = Path(path or self.settings.JOBS_DB_PATH)
+        self._lock = threading.Lock()
+        self._last_sample: Dict[int, float] = {}
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " directory TEXT NOT NULL,"
+            " priority INTEGER NOT NULL DEFAULT 0,"
+            " state TEXT NOT NULL,"
+            " total_files INTEGER,"
+            " done_files INTEGER NOT NULL DEFAULT 0,"
+            " new_chunks INTEGER NOT NULL DEFAULT 0,"
+            " runs INTEGER NOT NULL DEFAULT 0,"
+            " result TEXT,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, priority, id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_files ("
+            " job_id INTEGER NOT NULL,"
+            " file_path TEXT NOT NULL,"
+            " PRIMARY KEY (job_id, file_path))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_samples ("
+            " job_id INTEGER NOT NULL,"
+            " ts REAL NOT NULL,"
+            " done_files INTEGER NOT NULL,"
+            " new_chunks INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS job_samples_job ON job_samples (job_id, ts)")
+        self._conn.execute("UPDATE jobs SET state = 'queued' WHERE state = 'running'")
+        self._conn.commit()
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def enqueue(self, directory: str, priority: int = 0) -> Dict:
+        root = str(Path(directory).resolve())
+        if not os.path.isdir(root):
+            raise ValueError(f"{root} is not a directory")
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (directory, priority, state, created_at) VALUES (?, ?, 'queued', ?)",
+                (root, priority, time.time()),
+            )
+            self._conn.commit()
+        return self.get(cursor.lastrowid)
+
+    def get(self, job_id: int, history: bool = False) -> Optional[Dict]:
+        """A job, optionally with its throughput history (files/s and chunks/s between samples)."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            samples = self._conn.execute(
+                "SELECT ts, done_files, new_chunks FROM job_samples WHERE job_id = ? ORDER BY ts",
+                (job_id,),
+            ).fetchall() if history and row else []
+        if row is None:
+            return None
+        job = self._job(row)
+        if history:
+            job["throughput"] = [
+                {
+                    "ts": cur["ts"],
+                    "done_files": cur["done_files"],
+                    "new_chunks": cur["new_chunks"],
+                    "files_per_s": (cur["done_files"] - prev["done_files"]) / (cur["ts"] - prev["ts"]),
+                    "chunks_per_s": (cur["new_chunks"] - prev["new_chunks"]) / (cur["ts"] - prev["ts"]),
+                }
+                for prev, cur in zip(samples, samples[1:])
+                if cur["ts"] > prev["ts"]
+            ]
+        return job
+
+    def list_jobs(self, limit: int = 50) -> List[Dict]:
+        """Unfinished jobs in run order, then the most recently finished ones."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs ORDER BY finished_at IS NOT NULL, state != 'running',"
+                " CASE WHEN finished_at IS NULL THEN -priority ELSE -finished_at END, id LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def claim_next(self) -> Optional[Dict]:
+        """Mark the next queued job running and return it."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE state = 'queued' ORDER BY priority DESC, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET state = 'running', runs = runs + 1, error = NULL,"
+                " started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (now, row["id"]),
+            )
+            self._conn.commit()
+        self._sample(row["id"], force=True)
+        return self.get(row["id"])
+
+    def set_total(self, job_id: int, total_files: int) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET total_files = ? WHERE id = ?", (total_files, job_id))
+            self._conn.commit()
+
+    def checkpoint(self, job_id: int, file_paths: List[str], new_chunks: int = 0) -> None:
+        """Record files as done for job_id (safe to call from several pipeline threads)."""
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO job_files (job_id, file_path) VALUES (?, ?)",
+                [(job_id, p) for p in file_paths],
+            )
+            done = self._conn.total_changes - before
+            self._conn.execute(
+                "UPDATE jobs SET done_files = done_files + ?, new_chunks = new_chunks + ? WHERE id = ?",
+                (done, new_chunks, job_id),
+            )
+            self._conn.commit()
+        self._sample(job_id)
+
+    def done_files(self, job_id: int) -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_path FROM job_files WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def _sample(self, job_id: int, force: bool = False) -> None:
+        now = time.time()
+        if not force and now - self._last_sample.get(job_id, 0.0) < self.settings.JOB_THROUGHPUT_SAMPLE_S:
+            return
+        self._last_sample[job_id] = now
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO job_samples (job_id, ts, done_files, new_chunks)"
+                " SELECT id, ?, done_files, new_chunks FROM jobs WHERE id = ?",
+                (now, job_id),
+            )
+            self._conn.commit()
+
+    def finish(self, job_id: int, state: str, result: Dict = None, error: str = None) -> None:
+        """End a run: completed or failed, unless the job was paused or cancelled meanwhile.
+
+        state "queued" puts a running job back in the queue (e.g. on shutdown).
+        """
+        self._sample(job_id, force=True)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = ?,"
+                " finished_at = CASE WHEN ? = 'queued' THEN NULL ELSE ? END"
+                " WHERE id = ? AND state = 'running'",
+                (state, json.dumps(result) if result is not None else None, error,
+                 state, time.time(), job_id),
+            )
+            # Checkpoints only matter for resuming; a job cancelled while
+            # running may have checkpointed files since it was cancelled.
+            self._conn.execute(
+                "DELETE FROM job_files WHERE job_id = ? AND"
+                " (SELECT state FROM jobs WHERE id = ?) IN ('completed', 'cancelled')",
+                (job_id, job_id),
+            )
+            self._conn.commit()
+        self._last_sample.pop(job_id, None)
+
+    def transition(self, job_id: int, action: str) -> Dict:
+        """Apply cancel, pause or resume; raises ValueError if the job can't make that move."""
+        from_states, to_state = _TRANSITIONS[action]
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                raise KeyError(job_id)
+            if row["state"] not in from_states:
+                raise ValueError(f"Cannot {action} a {row['state']} job")
+            self._conn.execute(
+                "UPDATE jobs SET state = ?,"
+                " finished_at = CASE ? WHEN 'cancelled' THEN ? WHEN 'queued' THEN NULL ELSE finished_at END"
+                " WHERE id = ?",
+                (to_state, to_state, time.time(), job_id),
+            )
+            if to_state == "cancelled":
+                self._conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+            self._conn.commit()
+        return self.get(job_id)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JobWorker:
+    """Runs queued jobs one at a time on a background thread.
+
+    Pausing or cancelling the running job sets its stop event: the pipeline
+    stops extracting, writes what it already extracted, and the run ends
+    with the state the request set. Stopping the worker (on shutdown) puts
+    the running job back in the queue.
+    """
+
+    def __init__(self, indexer, queue: JobQueue):
+        self.indexer = indexer
+        self.queue = queue
+        self.current: Optional[Dict] = None
+        self.current_file = ""
+        self.last_result: Optional[Dict] = None
+        self._stop_job = threading.Event()
+        # Held while claiming a job and setting current, and while pausing or
+        # cancelling, so a request can't slip in between the two and be missed.
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._shutdown = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="index-jobs", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._shutdown.set()
+            self._stop_job.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def enqueue(self, directory: str, priority: int = 0) -> Dict:
+        job = self.queue.enqueue(directory, priority)
+        self._wake.set()
+        return job
+
+    def transition(self, job_id: int, action: str) -> Dict:
+        with self._lock:
+            job = self.queue.transition(job_id, action)
+            current = self.current
+            if current is not None and current["id"] == job_id and action in ("cancel", "pause"):
+                self._stop_job.set()
+        self._wake.set()
+        return job
+
+    def status(self) -> Dict:
+        """Current job and its progress, in the shape /api/index/status has always returned."""
+        with self._lock:
+            current = self.current
+        current = self.queue.get(current["id"]) if current is not None else None
+        return {
+            "is_indexing": current is not None,
+            "current_file": self.current_file,
+            "progress": current["done_files"] if current else 0,
+            "total": (current["total_files"] or 0) if current else 0,
+            "last_result": self.last_result,
+            "job": current,
+            "jobs": self.queue.counts(),
+        }
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if self._shutdown.is_set():
+                    return
+                job = self.queue.claim_next()
+                if job is not None:
+                    self._stop_job.clear()
+                    self.current = job
+            if job is None:
+                self._wake.wait(timeout=1.0)
+                self._wake.clear()
+                continue
+            self._run_job(job)
+
+    def _files_done(self, job_id: int, file_paths: List[str], new_chunks: int) -> None:
+        if file_paths:
+            self.current_file = file_paths[-1]
+        self.queue.checkpoint(job_id, file_paths, new_chunks)
+
+    def _run_job(self, job: Dict) -> None:
+        job_id = job["id"]
+        root = job["directory"]
+        self.current_file = ""
+        try:
+            files = self.indexer.scan_directory(root)
+            self.queue.set_total(job_id, len(files))
+            result = self.indexer.index_files(
+                [Path(f.path) for f in files], file_stats=files,
+                prune_prefix=root.rstrip(os.sep) + os.sep,
+                skip=self.queue.done_files(job_id),
+                stop_event=self._stop_job,
+                on_files_done=lambda paths, chunks: self._files_done(job_id, paths, chunks),
+            )
+            if self._shutdown.is_set():
+                self.queue.finish(job_id, "queued")
+            elif "error" in result:
+                self.queue.finish(job_id, "failed", result, result["error"])
+            else:
+                self.queue.finish(job_id, "completed", result)
+            self.last_result = result
+        except Exception as e:
+            print(f"Error running indexing job {job_id}: {e}")
+            self.queue.finish(job_id, "failed", error=str(e))
+            self.last_result = {"error": str(e)}
+        finally:
+            self.current = None
+            self.current_file = ""
@@ -0,0 +1,118 @@
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Tuple
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class KeywordIndex:
+    """Persistent BM25 inverted index over chunk text (SQLite FTS5).
+
+    Lets hybrid search find chunks containing rare exact terms even when they
+    aren't semantically close to the query. A side table maps chunk ids (and
+    file paths) to FTS rowids so deletes don't scan the full-text table.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5("
+            " content, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_rows ("
+            " chunk_id TEXT PRIMARY KEY,"
+            " file_path TEXT NOT NULL,"
+            " fts_rowid INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS chunk_rows_file_path ON chunk_rows (file_path)"
+        )
+        self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunk_rows").fetchone()[0]
+
+    def add(self, ids: List[str], documents: List[str], file_paths: List[str]) -> None:
+        """Index chunks, replacing any already stored under the same ids."""
+        with self._lock:
+            self._delete_ids(ids)
+            for chunk_id, document, file_path in zip(ids, documents, file_paths):
+                cursor = self._conn.execute(
+                    "INSERT INTO chunks_fts (content) VALUES (?)", (document,)
+                )
+                self._conn.execute(
+                    "INSERT INTO chunk_rows (chunk_id, file_path, fts_rowid) VALUES (?, ?, ?)",
+                    (chunk_id, file_path, cursor.lastrowid),
+                )
+            self._conn.commit()
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            self._delete_ids(ids)
+            self._conn.commit()
+
+    def delete_file(self, file_path: str) -> None:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT fts_rowid FROM chunk_rows WHERE file_path = ?", (file_path,)
+            ).fetchall()
+            self._conn.executemany("DELETE FROM chunks_fts WHERE rowid = ?", rows)
+            self._conn.execute("DELETE FROM chunk_rows WHERE file_path = ?", (file_path,))
+            self._conn.commit()
+
+    def _delete_ids(self, ids: List[str]) -> None:
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT fts_rowid FROM chunk_rows WHERE chunk_id IN ({placeholders})", batch
+            ).fetchall()
+            self._conn.executemany("DELETE FROM chunks_fts WHERE rowid = ?", rows)
+            self._conn.execute(f"DELETE FROM chunk_rows WHERE chunk_id IN ({placeholders})", batch)
+
+    @staticmethod
+    def to_match_query(query: str) -> str:
+        """Turn free text into an FTS5 query: any of the query's terms, quoted."""
+        terms = dict.fromkeys(t.lower() for t in _TOKEN_RE.findall(query))
+        return " OR ".join(f'"{t}"' for t in terms)
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, float]]:
+        """Return up to limit (chunk_id, bm25 score) pairs, best first.
+
+        Scores are negated from SQLite's bm25(), so higher is better.
+        """
+        match = self.to_match_query(query)
+        if not match:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT r.chunk_id, -bm25(chunks_fts) AS score"
+                " FROM chunks_fts JOIN chunk_rows r ON r.fts_rowid = chunks_fts.rowid"
+                " WHERE chunks_fts MATCH ? ORDER BY bm25(chunks_fts) LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        return [(chunk_id, score) for chunk_id, score in rows]
+
+    def rebuild_from_collection(self, collection, page_size: int = 5000) -> int:
+        """Index every chunk already in the collection (one-time migration)."""
+        offset = 0
+        while True:
+            results = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            ids = results.get("ids") or []
+            if not ids:
+                break
+            self.add(ids, results["documents"], [md["file_path"] for md in results["metadatas"]])
+            offset += len(ids)
+        return offset
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
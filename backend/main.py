@@ -1,14 +1,21 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
-
+from typing import List, Literal, Optional
+from datetime import datetime
 
+import json
 import subprocess
 import platform
 
 from indexer import Indexer
+from job_queue import JobQueue, JobWorker
 from config import settings
+from manifest import SORTABLE_COLUMNS
+from scoring import compact_result
+from search_filters import SearchFilters, normalize_path_prefix
+from watcher import WatchManager
 
 app = FastAPI(title="File Indexer API")
 
@@ -21,42 +28,41 @@ app.add_middleware(
 )
 
 indexer = Indexer()
-
-indexing_status = {
-    "is_indexing": False,
-    "current_file": "",
-    "progress": 0,
-    "total": 0,
-    "last_result": None
-}
+watch_manager = WatchManager(indexer)
+job_worker = JobWorker(indexer, JobQueue())
 
 class IndexRequest(BaseModel):
     directory: str
+    priority: int = 0  # higher runs first
+
+class WatchRequest(BaseModel):
+    directory: str
+
+class SearchFilterFields(BaseModel):
+    # Applied by the vector index, not by post-filtering results
+    extensions: Optional[List[str]] = None  # e.g. [".pdf", "docx"]
+    path_prefix: Optional[str] = None
+    modified_after: Optional[datetime] = None  # ISO time or epoch seconds
+    modified_before: Optional[datetime] = None
 
-class SearchRequest(BaseModel):
+    def filters(self) -> Optional[SearchFilters]:
+        return SearchFilters.create(self.extensions, self.path_prefix,
+                                    self.modified_after, self.modified_before)
+
+class SearchRequest(SearchFilterFields):
     query: str
     n_results: Optional[int] = settings.SEARCH_RESULT_COUNT
+    # Only ids, scores and snippets; full chunk text via /api/chunks
+    compact: bool = False
 
+class BatchSearchRequest(SearchFilterFields):
+    queries: List[str]
+    n_results: Optional[int] = settings.SEARCH_RESULT_COUNT
+    compact: bool = False
 
-def progress_callback(file_path: str, current: int, total: int):
-    """Update indexing progress"""
-    indexing_status["current_file"] = file_path
-    indexing_status["progress"] = current
-    indexing_status["total"] = total
+class ChunksRequest(BaseModel):
+    ids: List[str]
 
-def index_directory_task(directory: str):
-    """Background task for indexing"""
-    indexing_status["is_indexing"] = True
-    indexing_status["progress"] = 0
-    indexing_status["current_file"] = ""
-    
-    try:
-        result = indexer.index_directory(directory)
-        indexing_status["last_result"] = result
-    except Exception as e:
-        indexing_status["last_result"] = {"error": str(e)}
-    finally:
-        indexing_status["is_indexing"] = False
 
 @app.get("/")
 async def root():
@@ -68,20 +74,90 @@ async def root():
 }
 
 @app.post("/api/index")
-async def start_indexing(request: IndexRequest, background_tasks: BackgroundTasks):
-    """Start indexing files in the specified directory"""
-    directory = request.directory
-
-    if indexing_status["is_indexing"]:
-        raise HTTPException(status_code=400, detail="Indexing already in progress")
-    
-    background_tasks.add_task(index_directory_task, directory)
-    return {"message": f"Started indexing directory: {directory}"}
+async def start_indexing(request: IndexRequest):
+    """Queue a job indexing files in the specified directory"""
+    try:
+        job = job_worker.enqueue(request.directory, request.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"Queued indexing of directory: {job['directory']}", "job": job}
 
 @app.get("/api/index/status")
 async def get_indexing_status():
-    """Get indexing status"""
-    return indexing_status
+    """Get indexing status, quarantined files and the slowest extractions"""
+    return {**job_worker.status(), **indexer.extraction_status()}
+
+@app.get("/api/jobs")
+def list_jobs(limit: int = Query(50, ge=1, le=500)):
+    """List queued and running indexing jobs, then recently finished ones"""
+    return {"jobs": job_worker.queue.list_jobs(limit)}
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: int):
+    """Get an indexing job with its throughput history"""
+    job = job_worker.queue.get(job_id, history=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}")
+    return job
+
+def _job_transition(job_id: int, action: str):
+    try:
+        return job_worker.transition(job_id, action)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/api/jobs/{job_id}/cancel")
+def cancel_job(job_id: int):
+    """Cancel a queued, paused or running job (files already written stay indexed)"""
+    return _job_transition(job_id, "cancel")
+
+@app.post("/api/jobs/{job_id}/pause")
+def pause_job(job_id: int):
+    """Pause a job; it keeps its checkpoints until resumed"""
+    return _job_transition(job_id, "pause")
+
+@app.post("/api/jobs/{job_id}/resume")
+def resume_job(job_id: int):
+    """Queue a paused or failed job again, skipping the files it already finished"""
+    return _job_transition(job_id, "resume")
+
+@app.post("/api/watch")
+async def start_watching(request: WatchRequest):
+    """Watch a directory and re-index its files incrementally as they change"""
+    try:
+        watcher = watch_manager.start(request.directory)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"Watching directory: {watcher.root}", "watcher": watcher.status()}
+
+@app.delete("/api/watch")
+async def stop_watching(directory: str):
+    """Stop watching a directory"""
+    if not watch_manager.stop(directory):
+        raise HTTPException(status_code=404, detail=f"Not watching {directory}")
+    return {"message": f"Stopped watching directory: {directory}"}
+
+@app.get("/api/watch")
+async def get_watchers():
+    """List active watchers with their event-queue depth"""
+    watchers = watch_manager.status()
+    return {
+        "watchers": watchers,
+        "count": len(watchers),
+        "queue_depth": sum(w["queue_depth"] for w in watchers),
+    }
+
+@app.on_event("startup")
+def start_job_worker():
+    job_worker.start()
+
+@app.on_event("shutdown")
+def stop_watchers():
+    watch_manager.stop_all()
+    # Puts a running job back in the queue, to resume on the next start
+    job_worker.stop()
 
 @app.post("/api/search")
 async def search_files(request: SearchRequest):
@@ -89,9 +165,58 @@ async def search_files(request: SearchRequest):
     query = request.query
     n_results = request.n_results
     
-    results = indexer.search(query, n_results)
+    results = await indexer.search_async(query, n_results, request.filters())
+    if request.compact:
+        results = [compact_result(r) for r in results]
     return {"query": query, "results": results, "count": len(results)}
 
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/search/stream")
+async def search_files_stream(request: SearchRequest):
+    """Search as Server-Sent Events: `preliminary` vector hits, then the re-ranked `results`.
+
+    Both events carry compact results ({"query", "results", "count"}).
+    """
+    async def events():
+        async for event, results in indexer.search_stream_async(request.query, request.n_results,
+                                                              request.filters()):
+            if event == "results":
+                results = [compact_result(r) for r in results]
+            yield _sse_event(event, {"query": request.query, "results": results, "count": len(results)})
+        yield _sse_event("done", {})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.post("/api/search/batch")
+async def search_files_batch(request: BatchSearchRequest):
+    """Search for many queries at once (one embed call, one vector query)"""
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="queries must not be empty")
+    if len(request.queries) > settings.SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.SEARCH_BATCH_MAX_QUERIES} queries per batch",
+        )
+
+    results = await indexer.search_batch_async(request.queries, request.n_results, request.filters())
+    if request.compact:
+        results = {query: [compact_result(r) for r in rs] for query, rs in results.items()}
+    return {
+        "results": {query: {"results": r, "count": len(r)} for query, r in results.items()},
+        "count": len(results),
+    }
+
+@app.post("/api/chunks")
+def get_chunks(request: ChunksRequest):
+    """Full text of chunks by id (e.g. the chunk_ids of a compact search result)"""
+    if len(request.ids) > settings.CHUNKS_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.CHUNKS_MAX_IDS} ids per request")
+    chunks = indexer.get_chunks(request.ids)
+    return {"chunks": chunks, "count": len(chunks)}
+
 @app.post("/api/open-file")
 async def open_file(file_path: str):
     """Open a file in the default application"""
@@ -109,34 +234,39 @@ async def open_file(file_path: str):
         raise HTTPException(status_code=500, detail=f"Failed to open file: {str(e)}")
     
 @app.get("/api/files")
-async def get_indexed_files():
-    """Get all indexed files with their metadata"""
+def get_indexed_files(
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    sort_by: str = "file_name",
+    order: Literal["asc", "desc"] = "asc",
+    extension: Optional[str] = None,
+    path_prefix: Optional[str] = None,
+    q: Optional[str] = None,
+):
+    """Get indexed files with their metadata, paginated, sorted and filtered server-side.
+
+    Served from the file manifest, so it never scans chunk metadata. Omitting
+    `limit` returns every matching file.
+    """
+    if sort_by not in SORTABLE_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of {', '.join(SORTABLE_COLUMNS)}")
     try:
-        results = indexer.collection.get(
-            include=["metadatas"]
+        files_list, summary = indexer.manifest.list_files(
+            offset=offset,
+            limit=limit,
+            sort_by=sort_by,
+            descending=order == "desc",
+            extension=extension,
+            path_prefix=normalize_path_prefix(path_prefix) if path_prefix else None,
+            name_contains=q,
         )
         
-        if not results or not results['metadatas']:
-            return {"files": [], "count": 0}
-        
-        files_dict = {}
-        for metadata in results['metadatas']:
-            file_path = metadata['file_path']
-            if file_path not in files_dict:
-                files_dict[file_path] = {
-                    'file_path': file_path,
-                    'file_name': metadata['file_name'],
-                    'file_extension': metadata['file_extension'],
-                    'file_size': metadata['file_size'],
-                    'total_chunks': metadata['total_chunks'],
-                    'modified_time': metadata['modified_time']
-                }
-        
-        files_list = sorted(files_dict.values(), key=lambda x: x['file_name'])
-        
         return {
             "files": files_list,
-            "count": len(files_list)
+            "count": len(files_list),
+            "offset": offset,
+            "limit": limit,
+            **summary,
         }
     except Exception as e:
         print(f"Error getting files: {e}")
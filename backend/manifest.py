@@ -0,0 +1,306 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from search_filters import normalize_extension, path_range
+
+# Columns /api/files may sort by.
+SORTABLE_COLUMNS = ("file_name", "file_path", "file_extension", "file_size", "modified_time", "total_chunks")
+
+
+class FileManifest:
+    """Per-file manifest kept next to the Chroma collection.
+
+    One row per indexed file (path, hashes, stat, chunk count and chunk ids),
+    so listing files or deciding what changed never has to pull every chunk's
+    metadata out of Chroma. Rows are written right after the matching
+    collection write; if the process dies in between, the file's stat no
+    longer matches its row and the next run re-checks it against the
+    collection.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " file_path TEXT PRIMARY KEY,"
+            " file_name TEXT NOT NULL,"
+            " file_extension TEXT NOT NULL,"
+            " file_dir TEXT,"
+            " file_hash TEXT NOT NULL,"
+            " raw_hash TEXT,"
+            " file_size INTEGER,"
+            " mtime_ns INTEGER,"
+            " inode INTEGER,"
+            " modified_time TEXT,"
+            " total_chunks INTEGER NOT NULL,"
+            " chunk_ids TEXT NOT NULL,"
+            " indexed_at REAL NOT NULL)"
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(files)")}
+        if "file_dir" not in columns:
+            # Manifests from before file_dir; filled in by Indexer._migrate_metadata.
+            self._conn.execute("ALTER TABLE files ADD COLUMN file_dir TEXT")
+        for column in ("file_name", "file_extension", "file_dir", "file_size", "modified_time"):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS files_{column} ON files ({column})")
+        # Files whose extraction failed, timed out or went over budget, with
+        # the stat they had then; skipped until that stat changes.
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS quarantine ("
+            " file_path TEXT PRIMARY KEY,"
+            " file_size INTEGER,"
+            " mtime_ns INTEGER,"
+            " reason TEXT NOT NULL,"
+            " quarantined_at REAL NOT NULL)"
+        )
+        # Small key/value store, e.g. the version of the chunk metadata schema.
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _record(row: sqlite3.Row) -> Dict:
+        record = dict(row)
+        record["chunk_ids"] = json.loads(record["chunk_ids"])
+        return record
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def get(self, file_path: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM files WHERE file_path = ?", (file_path,)
+            ).fetchone()
+        return self._record(row) if row else None
+
+    def get_many(self, file_paths: List[str]) -> Dict[str, Dict]:
+        """Return {file_path: record} for those of file_paths that are indexed."""
+        records = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit.
+            for start in range(0, len(file_paths), 500):
+                batch = file_paths[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT * FROM files WHERE file_path IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                records.update((row["file_path"], self._record(row)) for row in rows)
+        return records
+
+    def get_all(self) -> Dict[str, Dict]:
+        """Return {file_path: record} for every indexed file (without chunk ids)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_path, file_hash, raw_hash, file_size, mtime_ns, inode FROM files"
+            ).fetchall()
+        return {row["file_path"]: dict(row) for row in rows}
+
+    def iter_files(self, page_size: int = 500) -> Iterator[List[Dict]]:
+        """Every file record (with chunk ids), a page at a time in path order."""
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT * FROM files WHERE file_path > ? ORDER BY file_path LIMIT ?",
+                    (last, page_size),
+                ).fetchall()
+            if not rows:
+                return
+            last = rows[-1]["file_path"]
+            yield [self._record(row) for row in rows]
+
+    def upsert_many(self, records: Iterable[Dict]) -> None:
+        now = time.time()
+        rows = [
+            (
+                r["file_path"], r["file_name"], r["file_extension"],
+                os.path.dirname(r["file_path"]), r["file_hash"],
+                r.get("raw_hash"), r.get("file_size"), r.get("mtime_ns"), r.get("inode"),
+                r.get("modified_time"), r["total_chunks"], json.dumps(r["chunk_ids"]), now,
+            )
+            for r in records
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (file_path, file_name, file_extension,"
+                " file_dir, file_hash, raw_hash, file_size, mtime_ns, inode, modified_time,"
+                " total_chunks, chunk_ids, indexed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def upsert(self, record: Dict) -> None:
+        self.upsert_many([record])
+
+    def update_stat(self, file_path: str, file_size: int, mtime_ns: int, inode: int,
+                    modified_time: str, raw_hash: str = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE files SET file_size = ?, mtime_ns = ?, inode = ?, modified_time = ?,"
+                " raw_hash = COALESCE(?, raw_hash) WHERE file_path = ?",
+                (file_size, mtime_ns, inode, modified_time, raw_hash, file_path),
+            )
+            self._conn.commit()
+
+    def update_derived(self, records: Iterable[Dict]) -> None:
+        """Rewrite the columns derived from each record's path (see Indexer._migrate_metadata)."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE files SET file_extension = ?, file_dir = ? WHERE file_path = ?",
+                [(r["file_extension"], os.path.dirname(r["file_path"]), r["file_path"]) for r in records],
+            )
+            self._conn.commit()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+            self._conn.commit()
+
+    def delete_many(self, file_paths: List[str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM files WHERE file_path = ?", [(p,) for p in file_paths]
+            )
+            self._conn.commit()
+
+    def quarantine(self, file_path: str, file_size: Optional[int], mtime_ns: Optional[int],
+                   reason: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO quarantine (file_path, file_size, mtime_ns, reason,"
+                " quarantined_at) VALUES (?, ?, ?, ?, ?)",
+                (file_path, file_size, mtime_ns, reason, time.time()),
+            )
+            self._conn.commit()
+
+    def get_quarantined(self) -> Dict[str, Dict]:
+        """Return {file_path: quarantine record} for every quarantined file."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM quarantine").fetchall()
+        return {row["file_path"]: dict(row) for row in rows}
+
+    def release_quarantine(self, file_paths: List[str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM quarantine WHERE file_path = ?", [(p,) for p in file_paths]
+            )
+            self._conn.commit()
+
+    def quarantine_summary(self) -> Dict:
+        """Quarantined file count, in total and per reason."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT reason, COUNT(*) FROM quarantine GROUP BY reason"
+            ).fetchall()
+        by_reason = {reason: count for reason, count in rows}
+        return {"total": sum(by_reason.values()), "by_reason": by_reason}
+
+    def list_files(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        sort_by: str = "file_name",
+        descending: bool = False,
+        extension: Optional[str] = None,
+        path_prefix: Optional[str] = None,
+        name_contains: Optional[str] = None,
+    ) -> Tuple[List[Dict], Dict]:
+        """Return one page of files plus totals (file count, chunks, bytes) for the filter."""
+        if sort_by not in SORTABLE_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort_by!r}; expected one of {SORTABLE_COLUMNS}")
+
+        clauses, params = [], []
+        if extension:
+            clauses.append("file_extension = ?")
+            params.append(normalize_extension(extension))
+        if path_prefix:
+            # Range scan on the primary key instead of LIKE, so % and _ in
+            # paths don't need escaping and the index is used.
+            base, low, high = path_range(path_prefix)
+            clauses.append("(file_path = ? OR (file_path >= ? AND file_path < ?))")
+            params.extend([base, low, high])
+        if name_contains:
+            clauses.append("instr(lower(file_path), ?) > 0")
+            params.append(name_contains.lower())
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        order = "DESC" if descending else "ASC"
+        page = " LIMIT ? OFFSET ?" if limit is not None else ""
+        page_params = [limit, offset] if limit is not None else []
+
+        with self._lock:
+            totals = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(total_chunks), 0), COALESCE(SUM(file_size), 0)"
+                f" FROM files{where}",
+                params,
+            ).fetchone()
+            rows = self._conn.execute(
+                "SELECT file_path, file_name, file_extension, file_size, total_chunks,"
+                f" modified_time FROM files{where} ORDER BY {sort_by} {order}, file_path{page}",
+                params + page_params,
+            ).fetchall()
+
+        summary = {"total": totals[0], "total_chunks": totals[1], "total_size": totals[2]}
+        return [dict(row) for row in rows], summary
+
+    def list_dirs(self, path_prefix: str) -> List[str]:
+        """Distinct directories holding indexed files, at or under path_prefix."""
+        base, low, high = path_range(path_prefix)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT file_dir FROM files"
+                " WHERE file_dir = ? OR (file_dir >= ? AND file_dir < ?)",
+                (base, low, high),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def rebuild_from_collection(self, collection, page_size: int = 10000) -> int:
+        """Populate the manifest from chunk metadata (one-time migration)."""
+        files: Dict[str, Dict] = {}
+        offset = 0
+        while True:
+            results = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids = results.get("ids") or []
+            if not ids:
+                break
+            for chunk_id, md in zip(ids, results["metadatas"]):
+                record = files.get(md["file_path"])
+                if record is None:
+                    record = files[md["file_path"]] = {
+                        "file_path": md["file_path"],
+                        "file_name": md["file_name"],
+                        "file_extension": md["file_extension"],
+                        "file_hash": md["file_hash"],
+                        "raw_hash": md.get("raw_hash"),
+                        "file_size": md.get("file_size"),
+                        "mtime_ns": md.get("mtime_ns"),
+                        "inode": md.get("inode"),
+                        "modified_time": md.get("modified_time"),
+                        "total_chunks": md["total_chunks"],
+                        "chunk_ids": [],
+                    }
+                record["chunk_ids"].append(chunk_id)
+            offset += len(ids)
+        self.upsert_many(files.values())
+        return len(files)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,7 +1,14 @@
 use pyo3::prelude::*;
-use quick_xml::events::Event;
+use quick_xml::events::{BytesRef, Event};
 use quick_xml::reader::Reader;
+use rayon::prelude::*;
+use sha2::{Digest, Sha256};
+use std::fmt::Write;
 use std::io::Read;
+use std::path::{Path, PathBuf};
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::sync::{Arc, Mutex};
+use std::time::UNIX_EPOCH;
 
 fn extract_plain(path: &str) -> Option<String> {
     match std::fs::read(path) {
@@ -13,8 +20,39 @@ fn extract_plain(path: &str) -> Option<String> {
     }
 }
 
+/// PDFs with at least this many pages have their pages extracted in
+/// parallel on the rayon pool and stitched back together in page order, so
+/// one long document doesn't pin a single core.
+const PDF_SPLIT_MIN_PAGES: usize = 16;
+
+fn pdf_page_text(doc: &lopdf::Document, page_num: u32) -> Result<String, pdf_extract::OutputError> {
+    let mut text = String::new();
+    pdf_extract::output_doc_page(doc, &mut pdf_extract::PlainTextOutput::new(&mut text), page_num)?;
+    Ok(text)
+}
+
+/// Same text as `pdf_extract::extract_text`: page outputs are concatenated
+/// in page order either way.
+fn read_pdf(path: &str) -> Result<String, pdf_extract::OutputError> {
+    let mut doc = lopdf::Document::load(path)?;
+    if doc.is_encrypted() {
+        doc.decrypt("")?;
+    }
+    let pages: Vec<u32> = doc.get_pages().into_keys().collect();
+    if pages.len() < PDF_SPLIT_MIN_PAGES {
+        let mut text = String::new();
+        pdf_extract::output_doc(&doc, &mut pdf_extract::PlainTextOutput::new(&mut text))?;
+        return Ok(text);
+    }
+    let texts = pages
+        .par_iter()
+        .map(|&page_num| pdf_page_text(&doc, page_num))
+        .collect::<Result<Vec<_>, _>>()?;
+    Ok(texts.concat())
+}
+
 fn extract_pdf(path: &str) -> Option<String> {
-    match pdf_extract::extract_text(path) {
+    match read_pdf(path) {
         Ok(text) => Some(text),
         Err(e) => {
             eprintln!("Error extracting text from PDF: {e}");
@@ -23,6 +61,19 @@ fn extract_pdf(path: &str) -> Option<String> {
     }
 }
 
+/// Appends the text of a char reference or predefined entity (`&#8212;`, `&amp;`).
+fn push_general_ref(out: &mut String, e: &BytesRef) {
+    if e.is_char_ref() {
+        if let Ok(Some(c)) = e.resolve_char_ref() {
+            out.push(c);
+        }
+    } else if let Ok(name) = e.decode() {
+        if let Some(resolved) = quick_xml::escape::resolve_predefined_entity(&name) {
+            out.push_str(resolved);
+        }
+    }
+}
+
 /// Strips out all text runs from an XML part of an OOXML document.
 fn strip_text_runs(xml: &str) -> String {
     let mut reader = Reader::from_str(xml);
@@ -47,15 +98,7 @@ fn strip_text_runs(xml: &str) -> String {
             // own event rather than inline in Event::Text.
             Ok(Event::GeneralRef(e)) => {
                 if in_text {
-                    if e.is_char_ref() {
-                        if let Ok(Some(c)) = e.resolve_char_ref() {
-                            out.push(c);
-                        }
-                    } else if let Ok(name) = e.decode() {
-                        if let Some(resolved) = quick_xml::escape::resolve_predefined_entity(&name) {
-                            out.push_str(resolved);
-                        }
-                    }
+                    push_general_ref(&mut out, &e);
                 }
             }
             Ok(Event::End(e)) => {
@@ -82,14 +125,141 @@ fn strip_text_runs(xml: &str) -> String {
     out
 }
 
-/// Reads a single XML part out of a zip (docx/pptx are zipped OOXML) and strips its text runs.
-fn extract_ooxml_part(path: &str, entry: &str) -> Option<String> {
+/// The text of each `<si>` item in an XLSX shared string table, by index:
+/// all of its `<t>` runs, without phonetic (`<rPh>`) hints.
+fn xlsx_shared_strings(xml: &str) -> Vec<String> {
+    let mut reader = Reader::from_str(xml);
+    let mut strings = Vec::new();
+    let mut current = String::new();
+    let mut buf = Vec::new();
+    let mut in_text = false;
+    let mut in_phonetic = false;
+    loop {
+        match reader.read_event_into(&mut buf) {
+            Ok(Event::Start(e)) => match e.local_name().as_ref() {
+                b"t" => in_text = !in_phonetic,
+                b"rPh" => in_phonetic = true,
+                _ => {}
+            },
+            Ok(Event::Text(e)) => {
+                if in_text {
+                    if let Ok(decoded) = e.decode() {
+                        current.push_str(&decoded);
+                    }
+                }
+            }
+            Ok(Event::GeneralRef(e)) => {
+                if in_text {
+                    push_general_ref(&mut current, &e);
+                }
+            }
+            Ok(Event::End(e)) => match e.local_name().as_ref() {
+                b"t" => in_text = false,
+                b"rPh" => in_phonetic = false,
+                b"si" => strings.push(std::mem::take(&mut current)),
+                _ => {}
+            },
+            // An empty `<si/>` still takes up an index.
+            Ok(Event::Empty(e)) => {
+                if e.local_name().as_ref() == b"si" {
+                    strings.push(String::new());
+                }
+            }
+            Ok(Event::Eof) => break,
+            Err(_) => break,
+            _ => {}
+        }
+        buf.clear();
+    }
+    strings
+}
+
+/// Display text of one XLSX cell from its `t` attribute and raw value:
+/// shared strings are looked up by index, booleans spelled out, anything
+/// else (numbers, inline and formula strings, errors) kept as stored.
+fn xlsx_cell_text(cell_type: &[u8], value: &str, shared: &[String]) -> Option<String> {
+    let text = match cell_type {
+        b"s" => shared.get(value.trim().parse::<usize>().ok()?)?.clone(),
+        b"b" => String::from(if value.trim() == "1" { "TRUE" } else { "FALSE" }),
+        _ => value.to_string(),
+    };
+    if text.trim().is_empty() { None } else { Some(text) }
+}
+
+/// Text of one XLSX worksheet: each row's non-empty cells, tab-separated,
+/// one row per line.
+fn xlsx_sheet_text(xml: &str, shared: &[String]) -> String {
+    let mut reader = Reader::from_str(xml);
+    let mut out = String::new();
+    let mut buf = Vec::new();
+    let mut row: Vec<String> = Vec::new();
+    let mut cell_type: Vec<u8> = Vec::new();
+    let mut value = String::new();
+    let mut in_value = false;
+    let mut in_phonetic = false;
+    loop {
+        match reader.read_event_into(&mut buf) {
+            Ok(Event::Start(e)) => match e.local_name().as_ref() {
+                b"c" => {
+                    cell_type = match e.try_get_attribute("t") {
+                        Ok(Some(attr)) => attr.value.into_owned(),
+                        _ => Vec::new(),
+                    };
+                    value.clear();
+                }
+                // `<v>` holds the stored value (or shared string index);
+                // inline strings are `<is><t>` runs instead.
+                b"v" | b"t" => in_value = !in_phonetic,
+                b"rPh" => in_phonetic = true,
+                _ => {}
+            },
+            Ok(Event::Text(e)) => {
+                if in_value {
+                    if let Ok(decoded) = e.decode() {
+                        value.push_str(&decoded);
+                    }
+                }
+            }
+            Ok(Event::GeneralRef(e)) => {
+                if in_value {
+                    push_general_ref(&mut value, &e);
+                }
+            }
+            Ok(Event::End(e)) => match e.local_name().as_ref() {
+                b"v" | b"t" => in_value = false,
+                b"rPh" => in_phonetic = false,
+                b"c" => row.extend(xlsx_cell_text(&cell_type, &value, shared)),
+                b"row" => {
+                    if !row.is_empty() {
+                        out.push_str(&row.join("\t"));
+                        out.push('\n');
+                        row.clear();
+                    }
+                }
+                _ => {}
+            },
+            Ok(Event::Eof) => break,
+            Err(_) => break,
+            _ => {}
+        }
+        buf.clear();
+    }
+    out
+}
+
+type OoxmlArchive = zip::ZipArchive<std::fs::File>;
+
+fn open_ooxml(path: &str) -> Option<OoxmlArchive> {
     let file = std::fs::File::open(path)
         .map_err(|e| eprintln!("Error opening file: {e}"))
         .ok()?;
-    let mut archive = zip::ZipArchive::new(file)
+    zip::ZipArchive::new(file)
         .map_err(|e| eprintln!("Error reading zip archive: {e}"))
-        .ok()?;
+        .ok()
+}
+
+/// Reads a single XML part out of an opened OOXML zip.
+fn read_ooxml_part(archive: &mut OoxmlArchive, entry: &str) -> Option<String> {
     let mut xml = String::new();
     archive
         .by_name(entry)
@@ -98,7 +268,27 @@ fn extract_ooxml_part(path: &str, entry: &str) -> Option<String> {
         .read_to_string(&mut xml)
         .map_err(|e| eprintln!("Error reading {entry}: {e}"))
         .ok()?;
-    Some(strip_text_runs(&xml))
+    Some(xml)
+}
+
+/// Names of the numbered parts `{prefix}N.xml` (e.g. `ppt/slides/slide3.xml`)
+/// in order of N, which is slide/sheet order for files saved by Office.
+fn numbered_parts(archive: &OoxmlArchive, prefix: &str) -> Vec<String> {
+    let mut parts: Vec<(u32, &str)> = archive
+        .file_names()
+        .filter_map(|name| {
+            let n = name.strip_prefix(prefix)?.strip_suffix(".xml")?.parse().ok()?;
+            Some((n, name))
+        })
+        .collect();
+    parts.sort_unstable();
+    parts.into_iter().map(|(_, name)| name.to_string()).collect()
+}
+
+/// Reads a single XML part out of a zip (docx/pptx are zipped OOXML) and strips its text runs.
+fn extract_ooxml_part(path: &str, entry: &str) -> Option<String> {
+    let mut archive = open_ooxml(path)?;
+    read_ooxml_part(&mut archive, entry).map(|xml| strip_text_runs(&xml))
 }
 
 fn extract_docx(path: &str) -> Option<String> {
@@ -111,6 +301,57 @@ fn extract_docx(path: &str) -> Option<String> {
     }
 }
 
+/// Text runs of every slide, in slide order, with a blank line between slides.
+fn read_pptx(path: &str) -> Option<String> {
+    let mut archive = open_ooxml(path)?;
+    let mut out = String::new();
+    for part in numbered_parts(&archive, "ppt/slides/slide") {
+        let xml = read_ooxml_part(&mut archive, &part)?;
+        out.push_str(&strip_text_runs(&xml));
+        out.push('\n');
+    }
+    Some(out)
+}
+
+fn extract_pptx(path: &str) -> Option<String> {
+    match read_pptx(path) {
+        Some(text) => Some(text),
+        None => {
+            eprintln!("Error extracting text from PPTX: {path}");
+            None
+        }
+    }
+}
+
+/// Cell text of every worksheet, in sheet order, with a blank line between sheets.
+fn read_xlsx(path: &str) -> Option<String> {
+    let mut archive = open_ooxml(path)?;
+    // Workbooks without any text cells have no shared string table.
+    let has_shared = archive.file_names().any(|name| name == "xl/sharedStrings.xml");
+    let shared = if has_shared {
+        xlsx_shared_strings(&read_ooxml_part(&mut archive, "xl/sharedStrings.xml")?)
+    } else {
+        Vec::new()
+    };
+    let mut out = String::new();
+    for part in numbered_parts(&archive, "xl/worksheets/sheet") {
+        let xml = read_ooxml_part(&mut archive, &part)?;
+        out.push_str(&xlsx_sheet_text(&xml, &shared));
+        out.push('\n');
+    }
+    Some(out)
+}
+
+fn extract_xlsx(path: &str) -> Option<String> {
+    match read_xlsx(path) {
+        Some(text) => Some(text),
+        None => {
+            eprintln!("Error extracting text from XLSX: {path}");
+            None
+        }
+    }
+}
+
 // Extension-based dispatch to the appropriate extraction function.
 fn process_file_inner(path: &str) -> Option<String> {
     let extension = std::path::Path::new(path)
@@ -120,6 +361,8 @@ fn process_file_inner(path: &str) -> Option<String> {
     match extension.as_deref() {
         Some("pdf") => extract_pdf(path),
         Some("docx") => extract_docx(path),
+        Some("pptx") => extract_pptx(path),
+        Some("xlsx") => extract_xlsx(path),
         Some("txt") | Some("md") => extract_plain(path),
         Some(ext) => {
             println!("Unsupported file type: .{ext}");
@@ -132,12 +375,416 @@ fn process_file_inner(path: &str) -> Option<String> {
     }
 }
 
+/// The pool ExtractStream runs on, apart from rayon's global pool (which
+/// hashing and scanning use), and how many of its threads are stuck on
+/// files that timed out. A timeout can't interrupt an extractor: its thread
+/// stays busy until the extractor returns, if ever.
+struct ExtractPool {
+    pool: Arc<rayon::ThreadPool>,
+    stuck: Arc<AtomicUsize>,
+}
+
+static EXTRACT_POOL: Mutex<Option<ExtractPool>> = Mutex::new(None);
+/// Threads still busy with a timed-out file, across every pool built.
+static STUCK_EXTRACTIONS: AtomicUsize = AtomicUsize::new(0);
+
+/// The current extraction pool. Once half its threads are stuck a fresh
+/// pool replaces it, until the stuck threads across all pools reach four
+/// times a pool's size; past that the degraded pool is kept, so hung files
+/// can't leak threads without bound.
+fn extract_pool() -> Result<(Arc<rayon::ThreadPool>, Arc<AtomicUsize>), rayon::ThreadPoolBuildError> {
+    let mut current = EXTRACT_POOL.lock().unwrap();
+    let threads = rayon::current_num_threads();
+    if let Some(p) = current.as_ref() {
+        let stuck = p.stuck.load(Ordering::Relaxed);
+        if stuck * 2 < p.pool.current_num_threads() {
+            return Ok((Arc::clone(&p.pool), Arc::clone(&p.stuck)));
+        }
+        if STUCK_EXTRACTIONS.load(Ordering::Relaxed) >= 4 * threads {
+            eprintln!("{stuck} extraction threads are stuck on timed-out files; not starting more");
+            return Ok((Arc::clone(&p.pool), Arc::clone(&p.stuck)));
+        }
+        eprintln!("{stuck} extraction threads are stuck on timed-out files; starting a fresh pool");
+    }
+    let pool = Arc::new(
+        rayon::ThreadPoolBuilder::new()
+            .num_threads(threads)
+            .thread_name(|i| format!("extract-{i}"))
+            .build()?,
+    );
+    let stuck = Arc::new(AtomicUsize::new(0));
+    *current = Some(ExtractPool { pool: Arc::clone(&pool), stuck: Arc::clone(&stuck) });
+    Ok((pool, stuck))
+}
+
+/// Indices of `paths` ordered largest file first (unreadable files last).
+/// Starting the biggest files first keeps one of them from being picked up
+/// last and setting the wall time of the whole batch.
+fn largest_first(paths: &[String]) -> Vec<usize> {
+    let sizes: Vec<u64> = paths
+        .par_iter()
+        .map(|p| std::fs::metadata(p).map(|m| m.len()).unwrap_or(0))
+        .collect();
+    let mut order: Vec<usize> = (0..paths.len()).collect();
+    order.sort_by(|&a, &b| sizes[b].cmp(&sizes[a]));
+    order
+}
+
+/// Fast (non-cryptographic) XXH3-128 hash of a file's raw bytes, as hex.
+/// Used to tell whether a file whose stat changed actually has new content.
+fn hash_file_bytes(path: &str) -> Option<String> {
+    let mut file = std::fs::File::open(path)
+        .map_err(|e| eprintln!("Error opening file for hashing: {e}"))
+        .ok()?;
+    let mut hasher = xxhash_rust::xxh3::Xxh3::new();
+    let mut buf = vec![0u8; 1 << 20];
+    loop {
+        match file.read(&mut buf) {
+            Ok(0) => break,
+            Ok(n) => hasher.update(&buf[..n]),
+            Err(e) => {
+                eprintln!("Error hashing file: {e}");
+                return None;
+            }
+        }
+    }
+    Some(format!("{:032x}", hasher.digest128()))
+}
+
+/// SHA-256 of `bytes` as lowercase hex (same as Python's hashlib hexdigest).
+fn sha256_hex(bytes: &[u8]) -> String {
+    let mut hex = String::with_capacity(64);
+    for byte in Sha256::digest(bytes) {
+        let _ = write!(hex, "{byte:02x}");
+    }
+    hex
+}
+
+/// Fixed-size overlapping chunk spans, in characters, for a text of
+/// `n_chars` characters. Must stay identical to
+/// `FileProcessor.chunk_spans_fixed`, or existing chunk ids stop matching.
+/// Requires `chunk_size > overlap`.
+fn fixed_chunk_spans(n_chars: usize, chunk_size: usize, overlap: usize) -> Vec<(usize, usize)> {
+    if n_chars <= chunk_size {
+        return vec![(0, n_chars)];
+    }
+    let num_chunks = (n_chars - overlap).div_ceil(chunk_size - overlap);
+    let size = n_chars.div_ceil(num_chunks) + overlap;
+    let mut spans = Vec::with_capacity(num_chunks + 1);
+    let mut start = 0;
+    while start < n_chars {
+        spans.push((start, (start + size).min(n_chars)));
+        start += size - overlap;
+    }
+    spans
+}
+
+/// A chunk as (start, end, sha256 hex), with offsets in characters so they
+/// index the Python string directly.
+type ChunkSpan = (usize, usize, String);
+
+/// Chunk `text` with `fixed_chunk_spans` and hash each chunk's UTF-8 bytes.
+fn chunk_and_hash(text: &str, chunk_size: usize, overlap: usize) -> Vec<ChunkSpan> {
+    let spans = fixed_chunk_spans(text.chars().count(), chunk_size, overlap);
+
+    // Map every span boundary (in chars) to its byte offset in one pass over
+    // the text; starts and ends are each increasing.
+    let mut points: Vec<usize> = spans.iter().flat_map(|&(s, e)| [s, e]).collect();
+    points.sort_unstable();
+    points.dedup();
+    let mut offsets = text
+        .char_indices()
+        .map(|(byte, _)| byte)
+        .chain(std::iter::once(text.len()));
+    let mut byte_offsets = Vec::with_capacity(points.len());
+    let mut char_pos = 0;
+    let mut current = offsets.next().unwrap_or(text.len());
+    for &point in &points {
+        while char_pos < point {
+            current = offsets.next().unwrap_or(text.len());
+            char_pos += 1;
+        }
+        byte_offsets.push(current);
+    }
+    let byte_at = |char_idx: usize| byte_offsets[points.binary_search(&char_idx).unwrap()];
+
+    spans
+        .into_iter()
+        .map(|(start, end)| (start, end, sha256_hex(text[byte_at(start)..byte_at(end)].as_bytes())))
+        .collect()
+}
+
+/// Bump whenever a change to this crate alters the text extracted from any
+/// file (or which files yield text), so texts cached by an older extractor
+/// stop being served.
+const EXTRACTOR_VERSION: u32 = 1;
+
+// Why a file produced no text, as reported in an ExtractedFile.
+const EXTRACT_ERROR: &str = "error";
+const EXTRACT_TIMEOUT: &str = "timeout";
+const FILE_TOO_LARGE: &str = "file_too_large";
+const TEXT_TOO_LARGE: &str = "text_too_large";
+
+/// Extraction result: (path, text, text sha256, chunks, error). Chunks are
+/// None when chunking wasn't requested (chunk_size 0). If extraction failed
+/// or went over budget, everything but the path and the error is None.
+type ExtractedFile = (
+    String,
+    Option<String>,
+    Option<String>,
+    Option<Vec<ChunkSpan>>,
+    Option<&'static str>,
+);
+
+fn failed(path: String, error: &'static str) -> ExtractedFile {
+    (path, None, None, None, Some(error))
+}
+
+/// Per-file extraction limits; 0 disables a limit.
+#[derive(Clone, Copy, Default)]
+struct ExtractBudget {
+    /// Raw file size, checked before the file is opened.
+    max_bytes: u64,
+    /// Extracted text size (UTF-8 bytes), checked before it is hashed and
+    /// handed to Python.
+    max_text_bytes: usize,
+}
+
+/// Extract, hash and (if `chunk_size` > 0) chunk one file, all in the
+/// calling thread, within the size limits of `budget`.
+fn extract_chunk_hash_inner(
+    path: String,
+    chunk_size: usize,
+    overlap: usize,
+    budget: ExtractBudget,
+) -> ExtractedFile {
+    if budget.max_bytes > 0 {
+        if let Ok(meta) = std::fs::metadata(&path) {
+            if meta.len() > budget.max_bytes {
+                eprintln!(
+                    "Skipping {path}: {} bytes is over the {} byte limit",
+                    meta.len(),
+                    budget.max_bytes
+                );
+                return failed(path, FILE_TOO_LARGE);
+            }
+        }
+    }
+    let Some(text) = process_file_inner(&path) else {
+        return failed(path, EXTRACT_ERROR);
+    };
+    if budget.max_text_bytes > 0 && text.len() > budget.max_text_bytes {
+        eprintln!(
+            "Skipping {path}: extracted {} bytes of text, over the {} byte limit",
+            text.len(),
+            budget.max_text_bytes
+        );
+        return failed(path, TEXT_TOO_LARGE);
+    }
+    let text_hash = sha256_hex(text.as_bytes());
+    let chunks = (chunk_size > 0).then(|| chunk_and_hash(&text, chunk_size, overlap));
+    (path, Some(text), Some(text_hash), chunks, None)
+}
+
+/// One pattern from a `.fileindexerignore` file. Patterns match entry names
+/// (not paths) with `*` and `?` wildcards; a trailing `/` matches directories only.
+#[derive(Clone)]
+struct IgnorePattern {
+    pattern: String,
+    dir_only: bool,
+}
+
+fn wildcard_match(pattern: &[u8], name: &[u8]) -> bool {
+    let (mut p, mut n) = (0, 0);
+    let mut star: Option<usize> = None;
+    let mut star_n = 0;
+    while n < name.len() {
+        if p < pattern.len() && (pattern[p] == b'?' || pattern[p] == name[n]) {
+            p += 1;
+            n += 1;
+        } else if p < pattern.len() && pattern[p] == b'*' {
+            star = Some(p);
+            star_n = n;
+            p += 1;
+        } else if let Some(s) = star {
+            // Let the last `*` swallow one more character and retry.
+            p = s + 1;
+            star_n += 1;
+            n = star_n;
+        } else {
+            return false;
+        }
+    }
+    while p < pattern.len() && pattern[p] == b'*' {
+        p += 1;
+    }
+    p == pattern.len()
+}
+
+fn read_ignore_file(dir: &Path, file_name: &str) -> Vec<IgnorePattern> {
+    let Ok(contents) = std::fs::read_to_string(dir.join(file_name)) else {
+        return Vec::new();
+    };
+    contents
+        .lines()
+        .map(str::trim)
+        .filter(|line| !line.is_empty() && !line.starts_with('#'))
+        .map(|line| IgnorePattern {
+            pattern: line.trim_end_matches('/').to_string(),
+            dir_only: line.ends_with('/'),
+        })
+        .collect()
+}
+
+#[cfg(unix)]
+fn inode(md: &std::fs::Metadata) -> u64 {
+    use std::os::unix::fs::MetadataExt;
+    md.ino()
+}
+
+#[cfg(not(unix))]
+fn inode(_md: &std::fs::Metadata) -> u64 {
+    0
+}
+
+struct ScanOptions {
+    extensions: Vec<String>,
+    max_size: u64,
+    skip_hidden: bool,
+    ignore_dirs: Vec<String>,
+    ignore_file: String,
+}
+
+/// (path, size, mtime_ns, inode) for one matching file.
+type ScanEntry = (String, u64, i64, u64);
+
+/// Whether the scanner skips an entry by name: hidden, matched by an
+/// ignore pattern, or (directories) named in `ignore_dirs`.
+fn entry_ignored(name: &str, is_dir: bool, opts: &ScanOptions, patterns: &[IgnorePattern]) -> bool {
+    (opts.skip_hidden && name.starts_with('.'))
+        || patterns
+            .iter()
+            .any(|p| (is_dir || !p.dir_only) && wildcard_match(p.pattern.as_bytes(), name.as_bytes()))
+        || (is_dir && opts.ignore_dirs.iter().any(|d| d.as_str() == name))
+}
+
+fn has_extension(name: &str, extensions: &[String]) -> bool {
+    Path::new(name)
+        .extension()
+        .and_then(|e| e.to_str())
+        .is_some_and(|e| extensions.contains(&format!(".{}", e.to_lowercase())))
+}
+
+/// Whether `path` under `root` passes the same name rules as `scan_dir`
+/// (sizes aside), reading the ignore files of every directory in between.
+fn scan_includes_path(root: &Path, path: &Path, opts: &ScanOptions) -> bool {
+    let Ok(relative) = path.strip_prefix(root) else {
+        return false;
+    };
+    let names: Vec<String> = relative
+        .components()
+        .map(|c| c.as_os_str().to_string_lossy().into_owned())
+        .collect();
+    let Some((file_name, dirs)) = names.split_last() else {
+        return false;
+    };
+    let mut dir = root.to_path_buf();
+    let mut patterns = read_ignore_file(&dir, &opts.ignore_file);
+    for name in dirs {
+        if entry_ignored(name, true, opts, &patterns) {
+            return false;
+        }
+        dir.push(name);
+        patterns.extend(read_ignore_file(&dir, &opts.ignore_file));
+    }
+    if entry_ignored(file_name, false, opts, &patterns) || !has_extension(file_name, &opts.extensions) {
+        return false;
+    }
+    // A path that no longer exists (deleted or moved away) is judged by name alone.
+    !std::fs::symlink_metadata(path).is_ok_and(|md| md.file_type().is_symlink())
+}
+
+/// Recursively lists matching files under `dir`, walking subdirectories in
+/// parallel. Symlinks are skipped so links can't cause loops or duplicates.
+fn scan_dir(dir: &Path, opts: &ScanOptions, inherited: &[IgnorePattern]) -> Vec<ScanEntry> {
+    let entries = match std::fs::read_dir(dir) {
+        Ok(entries) => entries,
+        Err(e) => {
+            eprintln!("Error reading directory {}: {e}", dir.display());
+            return Vec::new();
+        }
+    };
+    let mut patterns = inherited.to_vec();
+    patterns.extend(read_ignore_file(dir, &opts.ignore_file));
+
+    let mut files = Vec::new();
+    let mut subdirs: Vec<PathBuf> = Vec::new();
+    for entry in entries.flatten() {
+        let Ok(file_type) = entry.file_type() else {
+            continue;
+        };
+        if file_type.is_symlink() {
+            continue;
+        }
+        let name = entry.file_name();
+        let name = name.to_string_lossy();
+        let is_dir = file_type.is_dir();
+        if entry_ignored(&name, is_dir, opts, &patterns) {
+            continue;
+        }
+        if is_dir {
+            subdirs.push(entry.path());
+            continue;
+        }
+        if !file_type.is_file() || !has_extension(&name, &opts.extensions) {
+            continue;
+        }
+        let Ok(md) = entry.metadata() else {
+            continue;
+        };
+        if opts.max_size > 0 && md.len() > opts.max_size {
+            eprintln!("Skipping {} ({} bytes, over the size limit)", entry.path().display(), md.len());
+            continue;
+        }
+        let mtime_ns = md
+            .modified()
+            .ok()
+            .and_then(|t| t.duration_since(UNIX_EPOCH).ok())
+            .map_or(0, |d| d.as_nanos() as i64);
+        files.push((entry.path().to_string_lossy().into_owned(), md.len(), mtime_ns, inode(&md)));
+    }
+
+    let nested: Vec<Vec<ScanEntry>> = subdirs
+        .par_iter()
+        .map(|d| scan_dir(d, opts, &patterns))
+        .collect();
+    files.extend(nested.into_iter().flatten());
+    files
+}
+
 /// A Python module implemented in Rust.
 #[pymodule]
 mod fileindexer_extract {
-    use super::{extract_docx, extract_pdf, extract_plain, process_file_inner};
+    use super::{
+        extract_chunk_hash_inner, extract_docx, extract_pdf, extract_plain, extract_pptx,
+        extract_pool, extract_xlsx, failed, hash_file_bytes, largest_first, process_file_inner, scan_dir,
+        ExtractBudget, ExtractedFile, ScanEntry, ScanOptions, EXTRACTOR_VERSION,
+        EXTRACT_TIMEOUT, STUCK_EXTRACTIONS,
+    };
+    use pyo3::exceptions::{PyOSError, PyValueError};
     use pyo3::prelude::*;
     use rayon::prelude::*;
+    use std::collections::{HashMap, HashSet};
+    use std::sync::mpsc::{Receiver, sync_channel};
+    use std::sync::atomic::{AtomicBool, Ordering};
+    use std::sync::{Arc, Mutex};
+    use std::time::{Duration, Instant};
+
+    /// Version of the extraction code; changes whenever extracted text may.
+    #[pyfunction]
+    fn extractor_version() -> u32 {
+        EXTRACTOR_VERSION
+    }
 
     /// Extract text from a TXT or MD file (lossy UTF-8 decode).
     #[pyfunction]
@@ -157,22 +804,316 @@ mod fileindexer_extract {
         Ok(extract_docx(path))
     }
 
-    /// Process a file and extract its text based on extension (pdf/docx/txt/md).
+    /// Extract text from a PPTX file (all slides, in order).
+    #[pyfunction]
+    fn extract_text_from_pptx(path: &str) -> PyResult<Option<String>> {
+        Ok(extract_pptx(path))
+    }
+
+    /// Extract cell text from an XLSX file (all sheets, in order).
+    #[pyfunction]
+    fn extract_text_from_xlsx(path: &str) -> PyResult<Option<String>> {
+        Ok(extract_xlsx(path))
+    }
+
+    /// Process a file and extract its text based on extension (pdf/docx/pptx/xlsx/txt/md).
     #[pyfunction]
     fn process_file(path: &str) -> PyResult<Option<String>> {
         Ok(process_file_inner(path))
     }
 
-    /// Extract text from every path in parallel across CPU cores.
+    /// Extract text from every path in parallel across CPU cores, largest
+    /// files first. Results are in the order of `paths`.
     #[pyfunction]
     fn process_files_parallel(py: Python<'_>, paths: Vec<String>) -> PyResult<Vec<Option<String>>> {
+        let results = py.detach(|| {
+            // par_bridge hands out work in iterator order, so the largest
+            // files really are started first.
+            let extracted: Vec<(usize, Option<String>)> = largest_first(&paths)
+                .into_iter()
+                .par_bridge()
+                .map(|i| (i, process_file_inner(&paths[i])))
+                .collect();
+            let mut results = vec![None; paths.len()];
+            for (i, text) in extracted {
+                results[i] = text;
+            }
+            results
+        });
+        Ok(results)
+    }
+
+    fn check_chunking(chunk_size: usize, overlap: usize) -> PyResult<()> {
+        if chunk_size > 0 && chunk_size <= overlap {
+            return Err(PyValueError::new_err("chunk_size must be greater than overlap"));
+        }
+        Ok(())
+    }
+
+    /// Extract one file's text, its SHA-256 and (if `chunk_size` > 0) its
+    /// fixed-size chunks as (start, end, sha256) with character offsets.
+    /// Returns (path, text, text_hash, chunks, error); see ExtractStream.
+    #[pyfunction]
+    #[pyo3(signature = (path, chunk_size=0, overlap=0, max_bytes=0, max_text_bytes=0))]
+    fn extract_chunk_hash(
+        py: Python<'_>,
+        path: String,
+        chunk_size: usize,
+        overlap: usize,
+        max_bytes: u64,
+        max_text_bytes: usize,
+    ) -> PyResult<ExtractedFile> {
+        check_chunking(chunk_size, overlap)?;
+        let budget = ExtractBudget { max_bytes, max_text_bytes };
+        Ok(py.detach(|| extract_chunk_hash_inner(path, chunk_size, overlap, budget)))
+    }
+
+    /// Files an ExtractStream's workers are busy with, by index into its
+    /// paths, and how many results (including timeouts) have been sent.
+    #[derive(Default)]
+    struct InFlight {
+        started: HashMap<usize, Instant>,
+        timed_out: HashSet<usize>,
+        reported: usize,
+    }
+
+    /// Iterator over extracted files, in completion order, each as
+    /// `(path, text, text_hash, chunks, error)`: the text, its SHA-256 and,
+    /// when `chunk_size` > 0, its fixed-size chunks as `(start, end, sha256)`
+    /// with character offsets into the text. Extraction, hashing and chunking
+    /// all happen in the same rayon task, and the text crosses into Python
+    /// once. If a file fails, everything but the path is None and `error`
+    /// says why: "error" (logged), "timeout", "file_too_large" or
+    /// "text_too_large".
+    ///
+    /// A background thread feeds the paths to the rayon pool largest file
+    /// first (see `largest_first`), and workers hand finished files over a
+    /// channel bounded to `buffer` items: once the buffer is full they block,
+    /// so at most `buffer` plus one text per worker is ever held, however
+    /// many paths there are. Waiting for the next item releases the GIL.
+    /// Dropping the iterator early stops the remaining extraction.
+    ///
+    /// With `timeout_s` > 0, a watchdog reports any file still extracting
+    /// after that long as a "timeout" and the iterator moves on without it.
+    /// The timeout does not interrupt the extraction: the worker stays busy
+    /// (and its late result is dropped) until the extractor returns, if
+    /// ever. Workers come from a dedicated pool (see `extract_pool`), so
+    /// stuck ones never hold up hashing or scanning on the global pool;
+    /// `stuck_extractions()` reports how many there are.
+    #[pyclass]
+    struct ExtractStream {
+        /// The channel and how many items are still to come: every path
+        /// yields exactly one item, so iteration ends on the count rather
+        /// than waiting for a stuck worker to drop its sender.
+        receiver: Mutex<(Receiver<ExtractedFile>, usize)>,
+        extract_times: Arc<Mutex<Vec<(String, f64)>>>,
+        /// Set when the stream is dropped or every file has been extracted;
+        /// the watchdog exits on it instead of polling for the process's life.
+        done: Arc<AtomicBool>,
+    }
+
+    impl Drop for ExtractStream {
+        fn drop(&mut self) {
+            self.done.store(true, Ordering::Relaxed);
+        }
+    }
+
+    #[pymethods]
+    impl ExtractStream {
+        #[new]
+        #[pyo3(signature = (paths, buffer=64, chunk_size=0, overlap=0, timeout_s=0.0, max_bytes=0, max_text_bytes=0))]
+        fn new(
+            paths: Vec<String>,
+            buffer: usize,
+            chunk_size: usize,
+            overlap: usize,
+            timeout_s: f64,
+            max_bytes: u64,
+            max_text_bytes: usize,
+        ) -> PyResult<Self> {
+            check_chunking(chunk_size, overlap)?;
+            let budget = ExtractBudget { max_bytes, max_text_bytes };
+            let (pool, stuck) = extract_pool()
+                .map_err(|e| PyOSError::new_err(format!("Cannot start extraction threads: {e}")))?;
+            let total = paths.len();
+            let paths = Arc::new(paths);
+            let (sender, receiver) = sync_channel(buffer.max(1));
+            let extract_times = Arc::new(Mutex::new(Vec::with_capacity(total)));
+            let in_flight = Arc::new(Mutex::new(InFlight::default()));
+            let done = Arc::new(AtomicBool::new(false));
+
+            if timeout_s > 0.0 {
+                let timeout = Duration::from_secs_f64(timeout_s);
+                let tick = (timeout / 4).min(Duration::from_millis(100));
+                let (paths, tx, times, in_flight, done, stuck) = (
+                    Arc::clone(&paths),
+                    sender.clone(),
+                    Arc::clone(&extract_times),
+                    Arc::clone(&in_flight),
+                    Arc::clone(&done),
+                    Arc::clone(&stuck),
+                );
+                std::thread::spawn(move || loop {
+                    std::thread::sleep(tick);
+                    if done.load(Ordering::Relaxed) {
+                        return;
+                    }
+                    let expired: Vec<usize> = {
+                        let mut state = in_flight.lock().unwrap();
+                        let expired: Vec<usize> = state
+                            .started
+                            .iter()
+                            .filter(|(_, started)| started.elapsed() >= timeout)
+                            .map(|(&i, _)| i)
+                            .collect();
+                        for i in &expired {
+                            state.started.remove(i);
+                            state.timed_out.insert(*i);
+                        }
+                        stuck.fetch_add(expired.len(), Ordering::Relaxed);
+                        STUCK_EXTRACTIONS.fetch_add(expired.len(), Ordering::Relaxed);
+                        state.reported += expired.len();
+                        expired
+                    };
+                    for i in expired {
+                        eprintln!("Extraction of {} timed out after {timeout_s}s", paths[i]);
+                        times.lock().unwrap().push((paths[i].clone(), timeout_s));
+                        if tx.send(failed(paths[i].clone(), EXTRACT_TIMEOUT)).is_err() {
+                            return;
+                        }
+                    }
+                    if in_flight.lock().unwrap().reported >= total {
+                        return;
+                    }
+                });
+            }
+
+            let times = Arc::clone(&extract_times);
+            let feeder_done = Arc::clone(&done);
+            std::thread::spawn(move || {
+                let order = largest_first(&paths);
+                // Each rayon task gets its own clone of the sender; a failed
+                // send means the receiver is gone, which ends the iteration.
+                // Inside install, nested parallelism (per-page PDF splits)
+                // stays on the extraction pool too.
+                let _ = pool.install(|| order.into_iter().par_bridge().try_for_each_with(sender, |tx, i| {
+                    let started = Instant::now();
+                    in_flight.lock().unwrap().started.insert(i, started);
+                    let extracted = extract_chunk_hash_inner(paths[i].clone(), chunk_size, overlap, budget);
+                    {
+                        let mut state = in_flight.lock().unwrap();
+                        state.started.remove(&i);
+                        if state.timed_out.contains(&i) {
+                            // Already reported by the watchdog; this thread is free again.
+                            stuck.fetch_sub(1, Ordering::Relaxed);
+                            STUCK_EXTRACTIONS.fetch_sub(1, Ordering::Relaxed);
+                            return Ok(());
+                        }
+                        state.reported += 1;
+                    }
+                    times.lock().unwrap().push((extracted.0.clone(), started.elapsed().as_secs_f64()));
+                    tx.send(extracted)
+                }));
+                feeder_done.store(true, Ordering::Relaxed);
+            });
+            Ok(ExtractStream {
+                receiver: Mutex::new((receiver, total)),
+                extract_times,
+                done,
+            })
+        }
+
+        fn __iter__(slf: PyRef<'_, Self>) -> PyRef<'_, Self> {
+            slf
+        }
+
+        fn __next__(&self, py: Python<'_>) -> Option<ExtractedFile> {
+            py.detach(|| {
+                let mut state = self.receiver.lock().unwrap();
+                if state.1 == 0 {
+                    return None;
+                }
+                let item = state.0.recv().ok()?;
+                state.1 -= 1;
+                Some(item)
+            })
+        }
+
+        /// `(path, seconds)` for every file extracted so far, in completion
+        /// order: wall time of its extract/hash/chunk task (the timeout, for
+        /// files that timed out).
+        fn extract_times(&self) -> Vec<(String, f64)> {
+            self.extract_times.lock().unwrap().clone()
+        }
+    }
+
+    /// Extraction threads still busy with files that timed out (see ExtractStream).
+    #[pyfunction]
+    fn stuck_extractions() -> usize {
+        STUCK_EXTRACTIONS.load(Ordering::Relaxed)
+    }
+
+    /// Hash the raw bytes of every path in parallel across CPU cores (XXH3-128, hex).
+    #[pyfunction]
+    fn hash_files_parallel(py: Python<'_>, paths: Vec<String>) -> PyResult<Vec<Option<String>>> {
         let results = py.detach(|| {
             paths
                 .par_iter()
-                .map(|p| process_file_inner(p))
+                .map(|p| hash_file_bytes(p))
                 .collect::<Vec<_>>()
         });
         Ok(results)
     }
-}
 
+    /// Recursively scan `root` in parallel for files with one of `extensions`
+    /// (lowercase, with leading dot), returning (path, size, mtime_ns, inode)
+    /// for each. Skips hidden entries (if `skip_hidden`), directories named in
+    /// `ignore_dirs`, names matching `ignore_file` patterns and files larger
+    /// than `max_size` bytes (0 = no limit).
+    #[pyfunction]
+    #[pyo3(signature = (root, extensions, max_size=0, skip_hidden=true, ignore_dirs=Vec::new(), ignore_file=String::from(".fileindexerignore")))]
+    fn scan_directory(
+        py: Python<'_>,
+        root: &str,
+        extensions: Vec<String>,
+        max_size: u64,
+        skip_hidden: bool,
+        ignore_dirs: Vec<String>,
+        ignore_file: String,
+    ) -> PyResult<Vec<ScanEntry>> {
+        let root = std::fs::canonicalize(root)
+            .map_err(|e| PyOSError::new_err(format!("Cannot scan {root}: {e}")))?;
+        let opts = ScanOptions {
+            extensions,
+            max_size,
+            skip_hidden,
+            ignore_dirs,
+            ignore_file,
+        };
+        Ok(py.detach(|| scan_dir(&root, &opts, &[])))
+    }
+
+    /// Whether `scan_directory(root, ...)` would list `path`, judging by its
+    /// name, extension and the ignore rules along the way (not its size),
+    /// so a path that no longer exists can still be checked. `root` must be
+    /// canonical, as `scan_directory` returns paths under it.
+    #[pyfunction]
+    #[pyo3(signature = (root, path, extensions, skip_hidden=true, ignore_dirs=Vec::new(), ignore_file=String::from(".fileindexerignore")))]
+    fn scan_includes(
+        root: &str,
+        path: &str,
+        extensions: Vec<String>,
+        skip_hidden: bool,
+        ignore_dirs: Vec<String>,
+        ignore_file: String,
+    ) -> bool {
+        let opts = ScanOptions {
+            extensions,
+            max_size: 0,
+            skip_hidden,
+            ignore_dirs,
+            ignore_file,
+        };
+        scan_includes_path(Path::new(root), Path::new(path), &opts)
+    }
+}
@@ -0,0 +1,430 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import Settings
+from file_index import file_metadata
+from file_processor import FileStat
+
+# Marks the end of a stage's output; every stage forwards it downstream once
+# its own input is exhausted.
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    """Busy time and item count for one pipeline stage."""
+    busy: float = 0.0
+    items: int = 0
+
+    def utilization(self, wall: float) -> float:
+        return self.busy / wall if wall else 0.0
+
+
+@dataclass
+class FileJob:
+    """A file that has been extracted, hashed and chunked and needs (re)indexing.
+
+    Chunks are kept as (start, end) spans of the file's text; only the new
+    ones are ever sliced out. `new` holds the indices of chunks whose content
+    id isn't in the collection yet; only those are embedded. `stale_ids` are
+    the file's old chunks that no longer exist and must be deleted.
+    """
+    file_path: Path
+    file_hash: str
+    text: str
+    spans: List[Tuple[int, int]]
+    chunk_hashes: List[str]
+    ids: List[str]
+    new: List[int]
+    stale_ids: List[str]
+    embeddings: Optional[List[List[float]]] = None
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self.spans)
+
+    @property
+    def new_chars(self) -> int:
+        return sum(self.spans[i][1] - self.spans[i][0] for i in self.new)
+
+    @cached_property
+    def new_chunks(self) -> List[str]:
+        return [self.text[start:end] for start, end in (self.spans[i] for i in self.new)]
+
+
+class IndexingPipeline:
+    """Staged producer/consumer pipeline used by Indexer.index_files.
+
+    Extraction, hash+chunk, embedding and ChromaDB writes each run on their
+    own thread, connected by bounded queues, so the embedder always has work
+    queued while the CPU extracts the next files and the DB writes the last
+    ones. Stage methods are looked up on the indexer at call time so
+    benchmark.py's instrumentation still sees every call.
+    """
+    settings = Settings()
+
+    STAGES = ("extract", "prepare", "embed", "write")
+
+    def __init__(self, indexer, indexed_files: Dict[str, Dict],
+                 progress_callback: Callable[[str, int, int], None] = None,
+                 stats: Dict[str, FileStat] = None,
+                 raw_hashes: Dict[str, str] = None,
+                 stop_event: threading.Event = None,
+                 on_files_done: Callable[[List[str], int], None] = None):
+        self.indexer = indexer
+        self.indexed_files = indexed_files
+        self.progress_callback = progress_callback
+        self.file_stats = stats or {}
+        self.raw_hashes = raw_hashes or {}
+        # Setting stop_event stops extraction; files already extracted are
+        # still written. on_files_done(paths, new_chunks) is called once
+        # files are fully handled: written, unchanged or without text.
+        self.stop_event = stop_event
+        self.on_files_done = on_files_done
+        self.failed_files = 0
+        self.stats = {name: StageStats() for name in self.STAGES}
+        self.wall = 0.0
+        # (path, seconds) per extracted file, from the native extractor.
+        self.extract_times: List[Tuple[str, float]] = []
+
+        queue_size = self.settings.PIPELINE_QUEUE_SIZE
+        self._extracted = queue.Queue(maxsize=queue_size)
+        self._prepared = queue.Queue(maxsize=queue_size)
+        self._embedded = queue.Queue(maxsize=queue_size)
+
+        self._abort = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def utilization(self) -> Dict[str, float]:
+        """Fraction of wall time each stage spent doing work (not waiting)."""
+        return {name: s.utilization(self.wall) for name, s in self.stats.items()}
+
+    def run(self, file_paths: List[Path]) -> None:
+        """Index file_paths, blocking until every stage has drained."""
+        t0 = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._guard, args=(self._extract_stage, file_paths),
+                             name="index-extract", daemon=True),
+            threading.Thread(target=self._guard, args=(self._prepare_stage, len(file_paths)),
+                             name="index-prepare", daemon=True),
+            threading.Thread(target=self._guard, args=(self._embed_stage,),
+                             name="index-embed", daemon=True),
+            threading.Thread(target=self._guard, args=(self._write_stage,),
+                             name="index-write", daemon=True),
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.wall = time.perf_counter() - t0
+
+        if self._error is not None:
+            raise self._error
+
+    def _guard(self, stage: Callable, *args) -> None:
+        # A failing stage stops the whole pipeline; run() re-raises the first error.
+        try:
+            stage(*args)
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            self._abort.set()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """Put with backpressure, giving up if another stage has failed."""
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._abort.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _files_done(self, file_paths: List[str], new_chunks: int = 0) -> None:
+        if self.on_files_done is not None:
+            self.on_files_done(file_paths, new_chunks)
+
+    def _extract_stage(self, file_paths: List[Path]) -> None:
+        stats = self.stats["extract"]
+        by_path = {str(p): p for p in file_paths}
+        # Files stream out of the native extractor as each one finishes, so a
+        # slow file never holds up the ones behind it and only a bounded
+        # number of texts is in memory at once. Time spent waiting for the
+        # next file is the extractor's busy time. Files that fail or go over
+        # their budget come back without text and are quarantined.
+        stream = self.indexer.file_processor.iter_files_parallel(
+            file_paths, self.settings.EXTRACT_BUFFER_SIZE, raw_hashes=self.raw_hashes
+        )
+        t0 = time.perf_counter()
+        for path_str, file_text, file_hash, chunks, error in stream:
+            stats.busy += time.perf_counter() - t0
+            stats.items += 1
+            if error is not None:
+                self.failed_files += 1
+                self.indexer.quarantine_file(path_str, self.file_stats.get(path_str), error)
+            if not self._put(self._extracted, (by_path[path_str], file_text, file_hash, chunks)):
+                return
+            if self.stop_event is not None and self.stop_event.is_set():
+                break
+            t0 = time.perf_counter()
+        self.extract_times = stream.extract_times()
+        self._put(self._extracted, _DONE)
+
+    def _prepare_stage(self, total: int) -> None:
+        stats = self.stats["prepare"]
+        i = 0
+        while True:
+            item = self._get(self._extracted)
+            if item is _DONE:
+                break
+            file_path, file_text, file_hash, native_chunks = item
+            if self.progress_callback:
+                self.progress_callback(f"Indexing {file_path}", i, total)
+            i += 1
+
+            if file_text is None:
+                # Failed extraction; quarantined by the extract stage.
+                self._files_done([str(file_path)])
+                continue
+
+            t0 = time.perf_counter()
+            if file_hash is None:
+                file_hash = self.indexer.get_file_hash(file_text)
+            path_str = str(file_path)
+
+            record = self.indexed_files.get(path_str)
+            if record and record["file_hash"] == file_hash:
+                # Same text (e.g. only PDF metadata changed): just record the new stat.
+                stat = self.file_stats.get(path_str) or FileStat.from_path(file_path)
+                self.indexer.refresh_file_stat(path_str, stat, self.raw_hashes.get(path_str))
+                stats.busy += time.perf_counter() - t0
+                self._files_done([path_str])
+                continue
+
+            if not file_text.strip():
+                # No text (e.g. a scanned PDF): recorded with no chunks, so
+                # unchanged runs skip it instead of extracting it again.
+                spans, chunk_hashes = [], []
+            elif native_chunks is not None:
+                # Chunked and hashed by the native extractor.
+                spans = [(start, end) for start, end, _ in native_chunks]
+                chunk_hashes = [chunk_hash for _, _, chunk_hash in native_chunks]
+            else:
+                spans = self.indexer.file_processor.chunk_spans(file_text)
+                chunk_hashes = [self.indexer.get_chunk_hash(file_text[start:end]) for start, end in spans]
+            ids = self.indexer.make_chunk_ids(path_str, chunk_hashes)
+
+            # Diff against the chunks already stored for this file: unchanged
+            # content ids keep their embeddings, only new ones get embedded.
+            old_ids = set()
+            if path_str in self.indexed_files:
+                old_ids = set(self.indexer.get_chunk_ids(path_str))
+            new = [i for i, chunk_id in enumerate(ids) if chunk_id not in old_ids]
+            stale_ids = sorted(old_ids.difference(ids))
+            stats.busy += time.perf_counter() - t0
+            stats.items += 1
+
+            job = FileJob(file_path, file_hash, file_text, spans, chunk_hashes, ids, new, stale_ids)
+            if not self._put(self._prepared, job):
+                return
+        self._put(self._prepared, _DONE)
+
+    def _embed_stage(self) -> None:
+        stats = self.stats["embed"]
+        batcher = self.indexer.generate_embedding.batcher
+        done = False
+        while not done:
+            job = self._get(self._prepared)
+            if job is _DONE:
+                break
+
+            # Regroup chunks from as many queued files as it takes to fill every
+            # in-flight embed request, so many tiny files share a round trip.
+            jobs = [job]
+            budget = batcher.batch_chars * batcher.concurrency
+            size = job.new_chars
+            while size < budget:
+                try:
+                    job = self._prepared.get_nowait()
+                except queue.Empty:
+                    break
+                if job is _DONE:
+                    done = True
+                    break
+                jobs.append(job)
+                size += job.new_chars
+
+            chunks = [c for j in jobs for c in j.new_chunks]
+            t0 = time.perf_counter()
+            embeddings = self.indexer.generate_embedding.generate_embeddings(chunks)
+            stats.busy += time.perf_counter() - t0
+            stats.items += len(jobs)
+
+            offset = 0
+            for j in jobs:
+                j.embeddings = embeddings[offset:offset + len(j.new)]
+                offset += len(j.new)
+                if not self._put(self._embedded, j):
+                    return
+        self._put(self._embedded, _DONE)
+
+    def _write_stage(self) -> None:
+        stats = self.stats["write"]
+        buffer = WriteBuffer(self.indexer, self.settings.WRITE_BATCH_SIZE, self._files_done)
+        while True:
+            job = self._get(self._embedded)
+            if job is _DONE:
+                break
+            t0 = time.perf_counter()
+            self._write(job, buffer)
+            if buffer.pending >= buffer.batch_size:
+                buffer.flush()
+            stats.busy += time.perf_counter() - t0
+            stats.items += 1
+        t0 = time.perf_counter()
+        buffer.flush()
+        stats.busy += time.perf_counter() - t0
+
+    def _write(self, job: FileJob, buffer: "WriteBuffer") -> None:
+        file_path = job.file_path
+        path_str = str(file_path)
+
+        # Prefer the stat taken before extraction: if the file changes while
+        # it's being indexed, the next run sees a mismatch and re-checks it.
+        stat = self.file_stats.get(path_str) or FileStat.from_path(file_path)
+        modified_time = datetime.fromtimestamp(stat.mtime)
+
+        metadatas = []
+        for chunk_idx, chunk_hash in enumerate(job.chunk_hashes):
+            metadatas.append({
+                "file_name": file_path.name,
+                "file_extension": file_path.suffix.lower(),
+                "file_dir": str(file_path.parent),
+                "file_path": path_str,
+                "file_hash": job.file_hash,
+                "chunk_hash": chunk_hash,
+                "file_size": stat.size,
+                "mtime_ns": stat.mtime_ns,
+                "inode": stat.inode,
+                "raw_hash": self.raw_hashes.get(path_str, ""),
+                "modified_time": modified_time.isoformat(),
+                "modified_ts": stat.mtime,
+                "total_chunks": job.chunk_count,
+                "chunk_index": chunk_idx
+            })
+
+        buffer.add_file(job, metadatas, {
+            "file_path": path_str,
+            "file_name": file_path.name,
+            "file_extension": file_path.suffix.lower(),
+            "file_hash": job.file_hash,
+            "raw_hash": self.raw_hashes.get(path_str),
+            "file_size": stat.size,
+            "mtime_ns": stat.mtime_ns,
+            "inode": stat.inode,
+            "modified_time": modified_time.isoformat(),
+            "total_chunks": job.chunk_count,
+            "chunk_ids": job.ids,
+        })
+
+
+class WriteBuffer:
+    """Collection writes accumulated across files and flushed together.
+
+    Small files each cost a delete, an add and an update call; buffered,
+    a flush issues one of each for every batch_size chunks, then one file
+    index upsert and one manifest write. Manifest records go last, so a file
+    is only recorded as indexed once its chunks are stored; chunks are
+    upserted, so a file re-indexed after a crash mid-flush overwrites them.
+    """
+
+    def __init__(self, indexer, batch_size: int,
+                 on_flushed: Callable[[List[str], int], None] = None):
+        self.indexer = indexer
+        self.batch_size = batch_size
+        # Called with the flushed files' paths and their new chunk count.
+        self.on_flushed = on_flushed
+        self._clear()
+
+    def _clear(self) -> None:
+        self.stale_ids: List[str] = []
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.embeddings: List[List[float]] = []
+        self.kept_ids: List[str] = []
+        self.kept_metadatas: List[Dict] = []
+        # (job, kept chunk ids, file-level metadata, manifest record) per file
+        self.files: List[Tuple[FileJob, List[str], Dict, Dict]] = []
+
+    @property
+    def pending(self) -> int:
+        """Chunks waiting to be written."""
+        return len(self.stale_ids) + len(self.ids) + len(self.kept_ids)
+
+    def add_file(self, job: FileJob, metadatas: List[Dict], record: Dict) -> None:
+        self.stale_ids.extend(job.stale_ids)
+        self.ids.extend(job.ids[i] for i in job.new)
+        self.documents.extend(job.new_chunks)
+        self.metadatas.extend(metadatas[i] for i in job.new)
+        self.embeddings.extend(job.embeddings or [])
+        # Chunks that survived the edit keep their embeddings; only their
+        # position and file-level metadata need refreshing.
+        new = set(job.new)
+        kept = [i for i in range(len(job.ids)) if i not in new]
+        self.kept_ids.extend(job.ids[i] for i in kept)
+        self.kept_metadatas.extend(metadatas[i] for i in kept)
+        self.files.append((job, [job.ids[i] for i in kept],
+                           file_metadata(metadatas[0]) if metadatas else {}, record))
+        # The text is no longer needed once its new chunks are sliced out.
+        job.text = ""
+
+    def _batches(self, *columns):
+        for start in range(0, len(columns[0]), self.batch_size):
+            yield [column[start:start + self.batch_size] for column in columns]
+
+    def flush(self) -> None:
+        if not self.files:
+            return
+        collection = self.indexer.collection
+        for (ids,) in self._batches(self.stale_ids):
+            collection.delete(ids=ids)
+        for ids, documents, metadatas, embeddings in self._batches(
+            self.ids, self.documents, self.metadatas, self.embeddings
+        ):
+            collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+        for ids, metadatas in self._batches(self.kept_ids, self.kept_metadatas):
+            collection.update(ids=ids, metadatas=metadatas)
+
+        # Each file's pooled vector covers its kept chunks as well as the new ones.
+        kept_embeddings = self.indexer.chunk_embeddings(self.kept_ids) if self.kept_ids else {}
+        self.indexer.file_index.put_many([
+            (
+                record["file_path"],
+                list(job.embeddings or []) + [kept_embeddings[i] for i in kept if i in kept_embeddings],
+                metadata,
+            )
+            for job, kept, metadata, record in self.files
+        ])
+        self.indexer.manifest.upsert_many(record for _, _, _, record in self.files)
+
+        for job, kept, _, _ in self.files:
+            print(f"Indexed {job.file_path} ({len(job.new)} new, {len(kept)} unchanged, "
+                  f"{len(job.stale_ids)} removed chunks)")
+        if self.on_flushed is not None:
+            self.on_flushed([record["file_path"] for _, _, _, record in self.files], len(self.ids))
+        self._clear()
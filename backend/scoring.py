@@ -0,0 +1,187 @@
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Semantic score weights for a file's best, second and third chunk.
+SEMANTIC_WEIGHTS = np.array([0.5, 0.3, 0.2])
+TOP_K = len(SEMANTIC_WEIGHTS)
+SECONDS_PER_DAY = 86400
+SNIPPET_CHARS = 300
+# Metadata kept in compact results: what the result list renders.
+COMPACT_METADATA_KEYS = ("file_name", "file_extension", "file_size", "modified_time",
+                         "chunk_index", "total_chunks")
+
+
+def _snippet(text: str) -> str:
+    return text[:SNIPPET_CHARS] + "..." if len(text) > SNIPPET_CHARS else text
+
+
+def _rank_within_file(file_idx: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Rank of each candidate among its file's candidates by value, descending.
+
+    Ties keep candidate order (lexsort is stable), as a stable Python sort would.
+    """
+    order = np.lexsort((-values, file_idx))
+    sorted_files = file_idx[order]
+    group_start = np.searchsorted(sorted_files, sorted_files, side="left")
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[order] = np.arange(len(values)) - group_start
+    return ranks
+
+
+def _modified_ts(metadata: Dict) -> float:
+    ts = metadata.get("modified_ts")
+    if ts is None:
+        # Chunks indexed before modified_ts was stored only have the ISO time.
+        ts = datetime.fromisoformat(metadata["modified_time"]).timestamp()
+    return ts
+
+
+def aggregate_file_scores(query: str, candidates: Sequence[Tuple[str, str, Dict, float]],
+                          n_results: int, now: Optional[float] = None) -> List[Dict]:
+    """Score (chunk_id, document, metadata, similarity) chunk candidates per file.
+
+    The final score per file is 60% semantic (weighted top-3 chunk
+    similarity) + 25% keyword (average top-3 term overlap) + up to 15%
+    coverage (chunks above 0.6 similarity) + up to 10% recency + a 15%
+    exact-phrase bonus. All of it is computed as array operations over the
+    candidate set; result dicts are only built for the top n_results files.
+    """
+    query_lower = query.lower()
+    query_terms = set(query_lower.split())
+    if not candidates or not query_terms:
+        return []
+    if now is None:
+        now = time.time()
+
+    chunk_ids = [c[0] for c in candidates]
+    documents = [c[1] for c in candidates]
+    metadatas = [c[2] for c in candidates]
+    similarities = np.fromiter((c[3] for c in candidates), dtype=np.float64, count=len(candidates))
+
+    # Number files in order of first appearance, so ties between final
+    # scores keep candidate order.
+    paths, first_idx, inverse = np.unique(
+        np.array([md["file_path"] for md in metadatas]), return_index=True, return_inverse=True
+    )
+    by_appearance = np.argsort(first_idx)
+    renumber = np.empty(len(paths), dtype=np.int64)
+    renumber[by_appearance] = np.arange(len(paths))
+    file_idx = renumber[inverse.ravel()]
+    file_first = first_idx[by_appearance]
+    n_files = len(paths)
+
+    # Keyword overlap and exact phrase match per chunk. str.lower and `in`
+    # beat np.char here: NumPy would first copy every chunk into a
+    # fixed-width UCS4 array.
+    n = len(documents)
+    lowered = [doc.lower() for doc in documents]
+    keyword_scores = np.zeros(n)
+    for term in query_terms:
+        keyword_scores += np.fromiter((term in doc for doc in lowered), dtype=bool, count=n)
+    keyword_scores /= len(query_terms)
+    exact_match = np.fromiter((query_lower in doc for doc in lowered), dtype=bool, count=n)
+
+    counts = np.bincount(file_idx, minlength=n_files)
+    k = np.minimum(TOP_K, counts)
+
+    # 1. Semantic score: weighted average of the top-k chunk similarities
+    sim_rank = _rank_within_file(file_idx, similarities)
+    weights = np.where(sim_rank < TOP_K, SEMANTIC_WEIGHTS[np.minimum(sim_rank, TOP_K - 1)], 0.0)
+    semantic = (np.bincount(file_idx, similarities * weights, minlength=n_files)
+                / np.bincount(file_idx, weights, minlength=n_files))
+
+    # 2. Keyword score: average of the top-k keyword matches
+    keyword_rank = _rank_within_file(file_idx, keyword_scores)
+    top_keyword = np.where(keyword_rank < TOP_K, keyword_scores, 0.0)
+    keyword = np.bincount(file_idx, top_keyword, minlength=n_files) / k
+
+    # 3. Coverage score: reward files with multiple relevant chunks
+    relevant = np.bincount(file_idx, similarities > 0.6, minlength=n_files)
+    coverage = np.minimum(relevant, 5) / 5 * 0.15
+
+    # 4. Recency score: up to 10% for files modified within the last year
+    modified = np.array([_modified_ts(metadatas[i]) for i in file_first])
+    days_old = np.floor((now - modified) / SECONDS_PER_DAY)
+    recency = np.maximum(0, (365 - days_old) / 365) * 0.1
+
+    # 5. Exact match bonus
+    exact_bonus = np.where(np.bincount(file_idx, exact_match, minlength=n_files) > 0, 0.15, 0.0)
+
+    final = semantic * 0.6 + keyword * 0.25 + coverage + recency + exact_bonus
+
+    top_files = np.argsort(-final, kind="stable")[:n_results]
+    best_chunk = np.empty(n_files, dtype=np.int64)
+    best_chunk[file_idx[sim_rank == 0]] = np.flatnonzero(sim_rank == 0)
+    by_file = np.argsort(file_idx, kind="stable")
+    file_start = np.concatenate(([0], np.cumsum(counts)))
+
+    results = []
+    for f in top_files:
+        members = by_file[file_start[f]:file_start[f + 1]]
+        chunks = [documents[i] for i in members]
+        results.append({
+            'file_path': str(paths[by_appearance[f]]),
+            'chunk_text': _snippet(documents[best_chunk[f]]),
+            'similarity': float(final[f]),
+            'distance': float(1 - final[f]),
+            'chunks': chunks,
+            'chunk_ids': [chunk_ids[i] for i in members],
+            'best_chunk_id': chunk_ids[best_chunk[f]],
+            'total_chunks': len(chunks),
+            'metadata': metadatas[file_first[f]],
+            # Debug scores (optional, remove in production)
+            'scores': {
+                'semantic': float(semantic[f]),
+                'keyword': float(keyword[f]),
+                'coverage': float(coverage[f]),
+                'recency': float(recency[f]),
+                'exact_match': float(exact_bonus[f])
+            }
+        })
+    return results
+
+
+def compact_result(result: Dict) -> Dict:
+    """Drop chunk text and debug scores from a search result.
+
+    Keeps ids, scores and the preview snippet; full chunk text can be
+    fetched by id from /api/chunks.
+    """
+    metadata = result['metadata']
+    return {
+        'file_path': result['file_path'],
+        'chunk_text': result['chunk_text'],
+        'similarity': result['similarity'],
+        'distance': result['distance'],
+        'chunk_ids': result['chunk_ids'],
+        'best_chunk_id': result['best_chunk_id'],
+        'total_chunks': result['total_chunks'],
+        'metadata': {key: metadata[key] for key in COMPACT_METADATA_KEYS if key in metadata},
+    }
+
+
+def preliminary_results(vector_hits: Sequence[Tuple[str, str, Dict, float]], n_results: int) -> List[Dict]:
+    """Compact results straight from ranked vector hits, one per file, before re-ranking."""
+    results = []
+    seen = set()
+    for chunk_id, document, metadata, similarity in vector_hits:
+        file_path = metadata['file_path']
+        if file_path in seen:
+            continue
+        seen.add(file_path)
+        results.append(compact_result({
+            'file_path': file_path,
+            'chunk_text': _snippet(document),
+            'similarity': float(similarity),
+            'distance': float(1 - similarity),
+            'chunk_ids': [chunk_id],
+            'best_chunk_id': chunk_id,
+            'total_chunks': 1,
+            'metadata': metadata,
+        }))
+        if len(results) >= n_results:
+            break
+    return results
@@ -0,0 +1,74 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def normalize_extension(extension: str) -> str:
+    """Extensions are stored lowercase with the leading dot ("PDF" -> ".pdf")."""
+    extension = extension.lower()
+    return extension if extension.startswith(".") else f".{extension}"
+
+
+def normalize_path_prefix(path_prefix: str) -> str:
+    """Absolute, resolved form of a directory prefix, as indexed paths are stored."""
+    return str(Path(path_prefix).expanduser().resolve())
+
+
+def path_range(path_prefix: str) -> Tuple[str, str, str]:
+    """The directory itself and the [low, high) string range of paths under it.
+
+    Splitting on the separator keeps /projects/foo from matching /projects/foobar.
+    """
+    base = path_prefix.rstrip(os.sep)
+    under = base + os.sep
+    return base or os.sep, under, under + "\U0010ffff"
+
+
+@dataclass(frozen=True)
+class SearchFilters:
+    """Restrictions on which files a search may return.
+
+    Compiled to a Chroma `where` clause so the vector index only considers
+    matching chunks, rather than post-filtering the global top candidates.
+    Hashable, so it can be part of result cache keys.
+    """
+    extensions: Tuple[str, ...] = ()
+    path_prefix: Optional[str] = None
+    modified_after: Optional[float] = None  # epoch seconds, inclusive
+    modified_before: Optional[float] = None  # epoch seconds, inclusive
+
+    @classmethod
+    def create(cls, extensions: Optional[Iterable[str]] = None, path_prefix: Optional[str] = None,
+               modified_after: Optional[datetime] = None,
+               modified_before: Optional[datetime] = None) -> Optional["SearchFilters"]:
+        """Build filters from request fields; None if none are set."""
+        filters = cls(
+            extensions=tuple(sorted({normalize_extension(e) for e in extensions or () if e})),
+            path_prefix=normalize_path_prefix(path_prefix) if path_prefix else None,
+            modified_after=modified_after.timestamp() if modified_after else None,
+            modified_before=modified_before.timestamp() if modified_before else None,
+        )
+        return filters if filters != cls() else None
+
+    def where(self, file_dirs: Optional[List[str]] = None) -> Dict:
+        """Chroma where clause; file_dirs are the indexed directories under path_prefix.
+
+        Chroma has no prefix operator, so path_prefix is resolved to the
+        directories under it (from the manifest) by the caller and matched
+        against each chunk's file_dir with $in. A path_prefix naming an
+        indexed file rather than a directory is passed as no file_dirs.
+        """
+        clauses = []
+        if self.extensions:
+            clauses.append({"file_extension": {"$in": list(self.extensions)}})
+        if file_dirs:
+            clauses.append({"file_dir": {"$in": file_dirs}})
+        elif file_dirs is not None:
+            clauses.append({"file_path": self.path_prefix})
+        if self.modified_after is not None:
+            clauses.append({"modified_ts": {"$gte": self.modified_after}})
+        if self.modified_before is not None:
+            clauses.append({"modified_ts": {"$lte": self.modified_before}})
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
@@ -0,0 +1,129 @@
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Iterable, Optional, Set
+
+import fileindexer_extract as _native
+
+from config import Settings
+
+
+class TextCache:
+    """On-disk cache of extracted text keyed by (extractor version, raw-bytes hash).
+
+    Changing CHUNK_SIZE, CHUNK_OVERLAP or EMBEDDING_MODEL re-chunks and
+    re-embeds every file but leaves its bytes alone; with this cache the
+    text comes back from disk instead of going through PDF/DOCX extraction
+    again. Texts are zlib-compressed in a SQLite sidecar under DATA_DIR; once
+    they take up more than `max_bytes` the least recently used are evicted.
+    The key includes the native extractor's version, so texts extracted by
+    an older extractor are never served.
+    """
+    settings = Settings()
+
+    def __init__(self, path: str = None, max_bytes: int = None, version: str = None):
+        self.path = Path(path or self.settings.TEXT_CACHE_PATH)
+        self.max_bytes = max_bytes or self.settings.TEXT_CACHE_MAX_MB * 1024 * 1024
+        self.version = version or str(_native.extractor_version())
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS texts ("
+            " version TEXT NOT NULL,"
+            " raw_hash TEXT NOT NULL,"
+            " text BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (version, raw_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS texts_last_used ON texts (last_used)")
+        self._conn.commit()
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM texts").fetchone()[0]
+
+    def cached(self, raw_hashes: Iterable[str]) -> Set[str]:
+        """Return which of raw_hashes have a cached text, without loading any."""
+        raw_hashes = list(raw_hashes)
+        found = set()
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit.
+            for start in range(0, len(raw_hashes), 500):
+                batch = raw_hashes[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT raw_hash FROM texts WHERE version = ?"
+                    f" AND raw_hash IN ({','.join('?' * len(batch))})",
+                    [self.version, *batch],
+                ).fetchall()
+                found.update(row[0] for row in rows)
+            # Found keys are counted by the get() that follows, hit or miss.
+            self._count(misses=len(raw_hashes) - len(found))
+        return found
+
+    def get(self, raw_hash: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM texts WHERE version = ? AND raw_hash = ?",
+                (self.version, raw_hash),
+            ).fetchone()
+            if row is None:
+                self._count(misses=1)
+                return None
+            self._conn.execute(
+                "UPDATE texts SET last_used = ? WHERE version = ? AND raw_hash = ?",
+                (time.time(), self.version, raw_hash),
+            )
+            self._conn.commit()
+            self._count(hits=1)
+        return zlib.decompress(row[0]).decode()
+
+    def _count(self, hits: int = 0, misses: int = 0) -> None:
+        """Update the hit/miss counters; called with the lock held."""
+        self.hits += hits
+        self.misses += misses
+
+    def put(self, raw_hash: str, text: str) -> None:
+        """Store a text, evicting least recently used texts if over capacity."""
+        blob = zlib.compress(text.encode(), 1)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO texts (version, raw_hash, text, size, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (self.version, raw_hash, blob, len(blob), time.time()),
+            )
+            if cursor.rowcount:
+                self._bytes += len(blob)
+            if self._bytes > self.max_bytes:
+                # Evict down to 90% so eviction doesn't run on every insert.
+                target = int(self.max_bytes * 0.9)
+                rows = self._conn.execute(
+                    "SELECT rowid, size FROM texts ORDER BY last_used"
+                ).fetchall()
+                evict = []
+                for rowid, size in rows:
+                    if self._bytes <= target:
+                        break
+                    evict.append((rowid,))
+                    self._bytes -= size
+                self._conn.executemany("DELETE FROM texts WHERE rowid = ?", evict)
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses, size = self.hits, self.misses, self._bytes
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "bytes": size,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
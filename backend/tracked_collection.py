@@ -0,0 +1,90 @@
+from typing import Optional
+
+from keyword_index import KeywordIndex
+from query_cache import GenerationCounter
+from vector_store import FullVectorStore, truncate_embeddings
+
+
+def _file_path_from_where(where: dict) -> str:
+    """Extract the file path from a `{"file_path": ...}` delete filter."""
+    condition = where.get("file_path") if len(where) == 1 else None
+    if isinstance(condition, dict) and set(condition) == {"$eq"}:
+        condition = condition["$eq"]
+    if not isinstance(condition, str):
+        raise ValueError(f"Unsupported delete filter for a tracked collection: {where}")
+    return condition
+
+
+class TrackedCollection:
+    """Wraps a Chroma collection so every write keeps derived state in step.
+
+    Adds and deletes are mirrored into the BM25 keyword index, so it follows
+    exactly the same write paths as the vector collection, and a
+    GenerationCounter is bumped after each write so cached search results
+    are invalidated. The bump happens after the write returns, so a search
+    that ran concurrently with it is stamped with the old generation and
+    never served from cache afterwards. Reads pass straight through.
+
+    With a vector_store, the collection holds embeddings truncated to
+    `dims`: full embeddings passed to add/upsert go to the store and the
+    collection gets their truncation.
+    """
+
+    def __init__(self, collection, generation: GenerationCounter,
+                 keyword_index: Optional[KeywordIndex] = None,
+                 vector_store: Optional[FullVectorStore] = None, dims: int = 0):
+        self._collection = collection
+        self._generation = generation
+        self._keyword_index = keyword_index
+        self._vector_store = vector_store
+        self._dims = dims
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def _store_vectors(self, ids, metadatas, kwargs) -> None:
+        embeddings = kwargs.get("embeddings")
+        if self._vector_store is None or embeddings is None:
+            return
+        self._vector_store.put(ids, [md["file_path"] for md in metadatas], embeddings)
+        kwargs["embeddings"] = truncate_embeddings(embeddings, self._dims)
+
+    def add(self, ids, documents=None, metadatas=None, **kwargs):
+        try:
+            self._store_vectors(ids, metadatas, kwargs)
+            result = self._collection.add(ids=ids, documents=documents, metadatas=metadatas, **kwargs)
+            if self._keyword_index is not None and documents is not None:
+                self._keyword_index.add(ids, documents, [md["file_path"] for md in metadatas])
+            return result
+        finally:
+            self._generation.bump()
+
+    def upsert(self, ids, documents=None, metadatas=None, **kwargs):
+        try:
+            self._store_vectors(ids, metadatas, kwargs)
+            result = self._collection.upsert(ids=ids, documents=documents, metadatas=metadatas, **kwargs)
+            if self._keyword_index is not None and documents is not None:
+                self._keyword_index.add(ids, documents, [md["file_path"] for md in metadatas])
+            return result
+        finally:
+            self._generation.bump()
+
+    def update(self, *args, **kwargs):
+        try:
+            return self._collection.update(*args, **kwargs)
+        finally:
+            self._generation.bump()
+
+    def delete(self, ids=None, where=None, **kwargs):
+        try:
+            result = self._collection.delete(ids=ids, where=where, **kwargs)
+            for derived in (self._keyword_index, self._vector_store):
+                if derived is None:
+                    continue
+                if ids is not None:
+                    derived.delete(list(ids))
+                if where is not None:
+                    derived.delete_file(_file_path_from_where(where))
+            return result
+        finally:
+            self._generation.bump()
@@ -0,0 +1,165 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def truncate_embeddings(embeddings, dims: int) -> np.ndarray:
+    """Matryoshka truncation: keep the first dims dimensions and renormalize.
+
+    nomic-embed-text is trained so that prefixes of its embedding (e.g. 256
+    or 512 of 768 dims) are embeddings in their own right.
+    """
+    truncated = np.asarray(embeddings, dtype=np.float32)[..., :dims]
+    norms = np.linalg.norm(truncated, axis=-1, keepdims=True)
+    return truncated / np.where(norms > 0, norms, 1.0)
+
+
+class FullVectorStore:
+    """Full-precision embeddings kept beside a reduced-dimension collection.
+
+    With VECTOR_DIMS set, the HNSW index only holds truncated embeddings;
+    the full float32 vectors live here, as rows of a memory-mapped file
+    (`<path>.f32`), located through a SQLite table of chunk id -> row
+    (`<path>.sqlite3`). Searches read them only to rescore the candidates
+    the truncated index returns, so they cost page cache, not resident
+    index memory. Rows freed by deletes are reused by later adds.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.data_path = Path(f"{self.path}.f32")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"{self.path}.sqlite3", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vector_rows ("
+            " chunk_id TEXT PRIMARY KEY,"
+            " file_path TEXT NOT NULL,"
+            " row INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS vector_rows_file ON vector_rows (file_path)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'dims'").fetchone()
+        self.dims: Optional[int] = row[0] if row else None
+        self._next_row = self._conn.execute(
+            "SELECT COALESCE(MAX(row) + 1, 0) FROM"
+            " (SELECT row FROM vector_rows UNION ALL SELECT row FROM free_rows)"
+        ).fetchone()[0]
+        self._vectors: Optional[np.memmap] = None
+        if self.dims is not None and self.data_path.exists():
+            self._map(self.data_path.stat().st_size // (self.dims * 4))
+
+    def _map(self, capacity: int) -> None:
+        """(Re)map the data file at capacity rows, growing the file if needed.
+
+        Readers holding the previous map keep a valid view of the rows it covered.
+        """
+        size = capacity * self.dims * 4
+        with open(self.data_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._vectors = np.memmap(self.data_path, dtype=np.float32, mode="r+",
+                                  shape=(capacity, self.dims)) if capacity else None
+
+    @property
+    def _capacity(self) -> int:
+        return 0 if self._vectors is None else self._vectors.shape[0]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM vector_rows").fetchone()[0]
+
+    def put(self, ids: Sequence[str], file_paths: Sequence[str], embeddings) -> None:
+        """Store (or overwrite) full vectors for ids."""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if not len(ids):
+            return
+        with self._lock:
+            if self.dims is None:
+                self.dims = vectors.shape[1]
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('dims', ?)", (self.dims,))
+            elif vectors.shape[1] != self.dims:
+                raise ValueError(f"Expected {self.dims}-dim vectors, got {vectors.shape[1]}")
+
+            existing = dict(self._lookup(list(ids)))
+            free = [r for (r,) in self._conn.execute(
+                "SELECT row FROM free_rows LIMIT ?", (len(ids),)
+            ).fetchall()]
+            self._conn.executemany("DELETE FROM free_rows WHERE row = ?", [(r,) for r in free])
+            rows = []
+            for chunk_id in ids:
+                row = existing.get(chunk_id)
+                if row is None:
+                    if free:
+                        row = free.pop()
+                    else:
+                        row = self._next_row
+                        self._next_row += 1
+                rows.append(row)
+
+            if self._next_row > self._capacity:
+                self._map(max(self._next_row, self._capacity * 2, 1024))
+            self._vectors[rows] = vectors
+            # Vectors reach the file before the rows that point at them.
+            self._vectors.flush()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vector_rows (chunk_id, file_path, row) VALUES (?, ?, ?)",
+                list(zip(ids, file_paths, rows)),
+            )
+            self._conn.commit()
+
+    def _lookup(self, ids: List[str]) -> List[Tuple[str, int]]:
+        found = []
+        # Stay well under SQLite's bound-parameter limit.
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            found.extend(self._conn.execute(
+                "SELECT chunk_id, row FROM vector_rows"
+                f" WHERE chunk_id IN ({','.join('?' * len(batch))})",
+                batch,
+            ).fetchall())
+        return found
+
+    def get(self, ids: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (vectors, found): one row per id, zeros where found is False."""
+        with self._lock:
+            rows = dict(self._lookup(list(ids)))
+            vectors = self._vectors
+        found = np.array([chunk_id in rows for chunk_id in ids], dtype=bool)
+        if vectors is None:
+            return np.zeros((len(ids), self.dims or 0), dtype=np.float32), found
+        result = np.zeros((len(ids), self.dims), dtype=np.float32)
+        result[found] = vectors[[rows[chunk_id] for chunk_id, hit in zip(ids, found) if hit]]
+        return result, found
+
+    def _free(self, rows: List[Tuple[str, int]]) -> None:
+        self._conn.executemany("DELETE FROM vector_rows WHERE chunk_id = ?", [(c,) for c, _ in rows])
+        self._conn.executemany("INSERT OR IGNORE INTO free_rows (row) VALUES (?)", [(r,) for _, r in rows])
+        self._conn.commit()
+
+    def delete(self, ids: Sequence[str]) -> None:
+        with self._lock:
+            self._free(self._lookup(list(ids)))
+
+    def delete_file(self, file_path: str) -> None:
+        with self._lock:
+            self._free(self._conn.execute(
+                "SELECT chunk_id, row FROM vector_rows WHERE file_path = ?", (file_path,)
+            ).fetchall())
+
+    def nbytes(self) -> int:
+        """Bytes of full vectors stored (excluding free rows)."""
+        return self.count() * (self.dims or 0) * 4
+
+    def close(self) -> None:
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            self._conn.close()
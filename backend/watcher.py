@@ -0,0 +1,246 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+
+from config import Settings
+from file_processor import FileProcessor
+
+
+class _EventHandler(FileSystemEventHandler):
+    """Forwards file (not directory) events to a DirectoryWatcher."""
+
+    def __init__(self, watcher: "DirectoryWatcher"):
+        self.watcher = watcher
+
+    def on_created(self, event: FileSystemEvent):
+        if not event.is_directory:
+            self.watcher.push_upsert(os.fsdecode(event.src_path))
+
+    def on_modified(self, event: FileSystemEvent):
+        if not event.is_directory:
+            self.watcher.push_upsert(os.fsdecode(event.src_path))
+
+    def on_deleted(self, event: FileSystemEvent):
+        if not event.is_directory:
+            self.watcher.push_delete(os.fsdecode(event.src_path))
+
+    def on_moved(self, event: FileSystemEvent):
+        # Directory moves also emit a moved event for every file inside them.
+        if not event.is_directory:
+            self.watcher.push_move(os.fsdecode(event.src_path), os.fsdecode(event.dest_path))
+
+
+class DirectoryWatcher:
+    """Watches one indexed root and feeds coalesced changes to the indexer.
+
+    Events are folded into a pending set keyed by path, so a save storm or a
+    git checkout touching a file many times results in one update. The set is
+    flushed once no event has arrived for WATCH_DEBOUNCE_S (or at the latest
+    WATCH_MAX_DELAY_S after the first pending event). Moves of indexed files
+    are applied as renames, without re-embedding.
+    """
+    settings = Settings()
+
+    def __init__(self, indexer, root: str):
+        self.indexer = indexer
+        self.root = str(Path(root).resolve())
+        self.events_received = 0
+        self.batches_processed = 0
+        self.last_flush: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+        self._upserts: set = set()
+        self._deletes: set = set()
+        self._moves: Dict[str, str] = {}  # new path -> original path
+        self._first_pending: Optional[float] = None
+        self._last_event = 0.0
+        self._cond = threading.Condition()
+        self._stopping = False
+
+        self._observer = Observer()
+        self._observer.schedule(_EventHandler(self), self.root, recursive=True)
+        self._worker = threading.Thread(target=self._run, name=f"watch:{self.root}", daemon=True)
+
+    def start(self) -> None:
+        self._observer.start()
+        self._worker.start()
+
+    def stop(self) -> None:
+        self._observer.stop()
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._observer.join()
+        self._worker.join()
+
+    @property
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._upserts) + len(self._deletes) + len(self._moves)
+
+    def status(self) -> dict:
+        return {
+            "directory": self.root,
+            "running": self._worker.is_alive(),
+            "queue_depth": self.queue_depth,
+            "events_received": self.events_received,
+            "batches_processed": self.batches_processed,
+            "last_flush": self.last_flush,
+            "last_error": self.last_error,
+        }
+
+    def _is_indexable(self, path: str) -> bool:
+        """The scanner's own rules (extension, hidden, SCAN_IGNORE_DIRS, .fileindexerignore)."""
+        return FileProcessor.scan_includes(self.root, path)
+
+    def _too_large(self, path: str) -> bool:
+        try:
+            return os.path.getsize(path) > self.settings.MAX_FILE_SIZE_MB * 1024 * 1024
+        except OSError:
+            return False
+
+    def _touch(self) -> None:
+        now = time.monotonic()
+        self.events_received += 1
+        self._last_event = now
+        if self._first_pending is None:
+            self._first_pending = now
+        self._cond.notify()
+
+    def push_upsert(self, path: str) -> None:
+        if not self._is_indexable(path):
+            return
+        if self._too_large(path):
+            # The scanner skips it too, so a full re-index would prune it.
+            self.push_delete(path)
+            return
+        with self._cond:
+            self._deletes.discard(path)
+            self._upserts.add(path)
+            self._touch()
+
+    def push_delete(self, path: str) -> None:
+        if not self._is_indexable(path):
+            return
+        with self._cond:
+            self._upserts.discard(path)
+            # A file moved and then deleted: the original path is what's indexed.
+            self._deletes.add(self._moves.pop(path, path))
+            self._touch()
+
+    def push_move(self, src: str, dest: str) -> None:
+        src_ok = self._is_indexable(src)
+        dest_ok = self._is_indexable(dest) and not self._too_large(dest)
+        if not dest_ok:
+            # Moved out of scope (or renamed to an unindexed extension, e.g. an
+            # editor's atomic save temp file): treat as a delete.
+            if src_ok:
+                self.push_delete(src)
+            return
+        if not src_ok:
+            # Moved into scope, e.g. `foo.tmp` -> `foo.txt` on atomic save.
+            self.push_upsert(dest)
+            return
+        with self._cond:
+            if src in self._upserts:
+                # Created (or changed) since the last flush, so it has to be
+                # (re)indexed anyway; index it under its new name.
+                self._upserts.discard(src)
+                self._deletes.add(self._moves.pop(src, src))
+                self._upserts.add(dest)
+            else:
+                self._moves[dest] = self._moves.pop(src, src)
+            self._deletes.discard(dest)
+            self._touch()
+
+    def _run(self) -> None:
+        debounce = self.settings.WATCH_DEBOUNCE_S
+        max_delay = self.settings.WATCH_MAX_DELAY_S
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if self._first_pending is not None:
+                        now = time.monotonic()
+                        quiet_for = now - self._last_event
+                        waited = now - self._first_pending
+                        if quiet_for >= debounce or waited >= max_delay:
+                            break
+                        self._cond.wait(min(debounce - quiet_for, max_delay - waited))
+                    else:
+                        self._cond.wait()
+                if self._stopping:
+                    return
+                upserts, deletes, moves = self._upserts, self._deletes, self._moves
+                self._upserts, self._deletes, self._moves = set(), set(), {}
+                self._first_pending = None
+
+            try:
+                self._flush(upserts, deletes, moves)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error applying file changes under {self.root}: {e}")
+            self.batches_processed += 1
+            self.last_flush = time.time()
+
+    def _flush(self, upserts: set, deletes: set, moves: Dict[str, str]) -> None:
+        for dest, src in moves.items():
+            if src == dest:
+                continue
+            if not os.path.isfile(dest):
+                deletes.add(src)
+            elif not self.indexer.rename_file(src, dest):
+                upserts.add(dest)
+
+        self.indexer.remove_files(sorted(deletes))
+
+        existing = [Path(p) for p in sorted(upserts) if os.path.isfile(p)]
+        if existing:
+            self.indexer.index_files(existing, prune=False)
+
+
+class WatchManager:
+    """Starts, stops and reports on the DirectoryWatchers for indexed roots."""
+
+    def __init__(self, indexer):
+        self.indexer = indexer
+        self._watchers: Dict[str, DirectoryWatcher] = {}
+        self._lock = threading.Lock()
+
+    def start(self, directory: str) -> DirectoryWatcher:
+        root = str(Path(directory).resolve())
+        if not os.path.isdir(root):
+            raise ValueError(f"{root} is not a directory")
+        with self._lock:
+            if root in self._watchers:
+                raise ValueError(f"{root} is already being watched")
+            watcher = DirectoryWatcher(self.indexer, root)
+            watcher.start()
+            self._watchers[root] = watcher
+        return watcher
+
+    def stop(self, directory: str) -> bool:
+        root = str(Path(directory).resolve())
+        with self._lock:
+            watcher = self._watchers.pop(root, None)
+        if watcher is None:
+            return False
+        watcher.stop()
+        return True
+
+    def stop_all(self) -> None:
+        with self._lock:
+            watchers = list(self._watchers.values())
+            self._watchers.clear()
+        for watcher in watchers:
+            watcher.stop()
+
+    def status(self) -> List[dict]:
+        with self._lock:
+            watchers = list(self._watchers.values())
+        return [w.status() for w in watchers]
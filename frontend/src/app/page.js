@@ -5,7 +5,7 @@ import SearchBar from '@/components/SearchBar';
 import SearchResults from '@/components/SearchResults';
 import IndexingPanel from '@/components/IndexingPanel';
 import FileListPanel from '@/components/FileListPanel';
-import { searchFiles } from '@/lib/api';
+import { searchFilesStream } from '@/lib/api';
 
 export default function Home() {
   const [results, setResults] = useState([]);
@@ -19,8 +19,12 @@ export default function Home() {
     setCurrentQuery(query);
     
     try {
-      const data = await searchFiles(query, 10);
-      setResults(data.results);
+      // Paint the preliminary vector hits as soon as they arrive, then
+      // replace them with the re-ranked results.
+      await searchFilesStream(query, 10, (event, data) => {
+        setResults(data.results);
+        setIsSearching(false);
+      });
     } catch (error) {
       console.error('Search failed:', error);
       alert('Search failed. Make sure the backend is running.');
@@ -1,9 +1,29 @@
 'use client';
 
-import { openFile } from '@/lib/api';
+import { useState } from 'react';
+import { getChunks, openFile } from '@/lib/api';
 
 const SearchResult = ({ result, index }) => {
   const fileName = result.file_path.split('/').pop();
+  const [chunks, setChunks] = useState(null);
+  const [loadingChunks, setLoadingChunks] = useState(false);
+
+  // Compact results only carry chunk ids; fetch the text on demand.
+  const toggleChunks = async () => {
+    if (chunks) {
+      setChunks(null);
+      return;
+    }
+    setLoadingChunks(true);
+    try {
+      const data = await getChunks(result.chunk_ids);
+      setChunks(data.chunks);
+    } catch (error) {
+      console.error('Failed to load chunks:', error);
+    } finally {
+      setLoadingChunks(false);
+    }
+  };
 
   const handleOpen = async () => {
     try {
@@ -65,6 +85,17 @@ const SearchResult = ({ result, index }) => {
         </p>
       </div>
 
+      {/* Matching chunks, loaded on demand */}
+      {chunks && (
+        <div className="mb-3 space-y-2 max-h-64 overflow-y-auto">
+          {chunks.map((chunk) => (
+            <p key={chunk.id} className="text-gray-600 text-xs leading-relaxed bg-gray-50 rounded p-2 whitespace-pre-wrap">
+              {chunk.text}
+            </p>
+          ))}
+        </div>
+      )}
+
       {/* Metadata */}
       <div className="flex items-center justify-between text-xs text-gray-500 mb-3">
         <span>
@@ -87,6 +118,15 @@ const SearchResult = ({ result, index }) => {
         >
           Open File
         </button>
+        {result.chunk_ids && result.chunk_ids.length > 0 && (
+          <button
+            onClick={toggleChunks}
+            disabled={loadingChunks}
+            className="px-4 py-2 bg-gray-100 text-gray-700 rounded-md hover:bg-gray-200 transition-colors text-sm font-medium disabled:opacity-50"
+          >
+            {loadingChunks ? 'Loading...' : chunks ? 'Hide Matches' : `Show Matches (${result.chunk_ids.length})`}
+          </button>
+        )}
         <button
           onClick={() => navigator.clipboard.writeText(result.file_path)}
           className="px-4 py-2 bg-gray-100 text-gray-700 rounded-md hover:bg-gray-200 transition-colors text-sm font-medium"
@@ -115,7 +155,7 @@ const SearchResults = ({ results, query }) => {
         Found {results.length} result{results.length !== 1 ? 's' : ''} for "{query}"
       </h2>
       {results.map((result, index) => (
-        <SearchResult key={index} result={result} index={index} />
+        <SearchResult key={result.file_path} result={result} index={index} />
       ))}
     </div>
   );
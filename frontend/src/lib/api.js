@@ -9,8 +9,8 @@ const api = axios.create({
   },
 });
 
-export const indexDirectory = async (directory) => {
-  const response = await api.post('/api/index', { directory });
+export const indexDirectory = async (directory, priority = 0) => {
+  const response = await api.post('/api/index', { directory, priority });
   return response.data;
 };
 
@@ -19,14 +19,57 @@ export const getIndexingStatus = async () => {
   return response.data;
 };
 
-export const searchFiles = async (query, nResults = 10) => {
+// filters: { extensions, path_prefix, modified_after, modified_before }, all optional
+export const searchFiles = async (query, nResults = 10, compact = true, filters = {}) => {
   const response = await api.post('/api/search', {
     query,
     n_results: nResults,
+    compact,
+    ...filters,
   });
   return response.data;
 };
 
+// Streams compact results as Server-Sent Events: onEvent('preliminary', data)
+// with the raw vector hits first, then onEvent('results', data) once re-ranked.
+export const searchFilesStream = async (query, nResults = 10, onEvent, filters = {}) => {
+  const response = await fetch(`${API_BASE_URL}/api/search/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ query, n_results: nResults, ...filters }),
+  });
+  if (!response.ok) {
+    throw new Error(`Search failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (event !== 'done') onEvent(event, data ? JSON.parse(data) : null);
+    }
+  }
+};
+
+// Full text of chunks by id (e.g. a compact result's chunk_ids)
+export const getChunks = async (ids) => {
+  const response = await api.post('/api/chunks', { ids });
+  return response.data;
+};
+
 export const openFile = async (filePath) => {
   const response = await api.post('/api/open-file', null, {
     params: { file_path: filePath },
@@ -34,7 +77,8 @@ export const openFile = async (filePath) => {
   return response.data;
 };
 
-export const getIndexedFiles = async () => {
-  const response = await api.get('/api/files');
+// params: { offset, limit, sort_by, order, extension, path_prefix, q } (all optional)
+export const getIndexedFiles = async (params = {}) => {
+  const response = await api.get('/api/files', { params });
   return response.data;
 };
\ No newline at end of file